@@ -0,0 +1,58 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import numpy as np
+
+from models.ai.registry import registry
+
+OUTPUT = os.path.join("output", "benchmarks")
+MODELS = ("lstm_temperature_model.keras", "lstm_humidity_model.keras")
+SCALERS = ("scaler_temperature.save", "scaler_humidity.save")
+SENSORS = [[1, 3], [1, 30], [1, 60], [1, 90], [30, 3], [30, 30], [30, 60], [30, 90], [60, 3], [60, 30], [60, 60],
+           [60, 90], [90, 3]]
+
+
+def measure(function, repeats=5, number=1):
+    """Median and minimum time (s) of one call of function over `repeats` rounds of `number` calls."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    return {'median_s': statistics.median(timings), 'min_s': min(timings), 'repeats': repeats, 'number': number}
+
+
+def artifacts_available():
+    """True when the forecasting models can be loaded (exported .npz weights or the .keras files)."""
+    folder = registry.folder
+    return all(os.path.exists(os.path.join(folder, registry.numpy_artifact(name))) or
+               os.path.exists(os.path.join(folder, name)) for name in MODELS + SCALERS)
+
+
+def metadata(stub):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'stub_models': stub
+    }
+
+
+def save(results, name):
+    """Writes the results to output/benchmarks/<name>.json and returns the path."""
+    os.makedirs(OUTPUT, exist_ok=True)
+    path = os.path.join(OUTPUT, f"{name}.json")
+    with open(path, "w") as file:
+        json.dump(results, file, indent=4, default=float)
+    return path
@@ -0,0 +1,84 @@
+import os
+import time
+
+from models.experiment import make_orchard_grid, make_pesticide_parameters, run_replicate
+
+#######################################################################################################################
+# Scaled-down, fixed-seed versions of the experiments of main.py, swept over the number of bugs and of sprayers
+# so that the scaling curves can be compared between revisions:
+#   pesticide_test        1 bug, 1 sprayer, a few quantities
+#   pesticide_layout      the three layouts on a smaller orchard, with few and many bugs
+#   pesticide_efficiency  one sprayer per tree on growing orchards, with growing populations
+#   domains               one sprayer per tree on the 8x10 orchard, single process against DomainTwin, with
+#                         growing populations: where the domain workers break even
+# Forecasts are not cached, so every run includes the LSTM steps.
+# Run from the repository root: python -m benchmarks.e2e
+#######################################################################################################################
+
+SEEDS = (0, 1)
+ENVIRONMENT = {'forecast_cache': False}
+
+
+def scenarios(quick=False):
+    """(name, bugs, trees, pesticides) of every run, in the order of main.py."""
+    tree = {'number': 1, 'max_pears': 10, 'positions': [[50, 50]]}
+    for quantity in ((1, 500) if quick else (1, 500, 1000)):
+        yield (f'pesticide_test/quantity_{quantity}', {'number': 1}, tree,
+               {'quantity': quantity, 'initial_radius': 1, 'number': 1, 'positions': [[50, 50]]})
+
+    rows, cols = 4, 5
+    grid = make_orchard_grid(rows, cols)
+    for layout in (0, 1, 2):
+        for n in ((50,) if quick else (50, 200)):
+            yield (f'pesticide_layout/layout_{layout}/bugs_{n}', {'number': n},
+                   {'number': 1, 'max_pears': 10, 'positions': grid},
+                   make_pesticide_parameters(layout, 1800, rows, cols, grid))
+
+    for rows, cols in ((4, 5), (8, 10)) if quick else ((4, 5), (8, 10), (12, 15)):
+        grid = make_orchard_grid(rows, cols)
+        sprayers = {'quantity': 1800 / len(grid), 'initial_radius': 1, 'number': len(grid), 'positions': grid}
+        for n in ((20, 100) if quick else (20, 100, 400)):
+            yield (f'pesticide_efficiency/sprayers_{len(grid)}/bugs_{n}', {'number': n},
+                   {'number': 1, 'max_pears': 10, 'positions': grid}, sprayers)
+
+
+def run(quick=False, seeds=SEEDS):
+    results = {}
+    for name, bugs, trees, pesticides in scenarios(quick):
+        replicates = []
+        for seed in seeds:
+            start = time.perf_counter()
+            replicate = run_replicate(seed, bugs, trees, pesticides, dict(ENVIRONMENT))
+            replicates.append({'seed': seed, 'wall_s': time.perf_counter() - start, 'steps': replicate['steps'],
+                               'dead': replicate['dead'], 'alive': replicate['alive'], 'left': replicate['left']})
+        results[name] = {'bugs': bugs['number'], 'sprayers': pesticides['number'],
+                         'wall_s': sum(r['wall_s'] for r in replicates) / len(replicates),
+                         'replicates': replicates}
+    return results
+
+
+def domains(quick=False, seeds=SEEDS, shape=(2, 1)):
+    """
+    Wall time of the same replicates run in one process and split over shape domains. Every step costs the
+    domain run three round trips to every worker, whatever the number of bugs, so the ratio domains / single
+    only falls below 1 with large populations and a free core per worker (cores is recorded with the results).
+    """
+    grid = make_orchard_grid(8, 10)
+    trees = {'number': 1, 'max_pears': 10, 'positions': grid}
+    sprayers = {'quantity': 1800 / len(grid), 'initial_radius': 1, 'number': len(grid), 'positions': grid}
+    results = {'shape': list(shape), 'cores': os.cpu_count()}
+    for n in ((200, 1000) if quick else (200, 1000, 4000)):
+        wall = {}
+        for mode, environment in (('single', ENVIRONMENT), ('domains', dict(ENVIRONMENT, domains={'shape': shape}))):
+            start = time.perf_counter()
+            for seed in seeds:
+                run_replicate(seed, {'number': n}, trees, sprayers, dict(environment))
+            wall[mode] = (time.perf_counter() - start) / len(seeds)
+        results[f'bugs_{n}'] = {'single_s': wall['single'], 'domains_s': wall['domains'],
+                                'ratio': wall['domains'] / wall['single']}
+    return results
+
+
+if __name__ == "__main__":
+    from .suite import main
+    main(["--only", "e2e"])
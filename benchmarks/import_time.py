@@ -0,0 +1,72 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+#######################################################################################################################
+# Start-up cost of the simulator entry points: per-module import times (python -X importtime), the heavy
+# dependencies pulled in at import, and the wall time of a short pesticide-only run in a fresh interpreter.
+# Run from the repository root: python -m benchmarks.import_time
+#######################################################################################################################
+
+ENTRY_POINTS = ("main", "models.twin_exp", "models.sweep")
+# dependencies that must only be imported when they are actually used
+HEAVY = ("pandas", "keras", "tensorflow", "matplotlib", "sklearn", "joblib", "h5py")
+# cold start budget (s) of a short run
+BUDGET = 1.0
+
+SHORT_RUN = """
+from models.experiment import run_replicate
+run_replicate(0, {'number': 1}, {'number': 1, 'max_pears': 10, 'positions': [[50, 50]]},
+              {'quantity': 1, 'initial_radius': 1, 'number': 1, 'positions': [[50, 50]]})
+"""
+
+
+def import_report(module, top=15):
+    """Total import time of a module (s), its most expensive imports and the heavy packages it loads."""
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             capture_output=True, text=True, check=True)
+    modules = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append({"module": name.strip(), "self_s": int(self_us) / 1e6, "cumulative_s": int(cumulative_us) / 1e6})
+    total = next(m["cumulative_s"] for m in modules if m["module"] == module)
+    loaded = {m["module"].split(".")[0] for m in modules}
+    return {
+        "total_s": total,
+        "heavy": sorted(loaded.intersection(HEAVY)),
+        "slowest": sorted(modules, key=lambda m: m["self_s"], reverse=True)[:top]
+    }
+
+
+def cold_start(repeats=3):
+    """Best wall time (s) of a fresh interpreter running a one-bug, one-sprayer replicate."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", SHORT_RUN], capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(entry_points=ENTRY_POINTS, budget=BUDGET):
+    results = {module: import_report(module) for module in entry_points}
+    results["cold_start_s"] = cold_start()
+    results["within_budget"] = results["cold_start_s"] < budget
+    return results
+
+
+if __name__ == "__main__":
+    results = run()
+    os.makedirs(os.path.join("output", "benchmarks"), exist_ok=True)
+    with open(os.path.join("output", "benchmarks", "import_time.json"), "w") as file:
+        json.dump(results, file, indent=4)
+    for module in ENTRY_POINTS:
+        report = results[module]
+        print(f"import {module}: {report['total_s']:.3f} s, heavy dependencies: {report['heavy'] or 'none'}")
+        for m in report["slowest"][:5]:
+            print(f"    {m['module']:<40} {m['self_s']:.4f} s")
+    print(f"cold start of a short run: {results['cold_start_s']:.3f} s (budget {BUDGET} s)")
@@ -0,0 +1,65 @@
+import json
+import os
+import statistics
+import time
+import numpy as np
+
+from models.ai.registry import registry
+from models.io.climate import ClimateStore
+
+#######################################################################################################################
+# Latency of the forecasting models with the Keras and the NumPy backends, and the largest difference between
+# their outputs. Run from the repository root: python -m benchmarks.lstm_backends
+#######################################################################################################################
+
+MODELS = {"temperature": ("lstm_temperature_model.keras", "scaler_temperature.save"),
+          "humidity": ("lstm_humidity_model.keras", "scaler_humidity.save")}
+
+
+def model_inputs(name, batch, length=24, first=25):
+    """Normalized climate windows as Environment feeds them to the models."""
+    store = ClimateStore.open(name)
+    scaler = registry.load_scaler(MODELS[name][1])
+    windows = []
+    for end in range(first, first + batch):
+        window = np.array(store.window(end, length))
+        window[:, :-4] = scaler.transform(window[:, :-4])
+        windows.append(window)
+    return np.stack(windows)
+
+
+def latency(model, x, repeats):
+    model.predict(x, verbose=0)  # warm-up (graph tracing for Keras)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(x, verbose=0)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run(batch_sizes=(1, 8, 32), repeats=20):
+    results = {}
+    for name, (filename, _) in MODELS.items():
+        backends = {"numpy": registry.load_model(filename, "numpy")}
+        try:
+            backends["keras"] = registry.load_model(filename, "keras")
+        except Exception as e:
+            results[f"{name}/keras"] = {"unavailable": f"{e.__class__.__name__}: {e}"}
+        for batch in batch_sizes:
+            x = model_inputs(name, batch)
+            outputs = {}
+            for backend, model in backends.items():
+                outputs[backend] = np.asarray(model.predict(x, verbose=0))
+                results.setdefault(f"{name}/{backend}", {})[f"batch_{batch}_s"] = latency(model, x, repeats)
+            if len(outputs) == 2:
+                results[f"{name}/max_abs_diff_batch_{batch}"] = float(np.abs(outputs["numpy"] - outputs["keras"]).max())
+    return results
+
+
+if __name__ == "__main__":
+    results = run()
+    os.makedirs(os.path.join("output", "benchmarks"), exist_ok=True)
+    with open(os.path.join("output", "benchmarks", "lstm_backends.json"), "w") as file:
+        json.dump(results, file, indent=4)
+    print(json.dumps(results, indent=4))
@@ -0,0 +1,168 @@
+import copy
+import numpy as np
+
+from models import kernels
+from models.bug import Bug
+from models.environment import Environment
+from models.fruit import Fruit
+from models.io.climate import ClimateStore
+from models.pesticide import Pesticide
+from models.pesticide_field import PesticideField
+from models.swarm import BugSwarm
+from models.tree import Tree
+from models.experiment import make_orchard_grid
+from models.exposure import sample_deaths
+from models.neighbors import attraction
+from .common import SENSORS, measure
+
+#######################################################################################################################
+# Micro-benchmarks of the hot paths of a step, each with the per-object version (Bug.move, Pesticide.affects_bug,
+# the per-cell IDW) next to the batched one used by Twin (BugSwarm.move, BugSwarm.expose, IDWOperator):
+#   bug_move            one step of n bugs
+#   affects_bug         exposure of n bugs to s sprayers
+#   generate_heatmap    temperature map of the 100 x 100 environment from the 13 sensors
+#   update_conditions   one hour of LSTM forecast (no forecast cache)
+#   kernels             bug-to-bug attraction and dense exposure with the NumPy paths and the Numba kernels
+#                       (see models.kernels), when Numba is installed
+# Run from the repository root: python -m benchmarks.micro
+#######################################################################################################################
+
+SIZE = (100, 100)
+WIND = {'direction': [1, 0], 'speed': 5}
+
+
+def make_environment(backend='numpy'):
+    """Environment of Twin, starting from the default date, without forecast cache."""
+    temperatures = ClimateStore.open("temperature").window(25, 24)
+    humidities = ClimateStore.open("humidity").window(25, 24)
+    return Environment(SIZE, SENSORS, temperatures, humidities, WIND, None, None, backend)
+
+
+def make_scene(n_bugs, n_sprayers, seed=0, radius=10):
+    """Orchard of 12 x 15 trees, bugs uniformly spread and sprayers on the first trees, already spread to radius."""
+    rng = np.random.RandomState(seed)
+    trees = []
+    for i, position in enumerate(make_orchard_grid()):
+        fruits = [Fruit(j, 1, rng.uniform(0, 1), 5) for j in range(rng.randint(0, 10))]
+        trees.append(Tree(i, position, 1, fruits))
+    bugs = [Bug(i, 100, 2, rng.uniform(0, SIZE[0], 2), 1) for i in range(n_bugs)]
+    grid = make_orchard_grid()
+    pesticides = []
+    for i in range(n_sprayers):
+        pesticide = Pesticide(i, "Fenpropathrin", grid[i % len(grid)], 1, 1800 / n_sprayers)
+        pesticide.radius = radius
+        pesticides.append(pesticide)
+    return trees, bugs, pesticides
+
+
+def reset(swarm, state):
+    # BugSwarm rebinds its arrays at every step, restoring the references restores the population
+    swarm.positions, swarm.alive, swarm.escaped, swarm.n_alive = state
+
+
+def bug_move(environment, n_bugs, repeats):
+    trees, bugs, pesticides = make_scene(n_bugs, 30)
+
+    def legacy():
+        # the bugs that would leave the field are put back at their start, Bug.move does not check the bounds
+        for bug, start in zip(moved, starts):
+            bug.move(environment, trees, moved, pesticides)
+            if not (0 <= bug.position[0] < SIZE[0] and 0 <= bug.position[1] < SIZE[1]):
+                bug.position = start
+
+    moved = copy.deepcopy(bugs)
+    starts = [bug.position for bug in bugs]
+    swarm = BugSwarm.from_bugs(bugs)
+    state = (swarm.positions, swarm.alive, swarm.escaped, swarm.n_alive)
+    field = PesticideField.from_pesticides(pesticides)
+
+    def batched():
+        reset(swarm, state)
+        swarm.move(environment, trees, field)
+
+    return {'legacy': measure(legacy, repeats), 'batched': measure(batched, repeats)}
+
+
+def affects_bug(n_bugs, n_sprayers, repeats):
+    _, bugs, pesticides = make_scene(n_bugs, n_sprayers)
+
+    def legacy():
+        for bug in bugs:
+            for pesticide in pesticides:
+                if pesticide.affects_bug(bug):
+                    break
+
+    swarm = BugSwarm.from_bugs(bugs)
+    state = (swarm.positions, swarm.alive, swarm.escaped, swarm.n_alive)
+    field = PesticideField.from_pesticides(pesticides)
+
+    def batched():
+        reset(swarm, state)
+        swarm.expose(field)
+
+    return {'legacy': measure(legacy, repeats), 'batched': measure(batched, repeats)}
+
+
+def generate_heatmap(environment, repeats):
+    positions = np.array(environment.positions)
+    values = environment.current_temperature[0]
+
+    def legacy():
+        heatmap = np.zeros(SIZE)
+        for x in range(SIZE[0]):
+            for y in range(SIZE[1]):
+                heatmap[x, y] = environment.inverse_distance_weighting(x, y, positions, values)
+        return heatmap
+
+    def batched():
+        return environment.generate_heatmap(environment.positions, environment.current_temperature)
+
+    return {'legacy': measure(legacy, max(1, repeats // 5)), 'batched': measure(batched, repeats)}
+
+
+def update_conditions(environment, repeats):
+    # every call forecasts the following hour
+    return {'batched': measure(environment.update_conditions, repeats)}
+
+
+def compiled_kernels(n_bugs, n_sprayers, repeats):
+    if not kernels.available():
+        return {'numba': 'unavailable'}
+    _, bugs, pesticides = make_scene(n_bugs, n_sprayers)
+    points = np.array([bug.position for bug in bugs], dtype=float)
+    weights = np.full(n_bugs, 0.5)
+    field = PesticideField.from_pesticides(pesticides)
+    positions, radii, quantities, mortality = field.arrays(('position', 'radius', 'quantity', 'mortality_probability'))
+    results = {}
+    for backend in ('numpy', 'numba'):
+        compiled = kernels.select(backend)
+        functions = {'attraction': lambda: attraction(points, points, weights, compiled=compiled),
+                     'dense_deaths': lambda: sample_deaths(positions, radii, quantities, mortality, points, 'dense',
+                                                           compiled=compiled)}
+        for name, function in functions.items():
+            function()  # compilation
+            results.setdefault(name, {})[backend] = measure(function, repeats)
+    for timings in results.values():
+        timings['speedup'] = timings['numpy']['median_s'] / timings['numba']['median_s']
+    return results
+
+
+def run(bug_counts=(50, 200, 800), sprayer_counts=(1, 30, 90), repeats=5):
+    environment = make_environment()
+    results = {'generate_heatmap': generate_heatmap(environment, repeats),
+               'update_conditions': update_conditions(environment, repeats)}
+    for n in bug_counts:
+        results[f'bug_move/bugs_{n}'] = bug_move(environment, n, repeats)
+        for s in sprayer_counts:
+            results[f'affects_bug/bugs_{n}/sprayers_{s}'] = affects_bug(n, s, repeats)
+    for n in bug_counts:
+        results[f'kernels/bugs_{n}'] = compiled_kernels(n, max(sprayer_counts), repeats)
+    for name, timings in results.items():
+        if 'legacy' in timings:
+            timings['speedup'] = timings['legacy']['median_s'] / timings['batched']['median_s']
+    return results
+
+
+if __name__ == "__main__":
+    from .suite import main
+    main(["--only", "micro"])
@@ -0,0 +1,41 @@
+import numpy as np
+
+from models.ai.registry import registry
+from .common import MODELS, SCALERS
+
+#######################################################################################################################
+# Stand-ins for the trained artifacts, so that the benchmarks run offline when the models are not available.
+# They have the interface of the real ones (predict / transform / inverse_transform) and a comparable cost for the
+# simulation around them, not the same forecasts.
+#######################################################################################################################
+
+
+class PersistenceModel:
+    """Forecasts the next hour as the last one of the window."""
+
+    def predict(self, x, verbose=0, batch_size=None):
+        return np.asarray(x, dtype=float)[:, -1, :]
+
+
+class IdentityScaler:
+    def transform(self, x):
+        return np.asarray(x, dtype=float)
+
+    def inverse_transform(self, x):
+        return np.asarray(x, dtype=float)
+
+
+def install():
+    """Pins the stubs in the artifact registry under the names of the models and scalers (both backends)."""
+    for name in MODELS:
+        model = PersistenceModel()
+        registry.pin(name, model)
+        registry.pin(registry.numpy_artifact(name), model)
+    for name in SCALERS:
+        scaler = IdentityScaler()
+        registry.pin(name, scaler)
+        registry.pin(registry.numpy_artifact(name), scaler)
+
+
+def uninstall():
+    registry.unpin()
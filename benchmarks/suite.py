@@ -0,0 +1,90 @@
+import argparse
+import json
+import sys
+
+from . import common, e2e, import_time, micro, stubs
+
+#######################################################################################################################
+# Runs the benchmarks and saves them, with the machine and the commit, to output/benchmarks/<name>.json.
+#   python -m benchmarks.suite [--quick] [--stub] [--only micro e2e domains imports lstm] [--name NAME]
+#   python -m benchmarks.suite compare output/benchmarks/before.json output/benchmarks/after.json
+# Without the trained models (or with --stub) the forecasts come from the stand-ins of benchmarks.stubs: the
+# timings of the simulation stay meaningful, the LSTM ones do not.
+#######################################################################################################################
+
+SECTIONS = ("micro", "e2e", "domains", "imports", "lstm")
+
+
+def run(sections=SECTIONS, quick=False, stub=False):
+    stub = stub or not common.artifacts_available()
+    if stub:
+        stubs.install()
+    try:
+        results = {'metadata': common.metadata(stub)}
+        if "micro" in sections:
+            results['micro'] = micro.run(bug_counts=(50, 200) if quick else (50, 200, 800),
+                                         repeats=3 if quick else 5)
+        if "e2e" in sections:
+            results['e2e'] = e2e.run(quick)
+        if "domains" in sections:
+            results['domains'] = e2e.domains(quick)
+        if "imports" in sections:
+            results['imports'] = import_time.run()
+        if "lstm" in sections and not stub:
+            from . import lstm_backends
+            results['lstm'] = lstm_backends.run(repeats=5 if quick else 20)
+        return results
+    finally:
+        if stub:
+            stubs.uninstall()
+
+
+def timings(results, prefix=""):
+    """Flattens the results to {path: seconds} over the keys ending with _s."""
+    flat = {}
+    for key, value in results.items():
+        if key == 'metadata' or key == 'replicates':
+            continue
+        path = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(timings(value, path))
+        elif key.endswith("_s") and isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(before_path, after_path):
+    """Prints the timings of two saved runs side by side with their ratio (after / before)."""
+    with open(before_path) as file:
+        before = timings(json.load(file))
+    with open(after_path) as file:
+        after = timings(json.load(file))
+    print(f"{'benchmark':<70} {'before':>10} {'after':>10} {'ratio':>7}")
+    for path in sorted(set(before) & set(after)):
+        ratio = after[path] / before[path] if before[path] > 0 else float('nan')
+        print(f"{path:<70} {before[path]:>10.4f} {after[path]:>10.4f} {ratio:>7.2f}")
+    for path in sorted(set(before) ^ set(after)):
+        print(f"{path:<70} only in {'before' if path in before else 'after'}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "compare":
+        if len(argv) != 3:
+            sys.exit("usage: python -m benchmarks.suite compare BEFORE.json AFTER.json")
+        return compare(argv[1], argv[2])
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument("--quick", action="store_true", help="fewer sizes and repeats")
+    parser.add_argument("--stub", action="store_true", help="stand-in models even if the trained ones exist")
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument("--name", default=None, help="name of the results file (default: the sections run)")
+    args = parser.parse_args(argv)
+    results = run(args.only, args.quick, args.stub)
+    name = args.name or ("suite" if set(args.only) == set(SECTIONS) else "_".join(args.only))
+    path = common.save(results, name)
+    print(f"results saved to {path}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,75 @@
-from models.twin import Simulation
-from models.twin_exp import Twin
-import pandas as pd
-import random
-import math
-import numpy as np
+from models.experiment import make_orchard_grid, make_pesticide_parameters
+from models.runner import ReplicateRunner
+from models.montecarlo import SequentialRunner
+from models.sweep import Sweep
+from models.io.logger import logger
+import sys
 import os
-import time
 
-def generate_wind_conditions():
+# columns of the layout and efficiency experiments
+COLUMNS = [
+    'index', 'quantity',
+    'radius_mean', 'radius_std',
+    'hours_mean', 'hours_std',
+    'time_mean', 'time_std',
+    'dead_mean', 'dead_std',
+    'alive_mean', 'alive_std',
+    'left_mean', 'left_std'
+]
+
+# number of seeded replicates of every configuration
+SEEDS = range(13)
+# seeds available to the sequential runs, which stop earlier once precise enough
+MAX_SEEDS = range(100)
+
+
+def print_replicate(idx, replicate):
+    logger.info('replicate', config=idx, seed=replicate['seed'], seconds=round(replicate['time'], 2))
+    if 'profile' in replicate:
+        logger.info('phases', config=idx, seed=replicate['seed'],
+                    **{name: round(phase['seconds'], 3) for name, phase in replicate['profile']['phases'].items()})
+
+
+def with_profiling(configs, save_path):
     """
-    Generate realistic random wind conditions.
-    Returns:
-        direction (tuple): Unit vector (x, y) representing wind direction.
-        speed (float): Wind speed in m/s.
+    PHASES=1 returns the phase timers of every replicate; PROFILE=<config>:<seed> runs that replicate under
+    cProfile, with the statistics saved next to the output CSV.
     """
-    # Random direction in 2D (angle in radians)
-    angle = random.uniform(0, 2 * math.pi)
-    direction = [math.cos(angle), math.sin(angle)]  # Unit vector
+    if os.environ.get("PHASES"):
+        for config in configs:
+            config['environment_parameters'] = dict(config.get('environment_parameters', {}), profile=True)
+    if os.environ.get("PROFILE"):
+        idx, seed = (int(v) for v in os.environ["PROFILE"].split(":"))
+        configs[idx]['cprofile'] = {'seed': seed,
+                                    'path': f"{os.path.splitext(save_path)[0]}_config{idx}_seed{seed}.prof"}
+    return configs
 
-    # Realistic wind speed: most often between 1 and 15 m/s
-    # We'll use a Weibull distribution to simulate typical wind speed distribution
-    k = 2.0  # Shape parameter (typical for many locations)
-    lam = 6.0  # Scale parameter (mean wind speed around 5-7 m/s)
 
-    speed = random.weibullvariate(lam, k)
+def make_runner(workers):
+    """
+    Runner of the replicates and seeds to run. TOLERANCE=dead:10,left:10 runs every configuration until the
+    confidence intervals of these metrics are narrower than the tolerances (RELATIVE=1 for fractions of the
+    means), on at most MAX_SEEDS seeds; ANTITHETIC=1 pairs every seed with its antithetic wind
+    (see models/montecarlo.py). Otherwise the SEEDS replicates of every configuration are run.
+    """
+    if not os.environ.get("TOLERANCE"):
+        return ReplicateRunner(workers), SEEDS
+    tolerance = {metric: float(width) for metric, width in
+                 (item.split(":") for item in os.environ["TOLERANCE"].split(","))}
+    runner = SequentialRunner(workers, tolerance, relative=bool(os.environ.get("RELATIVE")),
+                              antithetic=bool(os.environ.get("ANTITHETIC")))
+    return runner, MAX_SEEDS
+
 
-    return direction, speed
+def print_stats(idx, stats):
+    # sequential runs report the seeds used and the widths of the intervals
+    if 'seeds' in stats:
+        logger.info('converged', config=idx, seeds=stats['seeds'],
+                    **{name: round(value, 3) for name, value in stats.items() if name.endswith('_ci')})
 
-def pesticide_test():
+
+def pesticide_test(workers=1):
+    import pandas as pd  # deferred: sweeps and short runs do not need it
     save_path = os.path.join('output', 'pesticide_exp.csv')  # Change this path accordingly
 
     # === Prepare the results DataFrame ===
@@ -39,198 +81,73 @@ def pesticide_test():
 
     # === List of quantities to test ===
     quantities = [1, 100, 200, 300, 500, 800, 1000]
-    indexes = [0, 1, 2, 3, 4, 5, 6]
-    for quantity in quantities:
-        print(f"================== TEST PESTICIDE: quantity = {quantity} ==================")
-        pesticide_parameters = {'quantity': quantity, 'initial_radius': 1, 'number': 1, 'positions': [[50, 50]]}
-
-        radius_list = []
-        hours_list = []
-
-        for i in range(13):
-            np.random.seed(i)
-            random.seed(i)
-            print(f"Iteration {i} starting...")
-            d, s = generate_wind_conditions()
-            wind = {"direction": d, "speed": s}
-            environment_parameters = {'starting_date': 25, 'sequence_length': 24, 'time_step': 10, 'wind': wind}
-
-            DT = Twin(environment_parameters, bugs_parameters, tree_parameters, pesticide_parameters)
-            results = DT.run()
-
-            radius_list.append(results['pesticide_radius']/1000)
-            hours_list.append(results['pesticide_decay'])
-            print(f"Iteration {i} ended.")
-        # Compute stats
-        radius_mean = np.mean(radius_list)
-        radius_std = np.std(radius_list)
-        hours_mean = np.mean(hours_list)
-        hours_std = np.std(hours_list)
-
-        # Append to DataFrame
-        df.loc[len(df)] = [quantity, radius_mean, radius_std, hours_mean, hours_std]
+    configs = [{
+        'bugs_parameters': bugs_parameters,
+        'tree_parameters': tree_parameters,
+        'pesticide_parameters': {'quantity': quantity, 'initial_radius': 1, 'number': 1, 'positions': [[50, 50]]}
+    } for quantity in quantities]
+    configs = with_profiling(configs, save_path)
+    runner, seeds = make_runner(workers)
+
+    # replicates run over the worker pool, rows are added as soon as a quantity is complete
+    for idx, replicates, stats in runner.run(configs, seeds, print_replicate):
+        logger.info('test_pesticide', quantity=quantities[idx])
+        print_stats(idx, stats)
+        df.loc[len(df)] = [idx, quantities[idx], stats['radius_mean'], stats['radius_std'],
+                           stats['hours_mean'], stats['hours_std']]
 
     # === Save DataFrame to CSV ===
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    df.to_csv(save_path, index=False)
-
-# === Helper to index into grid ===
-def get_grid_index(row, col, total_cols):
-    return row * total_cols + col
-
-# === Function to construct pesticide parameters based on layout ===
-def make_pesticide_parameters(layout, quantity, rows, cols, grid):
-    pos_layout = []
-    if layout == 0:
-        # === Layout 1: Checkerboard (even rows AND odd columns) ===
-        pos_layout = []
-        for r in range(rows):
-            for c in range(cols):
-                if r % 2 == 0 and c % 2 == 1:
-                    idx = get_grid_index(r, c, cols)
-                    pos_layout.append(grid[idx])
-    if layout == 1:
-        # === Layout 2: Alternate Full Rows (e.g., rows 0, 2, 4...) ===
-        pos_layout = []
-        for r in range(rows):
-            if r % 2 == 0:
-                for c in range(cols):
-                    idx = get_grid_index(r, c, cols)
-                    pos_layout.append(grid[idx])
-    if layout == 2:
-        # === Layout 3: Alternate Full Columns (e.g., columns 0, 2, 4...) ===
-        pos_layout = []
-        for r in range(rows):
-            for c in range(cols):
-                if c % 2 == 0:
-                    idx = get_grid_index(r, c, cols)
-                    pos_layout.append(grid[idx])
-
-    return {
-        'quantity': quantity / len(pos_layout),
-        'initial_radius': 1,
-        'number': len(pos_layout),
-        'positions': pos_layout
-    }
+    df.sort_values('index').to_csv(save_path, index=False)
 
-def pesticide_layout():
+
+def pesticide_layout(workers=1):
+    import pandas as pd  # deferred: sweeps and short runs do not need it
     rows, cols = 12, 15
 
     # === Prepare the results DataFrame ===
-    df = pd.DataFrame(columns=[
-        'index', 'quantity',
-        'radius_mean', 'radius_std',
-        'hours_mean', 'hours_std',
-        'time_mean', 'time_std',
-        'dead_mean', 'dead_std',
-        'alive_mean', 'alive_std',
-        'left_mean', 'left_std'
-    ])
+    df = pd.DataFrame(columns=COLUMNS)
 
     # === Fixed parameters ===
-    grid = []  # 12x15 --> distanza fra filari è 3 metri, la distanza tra le piante è 1.5
-    for r in range(rows):
-        for c in range(cols):
-            grid.append([r * 3 + 33, c * 1.5 + 45])
+    grid = make_orchard_grid(rows, cols)
     tree_parameters = {'number': 1, 'max_pears': 10, 'positions': grid}
     quantity = 1800  # grams
 
     bugs_parameters = {'number': 400}
 
-
-    # === List of bug counts to test ===
+    # === List of layouts to test ===
     indexes = [0, 1, 2]
-
-    for idx in indexes:
-        print(f"================== TEST LAYOUT: Number = {idx} ==================")
+    configs = [{
+        'bugs_parameters': bugs_parameters,
+        'tree_parameters': tree_parameters,
+        'pesticide_parameters': make_pesticide_parameters(idx, quantity, rows, cols, grid)
+    } for idx in indexes]
+    configs = with_profiling(configs, os.path.join('output', 'layout_exp.csv'))
+    runner, seeds = make_runner(workers)
+
+    for i, replicates, stats in runner.run(configs, seeds, print_replicate):
+        idx = indexes[i]
+        logger.info('test_layout', layout=idx)
+        print_stats(i, stats)
         save_path = os.path.join('output', f'layout_exp_{idx}.csv')  # Change this path accordingly
-        pesticide_parameters = make_pesticide_parameters(idx, quantity, rows, cols, grid)
-        radius_list = []
-        hours_list = []
-        time_list = []
-        dead_list = []
-        alive_list = []
-        left_list = []
-
-        for i in range(13):
-            np.random.seed(i)
-            random.seed(i)
-            print(f"Iteration {i} starting...")
-
-            d, s = generate_wind_conditions()
-            wind = {"direction": d, "speed": s}
-            environment_parameters = {
-                'starting_date': 25,
-                'sequence_length': 24,
-                'time_step': 10,
-                'wind': wind
-            }
-
-            start_time = time.time()
-
-            DT = Twin(environment_parameters, bugs_parameters, tree_parameters, pesticide_parameters)
-            results = DT.run()
-
-            elapsed = time.time() - start_time
-
-            radius_list.append(results['pesticide_radius'] / 1000)
-            hours_list.append(results['pesticide_decay'])
-            time_list.append(elapsed)
-            dead_list.append(results['bug_deads'])
-            alive_list.append(results['bugs_survived'])
-            left_list.append(results['bugs_escaped'])
-
-            print(f"Iteration {i} ended in {elapsed:.2f} seconds.")
-
-        # Compute stats
-        radius_mean = np.mean(radius_list)
-        radius_std = np.std(radius_list)
-        hours_mean = np.mean(hours_list)
-        hours_std = np.std(hours_list)
-        time_mean = np.mean(time_list)
-        time_std = np.std(time_list)
-        dead_mean = np.mean(dead_list)
-        dead_std = np.std(dead_list)
-        alive_mean = np.mean(alive_list)
-        alive_std = np.std(alive_list)
-        left_mean = np.mean(left_list)
-        left_std = np.std(left_list)
 
         # Append to DataFrame
-        df.loc[len(df)] = [
-            idx, quantity,
-            radius_mean, radius_std,
-            hours_mean, hours_std,
-            time_mean, time_std,
-            dead_mean, dead_std,
-            alive_mean, alive_std,
-            left_mean, left_std
-        ]
+        df.loc[len(df)] = [idx, quantity] + [stats[c] for c in COLUMNS[2:]]
 
         # === Save DataFrame to CSV ===
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
         df.to_csv(save_path, index=False)
 
 
-def pesticide_efficiency():
+def pesticide_efficiency(workers=1):
+    import pandas as pd  # deferred: sweeps and short runs do not need it
     save_path = os.path.join('output', 'efficiency_exp.csv')  # Change this path accordingly
 
     # === Prepare the results DataFrame ===
-    df = pd.DataFrame(columns=[
-        'index', 'quantity',
-        'radius_mean', 'radius_std',
-        'hours_mean', 'hours_std',
-        'time_mean', 'time_std',
-        'dead_mean', 'dead_std',
-        'alive_mean', 'alive_std',
-        'left_mean', 'left_std'
-    ])
+    df = pd.DataFrame(columns=COLUMNS)
 
     # === Fixed parameters ===
-    grid = []  # 12x15 --> distanza fra filari è 3 metri, la distanza tra le piante è 1.5
-    for r in range(12):
-        for c in range(15):
-            grid.append([r * 3 + 33, c * 1.5 + 45])
+    grid = make_orchard_grid()
     tree_parameters = {'number': 1, 'max_pears': 10, 'positions': grid}
     quantity = 1800  # grams
     pesticide_parameters = {
@@ -243,82 +160,43 @@ def pesticide_efficiency():
     # === List of bug counts to test ===
     bugs = [1, 20, 50, 100, 200, 400, 600, 1000]
     indexes = [0, 1, 2, 3, 4, 5, 6, 7]
-
-    for idx, n in zip(indexes, bugs):
-        print(f"================== TEST BUGS: Number = {n} ==================")
-        bugs_parameters = {'number': n}
-
-        radius_list = []
-        hours_list = []
-        time_list = []
-        dead_list = []
-        alive_list = []
-        left_list = []
-
-        for i in range(13):
-            np.random.seed(i)
-            random.seed(i)
-            print(f"Iteration {i} starting...")
-
-            d, s = generate_wind_conditions()
-            wind = {"direction": d, "speed": s}
-            environment_parameters = {
-                'starting_date': 25,
-                'sequence_length': 24,
-                'time_step': 10,
-                'wind': wind
-            }
-
-            start_time = time.time()
-
-            DT = Twin(environment_parameters, bugs_parameters, tree_parameters, pesticide_parameters)
-            results = DT.run()
-
-            elapsed = time.time() - start_time
-
-            radius_list.append(results['pesticide_radius'] / 1000)
-            hours_list.append(results['pesticide_decay'])
-            time_list.append(elapsed)
-            dead_list.append(results['bug_deads'])
-            alive_list.append(results['bugs_survived'])
-            left_list.append(results['bugs_escaped'])
-
-            print(f"Iteration {i} ended in {elapsed:.2f} seconds.")
-
-        # Compute stats
-        radius_mean = np.mean(radius_list)
-        radius_std = np.std(radius_list)
-        hours_mean = np.mean(hours_list)
-        hours_std = np.std(hours_list)
-        time_mean = np.mean(time_list)
-        time_std = np.std(time_list)
-        dead_mean = np.mean(dead_list)
-        dead_std = np.std(dead_list)
-        alive_mean = np.mean(alive_list)
-        alive_std = np.std(alive_list)
-        left_mean = np.mean(left_list)
-        left_std = np.std(left_list)
-
+    configs = [{
+        'bugs_parameters': {'number': n},
+        'tree_parameters': tree_parameters,
+        'pesticide_parameters': pesticide_parameters
+    } for n in bugs]
+    configs = with_profiling(configs, save_path)
+    runner, seeds = make_runner(workers)
+
+    for i, replicates, stats in runner.run(configs, seeds, print_replicate):
+        logger.info('test_bugs', bugs=bugs[i])
+        print_stats(i, stats)
         # Append to DataFrame
-        df.loc[len(df)] = [
-            idx, quantity,
-            radius_mean, radius_std,
-            hours_mean, hours_std,
-            time_mean, time_std,
-            dead_mean, dead_std,
-            alive_mean, alive_std,
-            left_mean, left_std
-        ]
+        df.loc[len(df)] = [indexes[i], quantity] + [stats[c] for c in COLUMNS[2:]]
 
     # === Save DataFrame to CSV ===
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    df.to_csv(save_path, index=False)
-
+    df.sort_values('index').to_csv(save_path, index=False)
 
 
+def run_sweep(spec_path, workers=1):
+    """Runs (or resumes after an interruption) the sweep described by a spec file, see models/sweep.py."""
+    sweep = Sweep.from_file(spec_path)
+    logger.info('sweep', name=sweep.name, points=len(sweep.points), seeds=len(sweep.seeds))
+    for row in sweep.run(workers, print_replicate):
+        logger.info('point', key=row['key'], **{name: row[name] for name in sweep.axes})
 
 
 if __name__ == "__main__":
-    # pesticide_test()
-    # pesticide_efficiency()
-    pesticide_layout()
+    # number of worker processes for the replicates, 1 runs them serially
+    workers = int(os.environ.get("WORKERS", 1))
+    # progress on the standard output; LOG_LEVEL=DEBUG also logs every instant of the runs,
+    # LOG_FILE=output/logs/run_{pid}.jsonl writes JSON lines instead
+    logger.configure(os.environ.get("LOG_LEVEL", "INFO"), os.environ.get("LOG_FILE"))
+    if len(sys.argv) > 1:
+        # e.g. python main.py data/sweeps/pesticide_layout.json
+        run_sweep(sys.argv[1], workers)
+    else:
+        # pesticide_test(workers)
+        # pesticide_efficiency(workers)
+        pesticide_layout(workers)
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from collections import Counter
+import numpy as np
+
+
+class _Request:
+    def __init__(self, x):
+        self.x = x
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+def _forward(model, inputs):
+    # one forward pass over the concatenated inputs, split back per caller
+    sizes = [len(x) for x in inputs]
+    y = model.predict(np.concatenate(inputs), verbose=0, batch_size=max(sum(sizes), 1))
+    return np.split(y, np.cumsum(sizes)[:-1])
+
+
+class InferenceBroker:
+    """
+    Micro-batching front end of a Keras model shared by many environments of the same process.
+    predict() has the signature of model.predict and can be called concurrently (e.g. replicates run in threads):
+    pending requests are collected until max_batch samples are queued or timeout seconds have passed since the
+    first one, then they go through a single forward pass and each caller gets its own rows back. The achieved
+    batch sizes are counted in the histogram.
+    """
+
+    _brokers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model, max_batch=32, timeout=0.005):
+        self.model = model
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.pending = []
+        self.condition = threading.Condition()
+        self.histogram = Counter()
+        self.closed = False
+        self.worker = None
+
+    @classmethod
+    def for_model(cls, model, max_batch=32, timeout=0.005):
+        """Broker shared by all the callers of a model."""
+        with cls._lock:
+            broker = cls._brokers.get(id(model))
+            if broker is None or broker.model is not model or broker.closed:
+                broker = cls(model, max_batch, timeout)
+                cls._brokers[id(model)] = broker
+            # the last requested settings apply to the shared broker
+            broker.max_batch, broker.timeout = max_batch, timeout
+            return broker
+
+    def predict(self, x, verbose=0, batch_size=None):
+        request = _Request(np.asarray(x))
+        with self.condition:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.serve, daemon=True)
+                self.worker.start()
+            self.pending.append(request)
+            self.condition.notify_all()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def forward(self, batch):
+        self.histogram[sum(len(x) for x in batch)] += 1
+        return _forward(self.model, batch)
+
+    def serve(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if self.closed and not self.pending:
+                    return
+                # wait for more requests until the batch is full or the timeout expires
+                deadline = time.monotonic() + self.timeout
+                while sum(len(r.x) for r in self.pending) < self.max_batch and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = []
+                size = 0
+                while self.pending and (not batch or size + len(self.pending[0].x) <= self.max_batch):
+                    request = self.pending.pop(0)
+                    batch.append(request)
+                    size += len(request.x)
+            self.execute(batch)
+
+    def execute(self, batch):
+        try:
+            results = self.forward([r.x for r in batch])
+            for request, y in zip(batch, results):
+                request.result = y
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        for request in batch:
+            request.done.set()
+
+    def stats(self):
+        """Number of forward passes, samples served and histogram {batch size: passes}."""
+        return {
+            'batches': sum(self.histogram.values()),
+            'samples': sum(size * n for size, n in self.histogram.items()),
+            'histogram': dict(sorted(self.histogram.items()))
+        }
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def after_fork(self):
+        # the worker thread does not survive a fork: the child starts its own on its first request, and the
+        # pending requests of the parent threads are dropped (their callers do not exist in the child)
+        self.pending = []
+        self.condition = threading.Condition()
+        self.worker = None
+
+    @classmethod
+    def reset_after_fork(cls):
+        cls._lock = threading.Lock()
+        for broker in cls._brokers.values():
+            broker.after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=InferenceBroker.reset_after_fork)
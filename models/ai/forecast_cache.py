@@ -0,0 +1,83 @@
+import os
+import threading
+import numpy as np
+
+from ..io.cache import cache_path, digest, save_arrays
+from .registry import registry
+
+MODELS = ("lstm_temperature_model.keras", "lstm_humidity_model.keras")
+SCALERS = ("scaler_temperature.save", "scaler_humidity.save")
+
+
+def loaded_artifacts(backend="keras"):
+    """
+    Files of the models and scalers that Environment runs with a backend. They are loaded through the registry
+    first, so that exported NumPy weights are refreshed and the digests are those of the files actually used.
+    """
+    scalers = "numpy" if backend == "numpy" else "joblib"
+    for name in MODELS:
+        registry.load_model(name, backend)
+    for name in SCALERS:
+        registry.load_scaler(name, scalers)
+    names = MODELS + SCALERS
+    return tuple(registry.numpy_artifact(name) for name in names) if backend == "numpy" else names
+
+
+class ForecastTrajectory:
+    """
+    Hourly forecasts produced by Environment.update_conditions from a given starting point.
+    The autoregressive rollout only depends on the initial climate windows and on the trained artifacts, so the
+    predicted rows are cached under (start index, window length, data key, model hash) and replayed by every run
+    starting from the same date. The trajectory is extended on demand when a run lasts longer than the
+    cached one and it is persisted on disk after every extension.
+    """
+
+    _trajectories = {}
+    _lock = threading.Lock()
+
+    def __init__(self, key, use_disk=True):
+        self.key = key
+        self.path = cache_path("forecasts", f"forecast_{key}.npz") if use_disk else None
+        self.temperature = []
+        self.humidity = []
+        if self.path is not None and os.path.exists(self.path):
+            with np.load(self.path) as data:
+                self.temperature = list(data["temperature"])
+                self.humidity = list(data["humidity"])
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def get(cls, start, length, data_key="", backend="keras"):
+        """Trajectory shared by the process for a starting index, a window length and the artifacts of a backend."""
+        model_hash = digest(*[registry.digest(name) for name in loaded_artifacts(backend)])
+        return cls.from_key(digest(str(start), str(length), str(data_key), model_hash))
+
+    @classmethod
+    def from_key(cls, key):
+        with cls._lock:
+            if key not in cls._trajectories:
+                cls._trajectories[key] = cls(key)
+            return cls._trajectories[key]
+
+    def __reduce__(self):
+        # pickled by key: the unpickled trajectory is the one shared by the receiving process (reloaded from disk)
+        return ForecastTrajectory.from_key, (self.key,)
+
+    def __len__(self):
+        return len(self.temperature)
+
+    def __getitem__(self, step):
+        """New (temperature, humidity) rows predicted at the given hour, including the date features."""
+        self.hits += 1
+        return self.temperature[step], self.humidity[step]
+
+    def append(self, step, temperature_row, humidity_row):
+        """Stores the rows predicted at the given hour, if it extends the trajectory."""
+        self.misses += 1
+        if step != len(self.temperature):
+            return
+        self.temperature.append(np.asarray(temperature_row, dtype=float))
+        self.humidity.append(np.asarray(humidity_row, dtype=float))
+        if self.path is not None:
+            save_arrays(self.path, temperature=np.array(self.temperature), humidity=np.array(self.humidity))
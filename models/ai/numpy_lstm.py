@@ -0,0 +1,180 @@
+import io
+import json
+import os
+import re
+import zipfile
+import numpy as np
+
+from ..io.cache import file_digest
+
+#######################################################################################################################
+# Pure NumPy inference for the forecasting networks built in weather-forecasting/forecast.py:
+# LSTM(64, return_sequences=True) -> Dropout -> LSTM(32) -> Dropout -> Dense(13 + 4).
+# The weights of a trained .keras model are exported once to a plain .npz file next to it, so that simulations can
+# run the forecasts without importing TensorFlow.
+#######################################################################################################################
+
+SUPPORTED = ("LSTM", "Dense", "Dropout")
+# activations implemented by NumpyLSTMModel; anything else is rejected at export time
+ACTIVATIONS = {"lstm": {"activation": "tanh", "recurrent_activation": "sigmoid"}, "dense": {"activation": "linear"}}
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def _layers_from_keras(model):
+    layers = []
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind not in SUPPORTED:
+            raise ValueError(f"Layer {layer.name} of type {kind} is not supported by the NumPy backend.")
+        if kind == "Dropout":
+            continue  # identity at inference time
+        config = layer.get_config()
+        weights = layer.get_weights()
+        if kind == "LSTM":
+            layers.append({"type": "lstm", "return_sequences": config["return_sequences"],
+                           "activation": config["activation"], "recurrent_activation": config["recurrent_activation"],
+                           "kernel": weights[0], "recurrent_kernel": weights[1], "bias": weights[2]})
+        else:
+            layers.append({"type": "dense", "activation": config["activation"], "kernel": weights[0], "bias": weights[1]})
+    return layers
+
+
+def _layers_from_archive(path):
+    """Reads architecture and weights straight from the .keras archive (config.json + model.weights.h5)."""
+    import h5py
+    with zipfile.ZipFile(path) as archive:
+        config = json.loads(archive.read("config.json"))
+        weights_file = h5py.File(io.BytesIO(archive.read("model.weights.h5")), "r")
+
+    # variables grouped by layer name; archives saved on Windows use backslashes in the paths
+    variables = {}
+
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset) and name.split("/")[-2] == "vars" and not name.startswith(("optimizer", "metrics")):
+            layer = re.split(r"[\\/]", name.replace("_layer_checkpoint_dependencies", ""))
+            layer = [part for part in layer if part and part not in ("cell", "vars")][0]
+            variables.setdefault(layer, {})[int(name.split("/")[-1])] = obj[()]
+    weights_file.visititems(visit)
+    weights_file.close()
+
+    def natural(name):
+        match = re.match(r"(.*?)(?:_(\d+))?$", name)
+        return match.group(1), int(match.group(2) or 0)
+
+    by_kind = {}
+    for name in sorted(variables, key=natural):
+        by_kind.setdefault(natural(name)[0], []).append([variables[name][i] for i in sorted(variables[name])])
+
+    layers = []
+    for layer in config["config"]["layers"]:
+        kind = layer["class_name"]
+        if kind == "InputLayer":
+            continue
+        if kind not in SUPPORTED:
+            raise ValueError(f"Layer {layer['config']['name']} of type {kind} is not supported by the NumPy backend.")
+        if kind == "Dropout":
+            continue
+        weights = by_kind[kind.lower()].pop(0)
+        if kind == "LSTM":
+            layers.append({"type": "lstm", "return_sequences": layer["config"]["return_sequences"],
+                           "activation": layer["config"]["activation"],
+                           "recurrent_activation": layer["config"]["recurrent_activation"],
+                           "kernel": weights[0], "recurrent_kernel": weights[1], "bias": weights[2]})
+        else:
+            layers.append({"type": "dense", "activation": layer["config"]["activation"],
+                           "kernel": weights[0], "bias": weights[1]})
+    return layers
+
+
+def export_weights(keras_path, npz_path=None):
+    """
+    Writes the weights of a trained .keras model to a .npz file (by default next to it) and returns its path.
+    Keras is used when it can load the model; otherwise the archive is read directly with h5py.
+    """
+    npz_path = npz_path or os.path.splitext(keras_path)[0] + ".npz"
+    try:
+        import keras
+        layers = _layers_from_keras(keras.saving.load_model(keras_path))
+    except Exception:
+        layers = _layers_from_archive(keras_path)
+    for layer in layers:
+        for name, supported in ACTIVATIONS[layer["type"]].items():
+            if layer[name] != supported:
+                raise ValueError(f"Unsupported {name} {layer[name]} in {keras_path}: the NumPy backend only "
+                                 f"implements {supported} for {layer['type']} layers.")
+
+    arrays = {}
+    architecture = []
+    for idx, layer in enumerate(layers):
+        architecture.append({k: v for k, v in layer.items() if not isinstance(v, np.ndarray)})
+        for name, value in layer.items():
+            if isinstance(value, np.ndarray):
+                arrays[f"{idx}/{name}"] = value
+    # chained shapes: the input of every layer is the output of the previous one
+    for prev, layer in zip(layers, layers[1:]):
+        units = prev["recurrent_kernel"].shape[0] if prev["type"] == "lstm" else prev["kernel"].shape[1]
+        if layer["kernel"].shape[0] != units:
+            raise ValueError(f"Inconsistent layer shapes while exporting {keras_path}.")
+    np.savez(npz_path, architecture=json.dumps(architecture), source_sha256=file_digest(keras_path), **arrays)
+    return npz_path
+
+
+class NumpyLSTMModel:
+    """Forward pass of an exported model; predict() mirrors keras Model.predict."""
+
+    def __init__(self, layers, source_sha256=None):
+        self.layers = layers
+        self.source_sha256 = source_sha256
+
+    @classmethod
+    def load(cls, npz_path):
+        with np.load(npz_path) as data:
+            architecture = json.loads(str(data["architecture"]))
+            layers = []
+            for idx, layer in enumerate(architecture):
+                layer = dict(layer)
+                for name in ("kernel", "recurrent_kernel", "bias"):
+                    if f"{idx}/{name}" in data:
+                        layer[name] = data[f"{idx}/{name}"].astype(np.float64)
+                layers.append(layer)
+            return cls(layers, str(data["source_sha256"]))
+
+    @staticmethod
+    def lstm(x, kernel, recurrent_kernel, bias, return_sequences):
+        # gates in Keras order: input, forget, cell, output
+        batch, steps, _ = x.shape
+        units = recurrent_kernel.shape[0]
+        projected = x @ kernel + bias  # input projection of every time step at once
+        h = np.zeros((batch, units))
+        c = np.zeros((batch, units))
+        outputs = []
+        for t in range(steps):
+            z = projected[:, t] + h @ recurrent_kernel
+            i = _sigmoid(z[:, :units])
+            f = _sigmoid(z[:, units:2 * units])
+            c = f * c + i * np.tanh(z[:, 2 * units:3 * units])
+            o = _sigmoid(z[:, 3 * units:])
+            h = o * np.tanh(c)
+            if return_sequences:
+                outputs.append(h)
+        return np.stack(outputs, axis=1) if return_sequences else h
+
+    def predict(self, x, verbose=0, batch_size=None):
+        y = np.asarray(x, dtype=np.float64)
+        for layer in self.layers:
+            if layer["type"] == "lstm":
+                y = self.lstm(y, layer["kernel"], layer["recurrent_kernel"], layer["bias"], layer["return_sequences"])
+            else:
+                y = y @ layer["kernel"] + layer["bias"]
+                if layer["activation"] != "linear":
+                    raise ValueError(f"Unsupported activation {layer['activation']}.")
+        return y
+
+
+if __name__ == "__main__":
+    # python -m models.ai.numpy_lstm: exports the weights of the forecasting models
+    for name in ("lstm_temperature_model", "lstm_humidity_model"):
+        print(f"Exported {export_weights(os.path.join('models', 'ai', name + '.keras'))}")
@@ -0,0 +1,54 @@
+import os
+import numpy as np
+
+from ..io.cache import file_digest
+
+#######################################################################################################################
+# The MinMaxScalers of the forecasting models, exported to plain .npz files next to the joblib ones so that
+# simulations can normalize the climate windows without importing scikit-learn.
+#######################################################################################################################
+
+
+def export_scaler(joblib_path, npz_path=None):
+    """Writes scale_ and min_ of a fitted MinMaxScaler to a .npz file (by default next to it) and returns its path."""
+    import joblib
+    npz_path = npz_path or os.path.splitext(joblib_path)[0] + ".npz"
+    scaler = joblib.load(joblib_path)
+    if scaler.__class__.__name__ != "MinMaxScaler":
+        raise ValueError(f"{joblib_path}: only MinMaxScaler is supported by the NumPy backend.")
+    feature_range = np.array(scaler.feature_range, dtype=np.float64)
+    np.savez(npz_path, scale=scaler.scale_, min=scaler.min_, clip=bool(scaler.clip), feature_range=feature_range,
+             source_sha256=file_digest(joblib_path))
+    return npz_path
+
+
+class NumpyMinMaxScaler:
+    """transform() and inverse_transform() of an exported MinMaxScaler."""
+
+    def __init__(self, scale, min, clip=False, feature_range=(0, 1), source_sha256=None):
+        self.scale_ = scale
+        self.min_ = min
+        self.clip = clip
+        self.feature_range = feature_range
+        self.source_sha256 = source_sha256
+
+    @classmethod
+    def load(cls, npz_path):
+        with np.load(npz_path) as data:
+            return cls(data["scale"], data["min"], bool(data["clip"]), tuple(data["feature_range"]),
+                       str(data["source_sha256"]))
+
+    def transform(self, x):
+        x = np.asarray(x, dtype=np.float64) * self.scale_ + self.min_
+        if self.clip:
+            x = np.clip(x, *self.feature_range)
+        return x
+
+    def inverse_transform(self, x):
+        return (np.asarray(x, dtype=np.float64) - self.min_) / self.scale_
+
+
+if __name__ == "__main__":
+    # python -m models.ai.numpy_scaler: exports the scalers of the forecasting models
+    for name in ("scaler_temperature", "scaler_humidity"):
+        print(f"Exported {export_scaler(os.path.join('models', 'ai', name + '.save'))}")
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+
+from ..io.cache import file_digest
+
+AI_FOLDER = os.path.join("models", "ai")
+
+
+def _load_keras(path):
+    import keras
+    return keras.saving.load_model(path)
+
+
+def _load_numpy(path):
+    from .numpy_lstm import NumpyLSTMModel, export_weights
+    keras_path = os.path.splitext(path)[0] + ".keras"
+    model = NumpyLSTMModel.load(path)
+    if os.path.exists(keras_path) and model.source_sha256 != file_digest(keras_path):
+        # the .keras model was retrained after the export
+        export_weights(keras_path, path)
+        model = NumpyLSTMModel.load(path)
+    return model
+
+
+def _load_joblib(path):
+    import joblib
+    return joblib.load(path)
+
+
+def _load_numpy_scaler(path):
+    from .numpy_scaler import NumpyMinMaxScaler, export_scaler
+    joblib_path = os.path.splitext(path)[0] + ".save"
+    scaler = NumpyMinMaxScaler.load(path)
+    if os.path.exists(joblib_path) and scaler.source_sha256 != file_digest(joblib_path):
+        export_scaler(joblib_path, path)
+        scaler = NumpyMinMaxScaler.load(path)
+    return scaler
+
+
+class ArtifactRegistry:
+    """
+    Process-wide registry of the trained artifacts (LSTM models and scalers).
+    Each file is deserialized once and shared by every Environment; it is reloaded only when its content
+    changes: the mtime is checked on every request and, when it differs, the SHA-256 of the file decides.
+    """
+
+    def __init__(self, folder=AI_FOLDER):
+        self.folder = folder
+        self.entries = {}
+        self.pinned = {}
+        self.lock = threading.RLock()
+
+    def pin(self, filename, artifact):
+        """Serves an in-memory artifact under filename, without any file (e.g. stub models of offline benchmarks)."""
+        with self.lock:
+            self.pinned[filename] = artifact
+
+    def unpin(self, filename=None):
+        with self.lock:
+            if filename is None:
+                self.pinned.clear()
+            else:
+                self.pinned.pop(filename, None)
+
+    def get(self, filename, loader):
+        if filename in self.pinned:
+            return self.pinned[filename]
+        path = os.path.join(self.folder, filename)
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and (entry['mtime'], entry['size']) != (stat.st_mtime, stat.st_size):
+                # touched file: reuse the artifact if the content is the same
+                sha256 = file_digest(path)
+                if sha256 != entry['sha256']:
+                    entry = None
+                else:
+                    entry['mtime'], entry['size'] = stat.st_mtime, stat.st_size
+            if entry is not None:
+                entry['hits'] += 1
+                return entry['artifact']
+
+            start = time.perf_counter()
+            artifact = loader(path)
+            load_time = time.perf_counter() - start
+            previous = self.entries.get(path)
+            self.entries[path] = {
+                'artifact': artifact,
+                'sha256': file_digest(path),
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'loads': previous['loads'] + 1 if previous else 1,
+                'hits': 0,
+                'load_time': (previous['load_time'] if previous else 0) + load_time
+            }
+            return artifact
+
+    def load_model(self, filename, backend="keras"):
+        """
+        Forecasting model; with backend="numpy" the weights exported next to the .keras file are run by
+        NumpyLSTMModel and TensorFlow is never imported.
+        """
+        if backend == "numpy":
+            npz = self.numpy_artifact(filename)
+            if npz not in self.pinned and not os.path.exists(os.path.join(self.folder, npz)):
+                from .numpy_lstm import export_weights
+                export_weights(os.path.join(self.folder, filename), os.path.join(self.folder, npz))
+            return self.get(npz, _load_numpy)
+        return self.get(filename, _load_keras)
+
+    @staticmethod
+    def numpy_artifact(filename):
+        return os.path.splitext(filename)[0] + ".npz"
+
+    def load_scaler(self, filename, backend="joblib"):
+        """Fitted scaler; with backend="numpy" the exported scale_/min_ are used and scikit-learn is never imported."""
+        if backend == "numpy":
+            npz = self.numpy_artifact(filename)
+            if npz not in self.pinned and not os.path.exists(os.path.join(self.folder, npz)):
+                from .numpy_scaler import export_scaler
+                export_scaler(os.path.join(self.folder, filename), os.path.join(self.folder, npz))
+            return self.get(npz, _load_numpy_scaler)
+        return self.get(filename, _load_joblib)
+
+    def digest(self, filename):
+        """SHA-256 of an artifact file, hashed again only when its mtime or size differ from the loaded one."""
+        path = os.path.join(self.folder, filename)
+        with self.lock:
+            if filename in self.pinned:
+                return f"pinned-{id(self.pinned[filename])}"
+            entry = self.entries.get(path)
+            if entry is not None:
+                stat = os.stat(path)
+                if (entry['mtime'], entry['size']) == (stat.st_mtime, stat.st_size):
+                    return entry['sha256']
+        return file_digest(path)
+
+    def report(self):
+        """Loads, cache hits and total load time (s) of every artifact."""
+        with self.lock:
+            return {os.path.basename(path): {k: entry[k] for k in ('loads', 'hits', 'load_time', 'sha256')}
+                    for path, entry in self.entries.items()}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# shared by all the environments of the process
+registry = ArtifactRegistry()
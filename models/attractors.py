@@ -0,0 +1,61 @@
+import numpy as np
+
+from .neighbors import attraction
+from .raster import Grid
+from .swarm import fruit_arrays
+
+
+class StaticAttraction:
+    """
+    Attraction of the bugs towards the fruits (per tree, weighted by the ripe lifetimes) and towards the
+    warmer sensors (weighted by current_temperature / 30), the terms of Bug.move that do not depend on the
+    other bugs nor on the pesticides.
+    Trees and sensors are merged in one set of weighted sources, cached until update() finds different
+    weights, i.e. after the fruits changed or the environment rolled over to a new hour.
+    mode        'exact': every bug sums over the cached sources;
+                'grid': the vector field is precomputed on the nodes of a grid (`resolution` nodes per meter)
+                and bugs read it in O(1) by bilinear interpolation (approximate within a cell of a source)
+    """
+
+    def __init__(self, mode='exact', resolution=1, epsilon=1e-6):
+        if mode not in ('exact', 'grid'):
+            raise ValueError(f"Unknown static attraction mode '{mode}', expected 'exact' or 'grid'.")
+        self.mode = mode
+        self.resolution = resolution
+        self.epsilon = epsilon
+        self.sources = np.zeros((0, 2))
+        self.weights = np.zeros(0)
+        self.grid = None
+        self.field = None
+        self.builds = 0
+
+    def update(self, trees, environment):
+        """Refreshes the sources; the grid is rebuilt only if a weight changed. Returns True on a rebuild."""
+        tree_pos, tree_weights = fruit_arrays(trees)
+        sensor_weights = np.asarray(environment.current_temperature[0], dtype=float) / 30
+        sources = np.vstack([tree_pos, np.asarray(environment.positions, dtype=float).reshape(-1, 2)])
+        weights = np.concatenate([tree_weights, sensor_weights])
+        if self.field is not None and np.array_equal(sources, self.sources) and np.array_equal(weights, self.weights):
+            return False
+        self.sources, self.weights = sources, weights
+        if self.mode == 'grid':
+            if self.grid is None or self.grid.size != environment.get_size():
+                self.grid = Grid(environment.get_size(), self.resolution)
+            field = attraction(self.grid.nodes(), self.sources, self.weights, self.epsilon)
+            self.field = field.reshape(len(self.grid.xs), len(self.grid.ys), 2)
+        else:
+            self.field = True  # nothing to precompute besides the sources
+        self.builds += 1
+        return True
+
+    def invalidate(self):
+        """Forces the next update() to rebuild, e.g. after the fruits were changed in place."""
+        self.field = None
+
+    def attraction(self, points):
+        """Net attraction vector (n, 2) at every point."""
+        if self.field is None:
+            raise RuntimeError("StaticAttraction.update() must be called before querying the attraction.")
+        if self.mode == 'grid':
+            return self.grid.lookup(self.field, points)
+        return attraction(points, self.sources, self.weights, self.epsilon)
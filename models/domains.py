@@ -0,0 +1,306 @@
+import multiprocessing
+import random
+import traceback
+import numpy as np
+
+from .neighbors import attraction
+from .pesticide_field import PesticideField
+from .swarm import BugSwarm
+
+#######################################################################################################################
+# Spatial domain decomposition of a single Twin run over worker processes.
+# The field is split in a grid of rectangular domains (strips with shape (n, 1)); every domain is owned by one
+# worker, with the bugs inside it and the sprayers placed in it. Every step is made of three exchanges:
+#   spread   the workers spread their sprayers and receive the bugs that migrated into their domain;
+#            the active sprayers of all the domains are gathered and sent to every worker, since the pesticide
+#            repulsion has no cutoff (they are a few hundred at most)
+#   expose   the bugs are exposed to all the sprayers; every worker publishes a summary of its surviving bugs:
+#            centroid and size of the occupied cells of a global grid of cell_size meters, plus the positions
+#            of the bugs of the cells lying within `halo` meters of another domain
+#   move     every worker moves its bugs, attracted exactly by its own bugs and by the bugs of the other domains
+#            within the halo, and by the centroids of the farther cells (as neighbors.CellGrid does); bugs that
+#            left the field escape, bugs that crossed into another domain migrate to its worker
+# The environment, the trees and the static attraction are replicated: the workers are forked from the process
+# that built the Twin, and every worker updates its own copy of the environment every hour.
+# The workers draw from independent random streams, so the aggregates (deaths, escapes, radius) match the
+# single-process engine statistically, not bug by bug.
+#######################################################################################################################
+
+
+class Partition:
+    """Grid of shape (nx, ny) rectangular domains covering a field of size (width, height)."""
+
+    def __init__(self, size, shape=(2, 1)):
+        self.size = size
+        self.shape = tuple(shape)
+        self.x_edges = np.linspace(0, size[0], self.shape[0] + 1)
+        self.y_edges = np.linspace(0, size[1], self.shape[1] + 1)
+
+    def __len__(self):
+        return self.shape[0] * self.shape[1]
+
+    def owner(self, points):
+        """Domain of every point; points outside the field belong to the nearest domain."""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        ix = np.clip(np.searchsorted(self.x_edges, points[:, 0], side='right') - 1, 0, self.shape[0] - 1)
+        iy = np.clip(np.searchsorted(self.y_edges, points[:, 1], side='right') - 1, 0, self.shape[1] - 1)
+        return ix * self.shape[1] + iy
+
+    def box(self, index):
+        """(x0, y0, x1, y1) of a domain."""
+        ix, iy = divmod(index, self.shape[1])
+        return self.x_edges[ix], self.y_edges[iy], self.x_edges[ix + 1], self.y_edges[iy + 1]
+
+
+def near(cells, cell_size, box, halo):
+    """True for the grid cells (k, 2) whose square lies within halo meters of the box."""
+    x0, y0, x1, y1 = box
+    low = cells * cell_size
+    high = low + cell_size
+    return ((low[:, 0] < x1 + halo) & (high[:, 0] > x0 - halo) &
+            (low[:, 1] < y1 + halo) & (high[:, 1] > y0 - halo))
+
+
+class Halo:
+    """
+    Neighbor index of a domain: the attraction among its own bugs comes from the index of the Twin, the
+    attraction of the bugs of the other domains from the sources set by the domain (bugs or cell centroids,
+    weighted by the number of bugs they stand for).
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.positions = np.zeros((0, 2))
+        self.sources = np.zeros((0, 2))
+        self.counts = np.zeros(0)
+
+    def build(self, positions):
+        self.positions = positions
+        self.inner.build(positions)
+
+    def attraction(self, weight=0.5, epsilon=1e-6, compiled=None):
+        return (self.inner.attraction(weight, epsilon, compiled) +
+                attraction(self.positions, self.sources, weight * self.counts, epsilon, compiled=compiled))
+
+
+class Subdomain:
+    """State and step of the domain owned by a worker, see the header of the module."""
+
+    def __init__(self, twin, partition, index, halo=10, cell_size=5):
+        self.partition = partition
+        self.index = index
+        self.box = partition.box(index)
+        self.halo_width = halo
+        self.cell_size = cell_size
+        self.env = twin.env
+        self.trees = twin.trees
+        self.static = twin.static
+        self.raster = twin.raster
+        self.exposure = twin.exposure
+        self.kernels = twin.bugs.kernels
+        self.halo = Halo(twin.bugs.neighbors)
+        bugs = twin.bugs.active()
+        self.bugs = self.attach(twin.bugs.take(bugs[partition.owner(twin.bugs.positions[bugs]) == index]))
+        self.pesticides = twin.pesticides.take(np.flatnonzero(partition.owner(twin.pesticides.position) == index))
+        self.sprayers = None
+
+    def attach(self, bugs):
+        bugs.neighbors, bugs.raster, bugs.static, bugs.kernels = self.halo, self.raster, self.static, self.kernels
+        return bugs
+
+    def spread(self, step, migrants):
+        if migrants:
+            self.bugs = self.attach(BugSwarm.concatenate([self.bugs] + migrants))
+        self.pesticides.spread(self.env, step)
+        arrays = self.pesticides.arrays(('ids', 'position', 'radius', 'quantity', 'mortality_probability'))
+        return arrays, self.pesticides.max_radius, self.pesticides.any_active()
+
+    def expose(self, sprayers, fraction):
+        ids, positions, radii, quantities, mortality = sprayers
+        self.sprayers = PesticideField(ids, positions, radii, quantities, mortality_probability=mortality)
+        if self.raster is not None:
+            self.raster.build(self.sprayers)
+        deads = self.bugs.expose(self.sprayers, self.exposure, fraction)
+        return deads, self.summary()
+
+    def summary(self):
+        """Occupied cells of the bugs (cell, centroid, count) and the bugs of the cells near another domain."""
+        positions = self.bugs.positions[self.bugs.active()]
+        cells, inverse, counts = np.unique(np.floor(positions / self.cell_size).astype(int), axis=0,
+                                           return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        centroids = np.stack([np.bincount(inverse, weights=positions[:, k], minlength=len(cells))
+                              for k in range(2)], axis=1) / np.maximum(counts, 1)[:, np.newaxis]
+        boundary = np.zeros(len(cells), dtype=bool)
+        for other in range(len(self.partition)):
+            if other != self.index:
+                boundary |= near(cells, self.cell_size, self.partition.box(other), self.halo_width)
+        members = boundary[inverse]
+        return cells, centroids, counts, inverse[members], positions[members]
+
+    def move(self, summaries, fraction):
+        sources, counts = [], []
+        for other, (cells, centroids, cell_counts, member_cells, member_positions) in enumerate(summaries):
+            if other == self.index:
+                continue
+            close = near(cells, self.cell_size, self.box, self.halo_width)
+            # far cells by their centroid, the bugs of the close ones one by one
+            sources += [centroids[~close], member_positions[close[member_cells]]]
+            counts += [cell_counts[~close], np.ones(np.count_nonzero(close[member_cells]))]
+        self.halo.sources = np.concatenate(sources) if sources else np.zeros((0, 2))
+        self.halo.counts = np.concatenate(counts) if counts else np.zeros(0)
+
+        lefts = self.bugs.move(self.env, self.trees, self.sprayers, fraction)
+        idx = self.bugs.active()
+        owners = self.partition.owner(self.bugs.positions[idx])
+        migrants = {int(k): self.bugs.take(idx[owners == k]) for k in np.unique(owners) if k != self.index}
+        # dead, escaped and migrated bugs are dropped from the arrays
+        self.bugs = self.attach(self.bugs.take(idx[owners == self.index]))
+        return lefts, migrants, len(self.bugs)
+
+    def hour(self):
+        self.env.update_conditions()
+        self.static.update(self.trees, self.env)
+
+
+def _serve(connection, twin, partition, index, halo, cell_size, seed):
+    # worker loop: one command at a time, answered with its result or with the traceback of its error
+    seeds = np.random.SeedSequence([seed, index]).generate_state(2)
+    np.random.seed(seeds[0])
+    random.seed(int(seeds[1]))
+    domain = Subdomain(twin, partition, index, halo, cell_size)
+    while True:
+        command, args = connection.recv()
+        if command == 'stop':
+            break
+        try:
+            connection.send(('ok', getattr(domain, command)(*args)))
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+    connection.close()
+
+
+class _Local:
+    """Same interface as a worker connection, for a domain run in the calling process."""
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.result = None
+
+    def send(self, message):
+        command, args = message
+        if command != 'stop':
+            self.result = ('ok', getattr(self.domain, command)(*args))
+
+    def recv(self):
+        return self.result
+
+
+class DomainTwin:
+    """
+    Runs a built Twin with its field split over worker processes (see the header of the module).
+    shape       (nx, ny) domains, one worker each; (n, 1) gives vertical strips
+    halo        distance (m) within which the bugs of the neighboring domains attract exactly
+    cell_size   side (m) of the cells summarizing the farther bugs
+    seed        seed of the random streams of the workers
+    processes   False runs the domains one after the other in the calling process (same results per seed
+                stream, useful for debugging)
+    The run uses the fixed time_step of the Twin; adaptive stepping and recording are not supported.
+    Small runs are slower than Twin.run: every step makes three round trips to every worker and every worker
+    runs its own forecasts. On the 8x10 orchard with 2 domains (python -m benchmarks.suite --only domains, one
+    core, uncached forecasts) a run took 4.0x the single process with 200 bugs, 2.7x with 1000 and broke even
+    around 4000; only past that, with a free core per worker, are the domains worth it.
+    """
+
+    def __init__(self, twin, shape=(2, 1), halo=10, cell_size=5, seed=0, processes=True):
+        if twin.adaptive_step:
+            raise ValueError("Adaptive stepping is not supported by the domain decomposition.")
+        self.twin = twin
+        self.partition = Partition(twin.env.get_size(), shape)
+        self.halo = halo
+        self.cell_size = cell_size
+        self.seed = seed
+        self.processes = processes
+
+    def start(self):
+        if not self.processes:
+            return [_Local(Subdomain(self.twin, self.partition, k, self.halo, self.cell_size))
+                    for k in range(len(self.partition))]
+        # forked workers inherit the Twin (models, climate windows, trees) without pickling it
+        context = multiprocessing.get_context('fork')
+        self.workers = []
+        connections = []
+        for k in range(len(self.partition)):
+            parent, child = context.Pipe()
+            worker = context.Process(target=_serve, daemon=True,
+                                     args=(child, self.twin, self.partition, k, self.halo, self.cell_size, self.seed))
+            worker.start()
+            child.close()
+            self.workers.append(worker)
+            connections.append(parent)
+        return connections
+
+    def stop(self, connections):
+        for connection in connections:
+            connection.send(('stop', ()))
+        for worker in getattr(self, 'workers', []):
+            worker.join()
+
+    @staticmethod
+    def call(connections, command, args):
+        """Sends a command with per-domain arguments to all the workers and returns their results."""
+        for connection, arguments in zip(connections, args):
+            connection.send((command, arguments))
+        results = []
+        for connection in connections:
+            status, result = connection.recv()
+            if status == 'error':
+                raise RuntimeError(f"Domain worker failed:\n{result}")
+            results.append(result)
+        return results
+
+    def run(self):
+        """Same loop and results as Twin.run, with the domains stepped in parallel."""
+        twin = self.twin
+        instants = 60 // twin.time_step
+        n = len(self.partition)
+        hours, deads, lefts, steps = 0, 0, 0, 0
+        max_radius = 0
+        n_bugs = len(twin.bugs)
+        active = twin.pesticides.any_active()
+        migrants = [[] for _ in range(n)]
+        connections = self.start()
+        try:
+            while active and n_bugs > 0:
+                for _ in range(instants):
+                    spread = self.call(connections, 'spread', [(twin.time_step, migrants[k]) for k in range(n)])
+                    sprayers = tuple(np.concatenate([arrays[i] for arrays, _, _ in spread]) for i in range(5))
+                    max_radius = max([max_radius] + [radius for _, radius, _ in spread])
+                    active = any(a for _, _, a in spread)
+
+                    exposed = self.call(connections, 'expose', [(sprayers, 1)] * n)
+                    summaries = [summary for _, summary in exposed]
+                    moved = self.call(connections, 'move', [(summaries, 1)] * n)
+
+                    migrants = [[] for _ in range(n)]
+                    for _, outgoing, _ in moved:
+                        for k, bugs in outgoing.items():
+                            migrants[k].append(bugs)
+                    deads += sum(d for d, _ in exposed)
+                    lefts += sum(left for left, _, _ in moved)
+                    n_bugs = sum(count for _, _, count in moved) + sum(len(b) for m in migrants for b in m)
+                    steps += 1
+                # the domains run in the calling process share one environment
+                self.call(connections if self.processes else connections[:1], 'hour', [()] * n)
+                hours += 1
+        finally:
+            self.stop(connections)
+
+        return {
+            'bugs_survived': n_bugs,
+            'bugs_escaped': lefts,
+            'bug_deads': deads,
+            'pesticide_decay': hours,
+            'pesticide_radius': max_radius,
+            'steps': steps
+        }
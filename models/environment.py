@@ -1,13 +1,18 @@
 import numpy as np
 import os
-import matplotlib.pyplot as plt
-import keras
-from sklearn.preprocessing import MinMaxScaler
-import joblib
 from datetime import datetime, timedelta
+from .interpolation import IDWOperator
+from .tiles import TiledMap
+from .ai.registry import registry
+from .ai.broker import InferenceBroker
+
+# attributes holding the forecasting models and their scalers
+MODELS = ("temp_model", "hum_model", "temp_scaler", "hum_scaler")
+
 
 class Environment:
-    def __init__(self, size, sensors_pos, temperatures, humidities, wind):
+    def __init__(self, size, sensors_pos, temperatures, humidities, wind, forecast=None, broker=None, backend="keras",
+                 tiles=None):
 
         # known things of the environment
         self.size = size  # (width, height)
@@ -16,29 +21,52 @@ class Environment:
         self.humidity_X = humidities
         self.wind_speed = wind["speed"]
         self.wind_direction = wind["direction"]
+        # cached hourly forecasts (see ForecastTrajectory), replayed instead of running the LSTMs
+        self.forecast = forecast
+        self.forecast_step = 0
+        # large fields: lazily evaluated float32 maps (see TiledMap) instead of dense float64 arrays,
+        # e.g. {'resolution': 4, 'tile_size': 256, 'cache_tiles': 64}
+        self.tiles = tiles
 
         #models
-        self.temp_model = keras.saving.load_model(os.path.join("models", "ai", "lstm_temperature_model.keras"))
-        self.hum_model = keras.saving.load_model(os.path.join("models", "ai", "lstm_humidity_model.keras"))
-        self.temp_scaler = joblib.load(os.path.join("models", "ai", "scaler_temperature.save"))
-        self.hum_scaler = joblib.load(os.path.join("models", "ai", "scaler_humidity.save"))
+        self.backend = backend
+        self.broker = broker
+        self.load_models()
         self.current_temperature, self.current_humidity, self.current_date = self.update_conditions()
         self.temperature_map = self.generate_heatmap(self.positions, self.current_temperature)
         self.humidity_map = self.generate_heatmap(self.positions, self.current_humidity)
         # self.light_map = self.generate_heatmap(lights["light_intensity"])
 
 
-    def generate_heatmap(self, positions, values):
-        width, height = self.size
-        grid = np.zeros((width, height))
-
-        centroid_positions = np.array(positions)
-        centroid_values = np.array(values[0])
+    def load_models(self):
+        # loaded once per process and shared by every environment; backend "numpy" runs without TensorFlow
+        # and scikit-learn
+        scalers = "numpy" if self.backend == "numpy" else "joblib"
+        self.temp_model = registry.load_model("lstm_temperature_model.keras", self.backend)
+        self.hum_model = registry.load_model("lstm_humidity_model.keras", self.backend)
+        self.temp_scaler = registry.load_scaler("scaler_temperature.save", scalers)
+        self.hum_scaler = registry.load_scaler("scaler_humidity.save", scalers)
+        if self.broker is not None:
+            # predictions are micro-batched with the other environments of the process, e.g. {'max_batch': 16}
+            self.temp_model = InferenceBroker.for_model(self.temp_model, **self.broker)
+            self.hum_model = InferenceBroker.for_model(self.hum_model, **self.broker)
+
+    def __getstate__(self):
+        # the models are shared through the registry: they are reloaded when unpickled, not serialized
+        state = self.__dict__.copy()
+        for name in MODELS:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.load_models()
 
-        for x in range(width):
-            for y in range(height):
-                grid[x, y] = self.inverse_distance_weighting(x, y, centroid_positions, centroid_values)
-        return grid
+    def generate_heatmap(self, positions, values):
+        if self.tiles is not None:
+            return TiledMap(self.size, positions, values[0], **self.tiles)
+        # the IDW weights of every cell are precomputed once per sensor layout (see IDWOperator)
+        return IDWOperator.get(positions, self.size).apply(values[0])
 
     def inverse_distance_weighting(self, x, y, points, values, power=2):
         # interpolation technique to estimate values at unknown points --> https://en.wikipedia.org/wiki/Inverse_distance_weighting
@@ -53,7 +81,16 @@ class Environment:
     def update_conditions(self):
         # TODO: make the position of the centroids parametric
         # WARNING: The centroid positions are hard coded for the moment to accelerate production
+        date_features = self.next_date_features()
+        if self.is_replaying():
+            return self.replay(date_features)
+
+        temp_X, hum_X = self.model_inputs()
+        temp_y = self.temp_model.predict(temp_X, verbose=0)
+        hum_y = self.hum_model.predict(hum_X, verbose=0)
+        return self.apply_predictions(temp_y, hum_y, date_features)
 
+    def next_date_features(self):
         last_row = self.temperature_X[-1]
         #take the last row date
         last_date = datetime(
@@ -64,13 +101,28 @@ class Environment:
         )
         #compute the next date
         next_date = last_date + timedelta(hours=1)
-        date_features = np.array([
+        return np.array([
             next_date.year,
             next_date.month,
             next_date.day,
             next_date.hour
         ])
 
+    def is_replaying(self):
+        return self.forecast is not None and self.forecast_step < len(self.forecast)
+
+    def replay(self, date_features):
+        # replay of an hour already predicted from the same starting point
+        n1 = self.temperature_X.shape[1]
+        n2 = self.humidity_X.shape[1]
+        new_temp_row, new_hum_row = self.forecast[self.forecast_step]
+        self.forecast_step += 1
+        self.temperature_X = np.vstack([self.temperature_X, new_temp_row])[1:]
+        self.humidity_X = np.vstack([self.humidity_X, new_hum_row])[1:]
+        return new_temp_row[np.newaxis, :n1 - 4], new_hum_row[np.newaxis, :n2 - 4], date_features
+
+    def model_inputs(self):
+        """Normalized input windows, shaped (1, rows, columns), of the temperature and humidity models."""
         # Get the number of columns in each array
         n1 = self.temperature_X.shape[1]
         n2 = self.humidity_X.shape[1]
@@ -81,26 +133,34 @@ class Environment:
         normalized_temp = self.temp_scaler.transform(temp_to_normalize)
         temp_X = np.hstack((normalized_temp, temp_unnormalized))
         r, c = temp_X.shape
-        temp_y = self.temp_model.predict(temp_X[-r:].reshape(1, r, c), verbose=0)
+
+        hum_to_normalize = self.humidity_X[:, :n2 - 4]
+        hum_unnormalized = self.humidity_X[:, n2 - 4:]
+        normalized_hum = self.hum_scaler.transform(hum_to_normalize)
+        hum_X = np.hstack((normalized_hum, hum_unnormalized))
+        return temp_X[-r:].reshape(1, r, c), hum_X[-r:].reshape(1, r, c)
+
+    def apply_predictions(self, temp_y, hum_y, date_features):
+        """Appends the predicted hour to the climate windows."""
+        n1 = self.temperature_X.shape[1]
+        n2 = self.humidity_X.shape[1]
         new_temp = temp_y[:, :n1 - 4]
         new_temp = self.temp_scaler.inverse_transform(new_temp)
         # recover the new window for temperature
         new_row = np.concatenate([new_temp[0], date_features])
         self.temperature_X = np.vstack([self.temperature_X, new_row])[1:]
 
-        hum_to_normalize = self.humidity_X[:, :n2 - 4]
-        hum_unnormalized = self.humidity_X[:, n2 - 4:]
-        normalized_hum = self.hum_scaler.transform(hum_to_normalize)
-        hum_X = np.hstack((normalized_hum, hum_unnormalized))
-        r, c = temp_X.shape
-        hum_y = self.hum_model.predict(hum_X[-r:].reshape(1, r, c), verbose=0)
         new_hum = hum_y[:, :n2 - 4]
         new_hum = self.temp_scaler.inverse_transform(new_hum)
         new_row = np.concatenate([new_hum[0], date_features])
         self.humidity_X = np.vstack([self.humidity_X, new_row])[1:]
+        if self.forecast is not None:
+            self.forecast.append(self.forecast_step, self.temperature_X[-1], self.humidity_X[-1])
+        self.forecast_step += 1
         return new_temp, new_hum, date_features
 
     def save_heatmap(self, heatmap, filename, cmap='viridis', vmin=None, vmax=None):
+        import matplotlib.pyplot as plt  # only needed for the figures, not by the simulations
         output_folder = "output"
         os.makedirs(output_folder, exist_ok=True)
 
@@ -137,25 +197,46 @@ class Environment:
         plt.close()
 
     def save_all_heatmaps(self):
-        temp_min, temp_max = np.min(self.temperature_map), np.max(self.temperature_map)
-        humidity_min, humidity_max = np.min(self.humidity_map), np.max(self.humidity_map)
+        temperature_map, humidity_map = np.asarray(self.temperature_map), np.asarray(self.humidity_map)
+        temp_min, temp_max = np.min(temperature_map), np.max(temperature_map)
+        humidity_min, humidity_max = np.min(humidity_map), np.max(humidity_map)
         # light_min, light_max = np.min(self.light_map), np.max(self.light_map)
 
-        self.save_heatmap(self.temperature_map, "temperature", cmap="Reds", vmin=temp_min, vmax=temp_max)
-        self.save_heatmap(self.humidity_map, "humidity", cmap="Blues", vmin=humidity_min, vmax=humidity_max)
+        self.save_heatmap(temperature_map, "temperature", cmap="Reds", vmin=temp_min, vmax=temp_max)
+        self.save_heatmap(humidity_map, "humidity", cmap="Blues", vmin=humidity_min, vmax=humidity_max)
         # self.save_heatmap(self.light_map, "light_intensity", cmap="YlOrBr", vmin=light_min, vmax=light_max)
 
         print("Heatmaps saved in the output/ folder.")
 
     def get_temperature_at(self, x, y):
+        if self.tiles is not None:
+            return self.temperature_map.get(x, y)
         return self.temperature_map[int(x), int(y)]
 
+    def get_temperatures_at(self, xs, ys):
+        """Vectorized get_temperature_at over arrays of coordinates."""
+        if self.tiles is not None:
+            return self.temperature_map.get_many(xs, ys)
+        return self.temperature_map[self._cells(xs, 0), self._cells(ys, 1)]
+
     # def get_light_at(self, x, y):
     #     return self.light_map[int(x), int(y)]
 
     def get_humidity_at(self, x, y):
+        if self.tiles is not None:
+            return self.humidity_map.get(x, y)
         return self.humidity_map[int(x), int(y)]
 
+    def get_humidities_at(self, xs, ys):
+        """Vectorized get_humidity_at over arrays of coordinates."""
+        if self.tiles is not None:
+            return self.humidity_map.get_many(xs, ys)
+        return self.humidity_map[self._cells(xs, 0), self._cells(ys, 1)]
+
+    def _cells(self, values, axis):
+        # same truncation of int(), kept inside the map for points lying on the border
+        return np.clip(np.asarray(values, dtype=float).astype(int), 0, self.size[axis] - 1)
+
     def get_wind_speed(self):
         return self.wind_speed
 
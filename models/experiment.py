@@ -0,0 +1,171 @@
+import math
+import random
+import sys
+import time
+import numpy as np
+
+from .twin_exp import Twin
+from .domains import DomainTwin
+from .io.recorder import TrajectoryRecorder
+from .profiling import profile_call
+
+# metrics collected for every replicate, in the order of the output CSVs
+METRICS = ['radius', 'hours', 'time', 'dead', 'alive', 'left', 'steps']
+
+
+def generate_wind_conditions(antithetic=False):
+    """
+    Generate realistic random wind conditions.
+    With antithetic=True the same random numbers give the antithetic wind: opposite direction and the speed
+    at the complementary quantile (a slow wind for a fast one), to pair replicates with negatively correlated
+    winds. The spread of the sprayers only depends on the speed (the direction is not used by the simulation), so
+    the speed alone reduces the variance; the direction is flipped for the day it is used.
+    Returns:
+        direction (tuple): Unit vector (x, y) representing wind direction.
+        speed (float): Wind speed in m/s.
+    """
+    # the two uniform draws of random.uniform and random.weibullvariate, written out to take their antithetics
+    u_angle, u_speed = random.random(), random.random()
+
+    # Random direction in 2D (angle in radians)
+    angle = 2 * math.pi * u_angle + (math.pi if antithetic else 0)
+    direction = [math.cos(angle), math.sin(angle)]  # Unit vector
+
+    # Realistic wind speed: most often between 1 and 15 m/s
+    # We'll use a Weibull distribution to simulate typical wind speed distribution
+    k = 2.0  # Shape parameter (typical for many locations)
+    lam = 6.0  # Scale parameter (mean wind speed around 5-7 m/s)
+
+    # inverse of the Weibull CDF, at 1 - u_speed as random.weibullvariate; random() can return 0, whose
+    # complement is kept in (0, 1] as well
+    speed = lam * (-math.log(max(u_speed, sys.float_info.min) if antithetic else 1.0 - u_speed)) ** (1.0 / k)
+
+    return direction, speed
+
+
+# === Helper to index into grid ===
+def get_grid_index(row, col, total_cols):
+    return row * total_cols + col
+
+
+def make_orchard_grid(rows=12, cols=15):
+    # 12x15 --> distanza fra filari è 3 metri, la distanza tra le piante è 1.5
+    grid = []
+    for r in range(rows):
+        for c in range(cols):
+            grid.append([r * 3 + 33, c * 1.5 + 45])
+    return grid
+
+
+# === Function to construct pesticide parameters based on layout ===
+def make_pesticide_parameters(layout, quantity, rows, cols, grid):
+    pos_layout = []
+    if layout == 0:
+        # === Layout 1: Checkerboard (even rows AND odd columns) ===
+        pos_layout = []
+        for r in range(rows):
+            for c in range(cols):
+                if r % 2 == 0 and c % 2 == 1:
+                    idx = get_grid_index(r, c, cols)
+                    pos_layout.append(grid[idx])
+    if layout == 1:
+        # === Layout 2: Alternate Full Rows (e.g., rows 0, 2, 4...) ===
+        pos_layout = []
+        for r in range(rows):
+            if r % 2 == 0:
+                for c in range(cols):
+                    idx = get_grid_index(r, c, cols)
+                    pos_layout.append(grid[idx])
+    if layout == 2:
+        # === Layout 3: Alternate Full Columns (e.g., columns 0, 2, 4...) ===
+        pos_layout = []
+        for r in range(rows):
+            for c in range(cols):
+                if c % 2 == 0:
+                    idx = get_grid_index(r, c, cols)
+                    pos_layout.append(grid[idx])
+
+    return {
+        'quantity': quantity / len(pos_layout),
+        'initial_radius': 1,
+        'number': len(pos_layout),
+        'positions': pos_layout
+    }
+
+
+def run_replicate(seed, bugs_parameters, tree_parameters, pesticide_parameters, environment_parameters=None,
+                  record=None, cprofile=None):
+    """
+    Runs one seeded replicate: both the global `random` and `np.random` states are reseeded, so the outcome
+    only depends on the seed and on the parameters, whatever process runs it.
+    record, e.g. {'path': 'output/trajectories/seed_{seed}', 'interval': 10}, streams the trajectories of the
+    run to disk (see TrajectoryRecorder); '{seed}' in the path is replaced by the seed.
+    cprofile, e.g. {'seed': 3, 'path': 'output/layout_exp.prof'}, runs the replicate of that seed under cProfile.
+    With environment_parameters['profile'] the phase timers of Twin.run are returned under 'profile'.
+    With environment_parameters['domains'] the field is split over worker processes (see DomainTwin).
+    With environment_parameters['antithetic'] the replicate draws the antithetic wind of the seed (see
+    generate_wind_conditions) and otherwise the same random numbers.
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+
+    antithetic = (environment_parameters or {}).get('antithetic', False)
+    d, s = generate_wind_conditions(antithetic)
+    wind = {"direction": d, "speed": s}
+    # the drawn wind can be overridden by a fixed one in environment_parameters
+    environment_parameters = dict({
+        'starting_date': 25,
+        'sequence_length': 24,
+        'time_step': 10,
+        'wind': wind
+    }, **(environment_parameters or {}))
+
+    start_time = time.time()
+
+    def simulate(recorder=None):
+        DT = Twin(environment_parameters, bugs_parameters, tree_parameters, pesticide_parameters)
+        if 'domains' in environment_parameters:
+            # one large run split over worker processes, e.g. {'shape': (4, 1), 'halo': 10}
+            return DomainTwin(DT, seed=seed, **environment_parameters['domains']).run()
+        return DT.run(recorder)
+
+    def profiled(recorder=None):
+        # construction (model loading, climate windows) and run of the selected replicate
+        if cprofile is not None and cprofile['seed'] == seed:
+            return profile_call(cprofile['path'], simulate, recorder)
+        return simulate(recorder)
+
+    if record is not None:
+        with TrajectoryRecorder(**dict(record, path=record['path'].format(seed=seed))) as recorder:
+            results = profiled(recorder)
+    else:
+        results = profiled()
+
+    elapsed = time.time() - start_time
+
+    replicate = {
+        'seed': seed,
+        'radius': results['pesticide_radius'] / 1000,
+        'hours': results['pesticide_decay'],
+        'time': elapsed,
+        'dead': results['bug_deads'],
+        'alive': results['bugs_survived'],
+        'left': results['bugs_escaped'],
+        'steps': results['steps']
+    }
+    if antithetic:
+        replicate['antithetic'] = True
+    if 'profile' in results:
+        replicate['profile'] = results['profile']
+    return replicate
+
+
+def summarize(replicates, metrics=METRICS):
+    """Mean and standard deviation of every metric over the replicates."""
+    stats = {}
+    for metric in metrics:
+        # replicates checkpointed before a metric was added do not have it
+        values = [r[metric] for r in replicates if metric in r]
+        stats[f'{metric}_mean'] = np.mean(values)
+        stats[f'{metric}_std'] = np.std(values)
+    return stats
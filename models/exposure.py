@@ -0,0 +1,112 @@
+import numpy as np
+
+from .neighbors import expand_ranges
+
+
+#######################################################################################################################
+# Batched form of Pesticide.get_concentration / Pesticide.affects_bug over every (pesticide, bug) pair.
+# A bug is killed when at least one pesticide kills it, as in the sequential loop of Twin.run where a dead bug is
+# no longer tested by the following pesticides.
+#######################################################################################################################
+
+def _gaussian(distance2, radii, quantities):
+    # Gaussian model with sigma = radius / 2 and no effect outside the dispersion radius
+    sigma2 = (radii / 2) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        concentration = (quantities / (2 * np.pi * sigma2)) * np.exp(-distance2 / (2 * sigma2))  # g/m³
+    return np.where((distance2 > radii ** 2) | (quantities == 0), 0, concentration)
+
+
+def concentration_matrix(pest_positions, radii, quantities, bug_positions):
+    """Dense (pesticides x bugs) matrix of concentrations."""
+    pest_positions = np.asarray(pest_positions, dtype=float).reshape(-1, 2)
+    bug_positions = np.asarray(bug_positions, dtype=float).reshape(-1, 2)
+    radii = np.asarray(radii, dtype=float)[:, np.newaxis]
+    quantities = np.asarray(quantities, dtype=float)[:, np.newaxis]
+    dx = bug_positions[np.newaxis, :, 0] - pest_positions[:, 0, np.newaxis]
+    dy = bug_positions[np.newaxis, :, 1] - pest_positions[:, 1, np.newaxis]
+    return _gaussian(dx ** 2 + dy ** 2, radii, quantities)
+
+
+def sparse_concentrations(pest_positions, radii, quantities, bug_positions):
+    """
+    Concentrations of the (pesticide, bug) pairs with the bug inside the radius bounding box of the pesticide.
+    Bugs are sorted by x once, so the candidates of every pesticide are a contiguous range found by bisection.
+    Returns the pesticide indexes, the bug indexes and the concentrations of the candidate pairs.
+    """
+    pest_positions = np.asarray(pest_positions, dtype=float).reshape(-1, 2)
+    bug_positions = np.asarray(bug_positions, dtype=float).reshape(-1, 2)
+    radii = np.asarray(radii, dtype=float)
+    quantities = np.asarray(quantities, dtype=float)
+
+    active = np.flatnonzero(quantities > 0)  # dissipated pesticides have no effect
+    order = np.argsort(bug_positions[:, 0], kind='stable')
+    xs = bug_positions[order, 0]
+    lo = np.searchsorted(xs, pest_positions[active, 0] - radii[active], side='left')
+    hi = np.searchsorted(xs, pest_positions[active, 0] + radii[active], side='right')
+    owner, member = expand_ranges(lo, hi - lo)
+    pest_idx = active[owner]
+    bug_idx = order[member]
+
+    # y side of the bounding box, then the exact radius cutoff
+    dy = bug_positions[bug_idx, 1] - pest_positions[pest_idx, 1]
+    inside = np.abs(dy) <= radii[pest_idx]
+    pest_idx, bug_idx, dy = pest_idx[inside], bug_idx[inside], dy[inside]
+    dx = bug_positions[bug_idx, 0] - pest_positions[pest_idx, 0]
+    concentration = _gaussian(dx ** 2 + dy ** 2, radii[pest_idx], quantities[pest_idx])
+    return pest_idx, bug_idx, concentration
+
+
+def choose_mode(radii, quantities, bug_positions):
+    """The sparse path pays off when the pesticide footprints cover a small part of the area occupied by the bugs."""
+    bug_positions = np.asarray(bug_positions, dtype=float).reshape(-1, 2)
+    radii = np.asarray(radii, dtype=float)[np.asarray(quantities) > 0]
+    if len(bug_positions) == 0 or len(radii) == 0:
+        return 'sparse'
+    area = np.prod(np.ptp(bug_positions, axis=0) + 1)
+    return 'sparse' if np.sum(np.minimum((2 * radii) ** 2, area)) < 0.5 * len(radii) * area else 'dense'
+
+
+def sample_deaths(pest_positions, radii, quantities, mortality, bug_positions, mode='auto', fraction=1,
+                  return_expected=False, compiled=None):
+    """
+    Samples the mortality outcome of every (pesticide, bug) pair in one draw.
+    mode is 'dense' (full matrix), 'sparse' (bounding-box candidates only) or 'auto'.
+    The mortality rates are the probabilities of one reference time step; with fraction != 1 they are
+    rescaled to a step of fraction reference steps (1 - (1 - p) ** fraction).
+    Returns a boolean mask over the bugs that are killed and, with return_expected, the expected number of
+    mortality events of a reference step.
+    compiled is a Kernels object (see models.kernels) replacing the dense path.
+    """
+    bug_positions = np.asarray(bug_positions, dtype=float).reshape(-1, 2)
+    mortality = np.broadcast_to(np.asarray(mortality, dtype=float), np.shape(radii))
+    if mode == 'auto':
+        mode = choose_mode(radii, quantities, bug_positions)
+    if mode == 'dense' and compiled is not None:
+        # same draws as the dense path, without the (pesticides x bugs) rate matrix
+        radii = np.asarray(radii, dtype=float)
+        draws = np.random.rand(len(radii), len(bug_positions))
+        killed = np.zeros(len(bug_positions), dtype=bool)
+        expected = np.zeros(len(bug_positions))
+        compiled.dense_deaths(np.ascontiguousarray(np.asarray(pest_positions, dtype=float).reshape(-1, 2)), radii,
+                              np.asarray(quantities, dtype=float), np.ascontiguousarray(mortality),
+                              np.ascontiguousarray(bug_positions), draws, fraction, killed, expected)
+        return (killed, np.sum(expected)) if return_expected else killed
+    if mode == 'dense':
+        rates = concentration_matrix(pest_positions, radii, quantities, bug_positions) * mortality[:, np.newaxis]
+    elif mode == 'sparse':
+        pest_idx, bug_idx, concentration = sparse_concentrations(pest_positions, radii, quantities, bug_positions)
+        rates = concentration * mortality[pest_idx]
+    else:
+        raise ValueError(f"Unknown exposure mode '{mode}', expected 'dense', 'sparse' or 'auto'.")
+    expected = np.sum(np.minimum(rates, 1))
+    if fraction != 1:
+        rates = 1 - (1 - np.minimum(rates, 1)) ** fraction
+
+    if mode == 'dense':
+        killed = np.any(rates > np.random.rand(*rates.shape), axis=0)
+    else:
+        outcome = rates > np.random.rand(len(rates))
+        killed = np.zeros(len(bug_positions), dtype=bool)
+        killed[bug_idx[outcome]] = True
+    return (killed, expected) if return_expected else killed
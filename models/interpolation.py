@@ -0,0 +1,56 @@
+import os
+import numpy as np
+
+from .io.cache import cache_path, digest, save_array
+
+
+class IDWOperator:
+    """
+    Inverse distance weighting (https://en.wikipedia.org/wiki/Inverse_distance_weighting) as a linear operator.
+    The normalized weights (cells x sensors) depend only on the sensor positions, the grid size and the power,
+    so they are computed once, kept in memory for the process and cached on disk; every heatmap is then
+    a single matrix-vector product.
+    """
+
+    _operators = {}
+
+    def __init__(self, positions, size, power=2, use_disk=True):
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.size = tuple(int(s) for s in size)
+        self.power = power
+        self.key = digest(self.positions, np.array(self.size), np.array(float(power)))
+        path = cache_path("idw", f"idw_{self.key}.npy") if use_disk else None
+        if path is not None and os.path.exists(path):
+            self.weights = np.load(path)
+        else:
+            self.weights = self.compute_weights(self.positions, self.size, power)
+            if path is not None:
+                save_array(path, self.weights)
+
+    @classmethod
+    def get(cls, positions, size, power=2):
+        """Shared operator for a sensor layout, grid size and power."""
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        key = (positions.tobytes(), tuple(size), power)
+        if key not in cls._operators:
+            cls._operators[key] = cls(positions, size, power)
+        return cls._operators[key]
+
+    @staticmethod
+    def compute_weights(points, size, power=2):
+        width, height = size
+        x, y = np.meshgrid(np.arange(width), np.arange(height), indexing="ij")
+        cells = np.stack([x.ravel(), y.ravel()], axis=1).astype(float)
+        distances = np.sqrt((points[np.newaxis, :, 0] - cells[:, 0, np.newaxis]) ** 2 +
+                            (points[np.newaxis, :, 1] - cells[:, 1, np.newaxis]) ** 2)
+        with np.errstate(divide="ignore"):
+            weights = 1 / (distances ** power)
+        # a cell lying on a sensor takes the value of that sensor
+        on_sensor = np.any(distances == 0, axis=1)
+        weights[on_sensor] = 0
+        weights[on_sensor, np.argmin(distances[on_sensor], axis=1)] = 1
+        return weights / weights.sum(axis=1, keepdims=True)
+
+    def apply(self, values):
+        """Interpolated (width, height) grid for the given sensor values."""
+        return (self.weights @ np.asarray(values, dtype=float).reshape(-1)).reshape(self.size)
@@ -0,0 +1,53 @@
+import hashlib
+import os
+import numpy as np
+
+# On-disk cache for derived artifacts (interpolation weights, converted datasets, forecasts, ...).
+# Like the other paths of the simulator it is relative to the working directory.
+CACHE_DIR = "cache"
+
+
+def cache_path(*parts):
+    """Path of an entry inside the cache folder; the folders are created when missing."""
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def digest(*values):
+    """Short stable hash of arrays, numbers and strings, used to key cache entries."""
+    h = hashlib.sha1()
+    for value in values:
+        if isinstance(value, str):
+            h.update(value.encode())
+        else:
+            array = np.ascontiguousarray(value)
+            h.update(str(array.dtype).encode() + str(array.shape).encode())
+            h.update(array.tobytes())
+        h.update(b"|")
+    return h.hexdigest()[:16]
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file content."""
+    h = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def save_array(path, array):
+    """Writes an .npy file atomically, so concurrent readers never see a partial file."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as file:
+        np.save(file, array)
+    os.replace(tmp, path)
+
+
+def save_arrays(path, **arrays):
+    """Writes an .npz file atomically."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(tmp, path)
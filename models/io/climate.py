@@ -0,0 +1,66 @@
+import json
+import os
+import numpy as np
+
+from .cache import cache_path, digest, save_array
+
+CLIMATE_FOLDER = os.path.join("weather-forecasting", "data")
+# sensor values followed by the date features, the layout expected by Environment and by the LSTMs
+COLUMNS = [f"value_{i}" for i in range(0, 13)] + ["year", "month", "day", "hour"]
+
+
+class ClimateStore:
+    """
+    Binary copy of a `<name>_all.csv` climate dataset (temperature or humidity).
+    The CSV is parsed once and converted to a float64 .npy file in the cache (year already shifted by 2000,
+    as the LSTMs expect); the file is memory-mapped and every window is a zero-copy, read-only view.
+    The conversion is redone only when the CSV changes (mtime or size).
+    """
+
+    _stores = {}
+
+    def __init__(self, name, folder=CLIMATE_FOLDER):
+        self.name = name
+        self.folder = folder
+        self.csv_path = os.path.join(folder, f"{name}_all.csv")
+        stat = os.stat(self.csv_path)
+        self.key = digest(os.path.abspath(self.csv_path), np.array([stat.st_mtime, stat.st_size]))
+        self.path = cache_path("climate", f"{name}_{self.key}.npy")
+        if not os.path.exists(self.path):
+            self.convert()
+        self.data = np.load(self.path, mmap_mode="r")
+        self.columns = COLUMNS
+
+    @classmethod
+    def open(cls, name, folder=CLIMATE_FOLDER):
+        """Store shared by the whole process; it is reopened only if the CSV has changed."""
+        store = cls._stores.get((name, folder))
+        if store is None or not store.is_current():
+            store = cls(name, folder)
+            cls._stores[(name, folder)] = store
+        return store
+
+    def __reduce__(self):
+        # pickled by name: the unpickled store is the one of the receiving process, memory-mapped again
+        return ClimateStore.open, (self.name, self.folder)
+
+    def is_current(self):
+        stat = os.stat(self.csv_path)
+        return digest(os.path.abspath(self.csv_path), np.array([stat.st_mtime, stat.st_size])) == self.key
+
+    def convert(self):
+        import pandas as pd
+        df = pd.read_csv(self.csv_path)
+        df["year"] = df["year"] - 2000
+        save_array(self.path, df[COLUMNS].to_numpy(dtype=np.float64))
+        with open(self.path.replace(".npy", ".json"), "w") as file:
+            json.dump({"source": self.csv_path, "columns": COLUMNS, "rows": len(df)}, file, indent=4)
+
+    def __len__(self):
+        return len(self.data)
+
+    def window(self, end, length):
+        """Rows [end - length, end) as a view on the memory-mapped file."""
+        if end < length:
+            return np.zeros((0, len(self.columns)))
+        return self.data[end - length:end]
@@ -1,4 +1,10 @@
+import atexit
 import json
+import os
+import sys
+import threading
+import time
+from collections import deque
 
 class SimulationLogger:
     """Logs important events during the simulation."""
@@ -11,4 +17,151 @@ class SimulationLogger:
 
     def save_to_file(self, filename="simulation_log.json"):
         with open(filename, "w") as file:
-            json.dump(self.logs, file, indent=4)
\ No newline at end of file
+            json.dump(self.logs, file, indent=4)
+
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {'DEBUG': DEBUG, 'INFO': INFO, 'WARNING': WARNING, 'ERROR': ERROR}
+NAMES = {value: name for name, value in LEVELS.items()}
+DISABLED = 100
+
+
+class EventLogger(SimulationLogger):
+    """
+    Leveled, structured events (a name and keyword fields) kept in a bounded ring buffer and written by a
+    background thread, so that the simulation never waits on stdout or on a file.
+    The logger is disabled until configure() is called: a disabled call is a single comparison, and hot loops
+    can skip building their fields with `if logger.level <= DEBUG`.
+    When the writer falls behind, the oldest events are dropped (counted in `dropped`).
+    """
+
+    def __init__(self, capacity=10000):
+        super().__init__()
+        self.logs = deque(maxlen=capacity)
+        self.level = DISABLED
+        self.path = None
+        self.sink = None
+        self.format = 'text'
+        self.interval = 0.1
+        self.dropped = 0
+        self.writer = None
+        self.wake = threading.Event()
+        self.stopping = False
+        self.lock = threading.Lock()
+
+    def configure(self, level='INFO', path=None, format=None, capacity=None, interval=0.1):
+        """
+        Enables the logger. path is a file of JSON lines ('{pid}' is replaced by the process id, so that the
+        workers of a pool do not interleave) or None for the standard output, in text format by default.
+        """
+        self.close()
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        if capacity is not None:
+            self.logs = deque(self.logs, maxlen=capacity)
+        self.path = path
+        self.format = format or ('json' if path else 'text')
+        self.interval = interval
+        self.start()
+        return self
+
+    def start(self):
+        if self.path is not None:
+            path = self.path.format(pid=os.getpid())
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.sink = open(path, 'a')
+        else:
+            self.sink = sys.stdout
+        self.stopping = False
+        self.writer = threading.Thread(target=self.serve, name="event-logger", daemon=True)
+        self.writer.start()
+
+    def after_fork(self):
+        # threads do not survive a fork: the child restarts its own writer, with the events of the parent dropped
+        self.logs.clear()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        if self.level < DISABLED:
+            self.start()
+
+    def log(self, level, event, **fields):
+        if level < self.level:
+            return
+        if len(self.logs) == self.logs.maxlen:
+            self.dropped += 1
+        self.logs.append((time.time(), level, event, fields))
+        if level >= WARNING:
+            self.wake.set()
+
+    def debug(self, event, **fields):
+        if DEBUG >= self.level:
+            self.log(DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        if INFO >= self.level:
+            self.log(INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(ERROR, event, **fields)
+
+    def record(self, message):
+        self.log(INFO, 'message', message=message)
+
+    def serve(self):
+        while not self.stopping:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.write()
+        self.write()
+
+    def write(self):
+        with self.lock:
+            lines = []
+            while self.logs:
+                try:
+                    t, level, event, fields = self.logs.popleft()
+                except IndexError:
+                    break
+                name = NAMES[level]
+                if self.format == 'json':
+                    lines.append(json.dumps(dict({'time': t, 'level': name, 'event': event}, **fields), default=str))
+                else:
+                    stamp = time.strftime('%H:%M:%S', time.localtime(t))
+                    lines.append(f"{stamp} {name:<7} {event} " + " ".join(f"{k}={v}" for k, v in fields.items()))
+            if lines and self.sink is not None:
+                try:
+                    self.sink.write("\n".join(lines) + "\n")
+                    self.sink.flush()
+                except OSError:
+                    self.sink = None  # e.g. closed pipe: the following events are discarded
+
+    def flush(self):
+        if self.writer is not None:
+            self.write()
+
+    def close(self):
+        """Writes the pending events and stops the writer thread."""
+        if self.writer is None:
+            return
+        self.stopping = True
+        self.wake.set()
+        self.writer.join()
+        self.writer = None
+        if self.sink is not None and self.sink is not sys.stdout:
+            self.sink.close()
+        self.sink = None
+
+    def save_to_file(self, filename="simulation_log.json"):
+        with open(filename, "w") as file:
+            json.dump([dict({'time': t, 'level': level, 'event': event}, **fields)
+                       for t, level, event, fields in list(self.logs)], file, indent=4, default=str)
+
+
+# shared by the whole process, disabled until configured; the pending events are written at exit (close does
+# nothing while the logger is not configured, and is registered once however many times configure is called)
+logger = EventLogger()
+atexit.register(logger.close)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=logger.after_fork)
@@ -0,0 +1,149 @@
+import json
+import os
+import numpy as np
+
+#######################################################################################################################
+# Streaming record of a Twin run, with bounded memory.
+# Three tables are recorded, each column buffered in a fixed-size NumPy chunk and written, when the chunk is full,
+# as one .npy segment per column:
+#   bugs        time, id, x, y            positions of the alive bugs, every `interval` simulated minutes
+#   events      time, id, kind            deaths (DEATH) and escapes (ESCAPE), at every step
+#   pesticides  time, id, radius, quantity  state of the sprayers, every `interval` simulated minutes
+# <path>/index.json lists the segments of every table with their time span, so that a time window is read
+# from the segments that overlap it only (memory-mapped). The index is rewritten after every segment, so the
+# record of an interrupted run can be read up to its last written segment.
+#######################################################################################################################
+
+TABLES = {
+    'bugs': (('time', np.float64), ('id', np.int64), ('x', np.float64), ('y', np.float64)),
+    'events': (('time', np.float64), ('id', np.int64), ('kind', np.int8)),
+    'pesticides': (('time', np.float64), ('id', np.int64), ('radius', np.float64), ('quantity', np.float64))
+}
+DEATH, ESCAPE = 0, 1
+
+
+class ChunkedTable:
+    """
+    Columns buffered in chunks of chunk_size rows, flushed to <folder>/<column>_<segment>.npy; on_flush() is
+    called after every segment written.
+    """
+
+    def __init__(self, folder, columns, chunk_size, on_flush=None):
+        self.folder = folder
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.on_flush = on_flush
+        self.buffers = {name: np.empty(chunk_size, dtype=dtype) for name, dtype in columns}
+        self.size = 0
+        self.segments = []
+        os.makedirs(folder, exist_ok=True)
+
+    def append(self, **values):
+        n = len(values['time'])
+        done = 0
+        while done < n:
+            count = min(n - done, self.chunk_size - self.size)
+            for name, _ in self.columns:
+                self.buffers[name][self.size:self.size + count] = values[name][done:done + count]
+            self.size += count
+            done += count
+            if self.size == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        if self.size == 0:
+            return
+        segment = len(self.segments)
+        for name, _ in self.columns:
+            np.save(os.path.join(self.folder, f"{name}_{segment:06d}.npy"), self.buffers[name][:self.size])
+        time = self.buffers['time'][:self.size]
+        self.segments.append({'rows': self.size, 'start': float(time.min()), 'end': float(time.max())})
+        self.size = 0
+        if self.on_flush is not None:
+            self.on_flush()
+
+
+class TrajectoryRecorder:
+    """
+    Records bug positions, deaths, escapes and pesticide state of a run (see the header of the module).
+    path        folder of the record, created if needed
+    interval    sampling interval (simulated minutes) of the bug positions and of the pesticide state
+    chunk_size  rows buffered per table before writing a segment
+    """
+
+    def __init__(self, path, interval=10, chunk_size=65536):
+        self.path = path
+        self.interval = interval
+        self.tables = {name: ChunkedTable(os.path.join(path, name), columns, chunk_size, self.write_index)
+                       for name, columns in TABLES.items()}
+        self.next_sample = 0
+        self.alive = None
+        self.escaped = None
+        self.write_index()
+
+    def record(self, time, bugs, pesticides):
+        """State after a step ending at `time` (minutes from the start) of a BugSwarm and a PesticideField."""
+        if self.alive is not None:
+            # BugSwarm replaces its masks when bugs are removed, the previous ones are still valid
+            left = self.alive & ~bugs.alive
+            escaped = left & bugs.escaped & ~self.escaped
+            died = left & ~escaped
+            ids = np.concatenate([bugs.ids[died], bugs.ids[escaped]])
+            kinds = np.concatenate([np.full(np.count_nonzero(died), DEATH), np.full(np.count_nonzero(escaped), ESCAPE)])
+            if len(ids) > 0:
+                self.tables['events'].append(time=np.full(len(ids), time), id=ids, kind=kinds)
+        self.alive, self.escaped = bugs.alive, bugs.escaped
+
+        if time >= self.next_sample:
+            idx = bugs.active()
+            self.tables['bugs'].append(time=np.full(len(idx), time), id=bugs.ids[idx],
+                                       x=bugs.positions[idx, 0], y=bugs.positions[idx, 1])
+            self.tables['pesticides'].append(time=np.full(len(pesticides), time), id=pesticides.ids,
+                                             radius=pesticides.radius, quantity=pesticides.quantity)
+            while self.next_sample <= time:
+                self.next_sample += self.interval
+
+    def write_index(self):
+        """Replaces the index with the segments written so far (atomically: a reader never sees a partial one)."""
+        index = {'interval': self.interval,
+                 'tables': {name: {'columns': [c for c, _ in TABLES[name]], 'segments': table.segments}
+                            for name, table in self.tables.items()}}
+        with open(os.path.join(self.path, 'index.json.tmp'), 'w') as file:
+            json.dump(index, file, indent=4)
+        os.replace(os.path.join(self.path, 'index.json.tmp'), os.path.join(self.path, 'index.json'))
+
+    def close(self):
+        """Writes the partial chunks, and the index with them."""
+        for table in self.tables.values():
+            table.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryReader:
+    """Reads a record written by TrajectoryRecorder, one time window at a time."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'index.json'), 'r') as file:
+            self.index = json.load(file)
+
+    def window(self, table, start=-np.inf, end=np.inf):
+        """Columns of the rows of `table` with start <= time < end; only the overlapping segments are read."""
+        columns = self.index['tables'][table]['columns']
+        parts = {name: [] for name in columns}
+        for segment, meta in enumerate(self.index['tables'][table]['segments']):
+            if meta['end'] < start or meta['start'] >= end:
+                continue
+            folder = os.path.join(self.path, table)
+            time = np.load(os.path.join(folder, f"time_{segment:06d}.npy"), mmap_mode='r')
+            rows = np.flatnonzero((time >= start) & (time < end))
+            for name in columns:
+                values = np.load(os.path.join(folder, f"{name}_{segment:06d}.npy"), mmap_mode='r')
+                parts[name].append(np.asarray(values[rows]))
+        return {name: np.concatenate(values) if values else np.empty(0, dtype=dict(TABLES[table])[name])
+                for name, values in parts.items()}
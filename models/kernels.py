@@ -0,0 +1,127 @@
+import importlib.util
+import math
+import types
+
+#######################################################################################################################
+# Optional compiled kernels of the per-bug loops, with the branches of Bug.move and Pesticide.get_concentration
+# written out instead of masked: the zero-distance guard of the attractions, the radius cutoff of the
+# concentration and the temperature-gated move. Every kernel loops over the bugs with prange, so the compiled
+# version runs them on all the cores and never builds the (bugs x sources) temporaries of the NumPy paths.
+# Backends, loaded with select() and held by the BugSwarm that uses them (Twin: bug_params['kernels']):
+#   'numpy'   no kernels, the vectorized paths of models.neighbors, models.exposure and BugSwarm (default)
+#   'numba'   the kernels compiled with Numba (parallel, cached on disk after the first compilation)
+#   'python'  the same kernels interpreted: slow, the reference to validate the compiled ones
+#   'auto'    'numba' when Numba is installed, 'numpy' otherwise
+# tests/test_kernels.py checks 'python' and 'numba' (skipped without Numba) against the NumPy paths.
+# The random draws stay in NumPy and are passed to the kernels, so every backend consumes the same random
+# stream; results only differ by the rounding of the sums.
+#######################################################################################################################
+
+prange = range  # numba.prange in the namespace of the compiled kernels
+
+
+def attraction(points, sources, weights, epsilon, out):
+    # see neighbors.attraction; a source on the point adds a null vector
+    for i in prange(points.shape[0]):
+        mx = 0.0
+        my = 0.0
+        for j in range(sources.shape[0]):
+            dx = sources[j, 0] - points[i, 0]
+            dy = sources[j, 1] - points[i, 1]
+            w = weights[j] / (math.sqrt(dx * dx + dy * dy) + epsilon)
+            mx += w * dx
+            my += w * dy
+        out[i, 0] = mx
+        out[i, 1] = my
+
+
+def dense_deaths(pest_positions, radii, quantities, mortality, bug_positions, draws, fraction, killed, expected):
+    # see exposure.sample_deaths in dense mode: draws[p, i] is the draw of the pair (pesticide p, bug i)
+    for i in prange(bug_positions.shape[0]):
+        hit = False
+        total = 0.0
+        for p in range(pest_positions.shape[0]):
+            if quantities[p] == 0:
+                continue
+            dx = bug_positions[i, 0] - pest_positions[p, 0]
+            dy = bug_positions[i, 1] - pest_positions[p, 1]
+            distance2 = dx * dx + dy * dy
+            if distance2 > radii[p] * radii[p]:
+                continue  # no effect outside the dispersion radius
+            sigma2 = (radii[p] / 2) ** 2
+            rate = (quantities[p] / (2 * math.pi * sigma2)) * math.exp(-distance2 / (2 * sigma2)) * mortality[p]
+            rate = min(rate, 1.0)
+            total += rate
+            if fraction != 1:
+                rate = 1 - (1 - rate) ** fraction
+            if rate > draws[p, i]:
+                hit = True
+        killed[i] = hit
+        expected[i] = total
+
+
+def gated_steps(M, L_max, move_prob, draws, fraction, step, moving):
+    # see BugSwarm.move: a bug moves L_max along its net vector if it has one and its draw is below move_prob
+    for i in prange(M.shape[0]):
+        norm = math.sqrt(M[i, 0] * M[i, 0] + M[i, 1] * M[i, 1])
+        moving[i] = norm > 0 and draws[i] < move_prob[i]
+        if norm > 0:
+            step[i, 0] = L_max[i] * M[i, 0] / norm * fraction
+            step[i, 1] = L_max[i] * M[i, 1] / norm * fraction
+        else:
+            step[i, 0] = 0.0
+            step[i, 1] = 0.0
+
+
+KERNELS = ('attraction', 'dense_deaths', 'gated_steps')
+
+
+class Kernels:
+    def __init__(self, backend, functions):
+        self.backend = backend
+        for name, function in functions.items():
+            setattr(self, name, function)
+
+    def __deepcopy__(self, memo):
+        # stateless: copies of a swarm (e.g. snapshots) share the kernels
+        return self
+
+    def __reduce__(self):
+        # pickled by backend, compiled again in the process that loads them
+        return select, (self.backend,)
+
+
+_compiled = None
+
+
+def available():
+    """True when Numba is installed (checked without importing it)."""
+    return importlib.util.find_spec("numba") is not None
+
+
+def compile_kernels():
+    """Kernels compiled with Numba, once per process."""
+    global _compiled
+    if _compiled is None:
+        import numba
+        # copies of the kernels reading prange from their own namespace: the 'python' ones keep range
+        namespace = dict(globals(), prange=numba.prange)
+        jit = numba.njit(parallel=True, cache=True, error_model='numpy')
+        _compiled = Kernels('numba', {name: jit(types.FunctionType(globals()[name].__code__, namespace, name))
+                                      for name in KERNELS})
+    return _compiled
+
+
+def select(backend='numpy'):
+    """Kernels of a backend (see the header of the module), or None for the NumPy paths."""
+    if backend == 'auto':
+        backend = 'numba' if available() else 'numpy'
+    if backend == 'numba':
+        if not available():
+            raise ImportError("Numba is not installed: use the 'numpy' kernels or install numba.")
+        return compile_kernels()
+    if backend == 'python':
+        return Kernels('python', {name: globals()[name] for name in KERNELS})
+    if backend == 'numpy':
+        return None
+    raise ValueError(f"Unknown kernel backend '{backend}', expected 'auto', 'numba', 'python' or 'numpy'.")
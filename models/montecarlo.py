@@ -0,0 +1,124 @@
+import math
+from statistics import NormalDist
+import numpy as np
+
+from .experiment import summarize
+from .runner import ReplicateRunner
+
+#######################################################################################################################
+# Replicate loops that stop as soon as the results are precise enough, with two variance reductions:
+#   common random numbers   every config runs the same seeds, in the same order, and a replicate reseeds both
+#                           generators (see run_replicate): configs compared with each other see the same winds
+#                           and the same random streams, so their differences, paired by seed, are much less
+#                           noisy than their means
+#   antithetic winds        every seed is run twice, with the wind of the seed and with its antithetic
+#                           (see generate_wind_conditions); the mean of the pair is one sample. Only the
+#                           complementary wind speed reduces the variance: the simulation ignores the direction
+# The seeds are run in rounds: min_seeds first, then batch more at a time for the configs whose confidence
+# intervals are still too wide. A config stops when, for every target metric, the width of the confidence
+# interval of the mean is below its tolerance (relative to the mean with relative=True), or when the seeds are
+# exhausted. The mean/std reported are those of summarize over all the replicates, as with ReplicateRunner.
+#######################################################################################################################
+
+
+def t_quantile(confidence, dof):
+    """Two-sided Student t quantile, from the normal one (Cornish-Fisher expansion, close enough for dof >= 2)."""
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return (z + (z ** 3 + z) / (4 * dof) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2) +
+            (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3))
+
+
+def samples(replicates, metric):
+    """Independent samples of a metric: one per seed, averaging the antithetic pairs."""
+    by_seed = {}
+    for replicate in replicates:
+        if metric in replicate:
+            by_seed.setdefault(replicate['seed'], []).append(replicate[metric])
+    return {seed: np.mean(values) for seed, values in by_seed.items()}
+
+
+def interval(values, confidence=0.95):
+    """Mean and width of its confidence interval; the width is infinite with less than two samples."""
+    values = np.asarray(list(values), dtype=float)
+    if len(values) < 2:
+        return (values.mean() if len(values) else math.nan), math.inf
+    half = t_quantile(confidence, len(values) - 1) * values.std(ddof=1) / math.sqrt(len(values))
+    return values.mean(), 2 * half
+
+
+class SequentialRunner:
+    """
+    Same interface as ReplicateRunner, running only as many of the seeds as needed (see the header of the module).
+    tolerance   maximum width of the confidence interval of the mean of every target metric, e.g. {'dead': 10}
+    relative    the tolerances are fractions of the means
+    confidence  level of the intervals
+    min_seeds   seeds of the first round
+    batch       seeds added at every following round, by default one per worker (at least 2)
+    antithetic  every seed also runs with the antithetic wind
+    """
+
+    def __init__(self, workers=1, tolerance=None, relative=False, confidence=0.95, min_seeds=4, batch=None,
+                 antithetic=False):
+        self.runner = ReplicateRunner(workers)
+        self.tolerance = tolerance or {}
+        self.relative = relative
+        self.confidence = confidence
+        self.min_seeds = max(min_seeds, 2)
+        self.batch = batch or max(self.runner.workers, 2)
+        self.antithetic = antithetic
+
+    def widths(self, replicates):
+        """Width of the confidence interval of every target metric, relative to its mean with relative=True."""
+        widths = {}
+        for metric in self.tolerance:
+            mean, width = interval(samples(replicates, metric).values(), self.confidence)
+            widths[metric] = width / abs(mean) if self.relative and mean != 0 else width
+        return widths
+
+    def converged(self, replicates):
+        widths = self.widths(replicates)
+        return all(widths[metric] <= tolerance for metric, tolerance in self.tolerance.items())
+
+    def variants(self, config):
+        if not self.antithetic:
+            return [config]
+        environment_parameters = dict(config.get('environment_parameters') or {}, antithetic=True)
+        return [config, dict(config, environment_parameters=environment_parameters)]
+
+    def stats(self, replicates):
+        stats = summarize(replicates)
+        stats.update({f'{metric}_ci': width for metric, width in self.widths(replicates).items()})
+        stats['seeds'] = len({r['seed'] for r in replicates})
+        return stats
+
+    def run(self, configs, seeds, on_replicate=None):
+        """
+        Yields (config index, replicates sorted by seed, summary) as soon as a config has converged or has run
+        all the seeds; the summary adds the interval widths (<metric>_ci) and the number of seeds used.
+        on_replicate(config index, replicate) is called after every single replicate.
+        """
+        configs = list(configs)
+        seeds = list(seeds)
+        done = {idx: [] for idx in range(len(configs))}
+        active = list(range(len(configs)))
+        start = 0
+        while active:
+            size = self.min_seeds if start == 0 else self.batch
+            round_seeds = seeds[start:start + size]
+            start += len(round_seeds)
+            # the same seeds for all the active configs (common random numbers), run over one pool
+            jobs = [(idx, variant) for idx in active for variant in self.variants(configs[idx])]
+
+            def collect(job, replicate):
+                done[jobs[job][0]].append(replicate)
+                if on_replicate is not None:
+                    on_replicate(jobs[job][0], replicate)
+
+            for _ in self.runner.run([variant for _, variant in jobs], round_seeds, collect):
+                pass
+
+            for idx in list(active):
+                if start >= len(seeds) or self.converged(done[idx]):
+                    active.remove(idx)
+                    replicates = sorted(done[idx], key=lambda r: (seeds.index(r['seed']), 'antithetic' in r))
+                    yield idx, replicates, self.stats(replicates)
@@ -0,0 +1,204 @@
+import math
+import numpy as np
+
+
+def attraction(points, sources, weights, epsilon=1e-6, chunk=1024, compiled=None):
+    """
+    Sums weight * (source - point) / (distance + epsilon) over all the sources, for every point.
+    It is the batched form of the attraction loops of Bug.move; points are processed in chunks so that
+    the (points x sources) temporaries stay bounded for large populations.
+    compiled is a Kernels object (see models.kernels) replacing the NumPy loop.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    sources = np.asarray(sources, dtype=float).reshape(-1, 2)
+    weights = np.asarray(weights, dtype=float).reshape(-1)
+    out = np.zeros_like(points)
+    if len(sources) == 0:
+        return out
+    if compiled is not None:
+        compiled.attraction(np.ascontiguousarray(points), np.ascontiguousarray(sources), weights, epsilon, out)
+        return out
+    for start in range(0, len(points), chunk):
+        d = sources[np.newaxis, :, :] - points[start:start + chunk, np.newaxis, :]
+        distance = np.sqrt(d[..., 0] ** 2 + d[..., 1] ** 2)
+        w = weights[np.newaxis, :] / (distance + epsilon)
+        out[start:start + chunk] = np.einsum('ij,ijk->ik', w, d)
+    return out
+
+
+def expand_ranges(starts, counts):
+    """
+    Expands the ranges [starts[i], starts[i] + counts[i]) into two flat arrays:
+    the index i of the range owning each element and the element itself.
+    """
+    starts = np.asarray(starts, dtype=int)
+    counts = np.asarray(counts, dtype=int)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(starts, counts) + offsets
+
+
+def _pair_contribution(points, sources, owner, weight, epsilon):
+    # exact contribution of the (owner point, source) pairs, accumulated per point
+    d = sources - points[owner]
+    distance = np.hypot(d[:, 0], d[:, 1])
+    w = weight / (distance + epsilon)
+    out = np.zeros_like(points)
+    out[:, 0] = np.bincount(owner, weights=w * d[:, 0], minlength=len(points))
+    out[:, 1] = np.bincount(owner, weights=w * d[:, 1], minlength=len(points))
+    return out
+
+
+def _cluster_contribution(points, owner, centroids, counts, weight, epsilon):
+    # far-field contribution: a cluster of bugs is replaced by its centroid weighted by its size
+    d = centroids - points[owner]
+    distance = np.hypot(d[:, 0], d[:, 1])
+    w = weight * counts / (distance + epsilon)
+    out = np.zeros_like(points)
+    out[:, 0] = np.bincount(owner, weights=w * d[:, 0], minlength=len(points))
+    out[:, 1] = np.bincount(owner, weights=w * d[:, 1], minlength=len(points))
+    return out
+
+
+class AllPairs:
+    """Exact all-pairs bug-to-bug attraction, O(N^2). It is the reference for the approximated indexes."""
+
+    def __init__(self):
+        self.positions = np.zeros((0, 2))
+
+    def build(self, positions):
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+
+    def attraction(self, weight=0.5, epsilon=1e-6, compiled=None):
+        """Attraction exerted on every indexed bug by all the other ones."""
+        return attraction(self.positions, self.positions, np.full(len(self.positions), weight), epsilon,
+                          compiled=compiled)
+
+
+class CellGrid(AllPairs):
+    """
+    Uniform cell grid rebuilt once per instant. The bugs of a cell are approximated by their centroid
+    when the cell is far enough from the attracted bug (cell diagonal / distance < theta); the other
+    cells are scanned exactly. A smaller theta gives a smaller error and more exact pairs.
+    """
+
+    def __init__(self, cell_size=10, theta=0.5):
+        super().__init__()
+        self.cell_size = cell_size
+        self.theta = theta
+
+    def build(self, positions):
+        super().build(positions)
+        origin = self.positions.min(axis=0) if len(self.positions) else np.zeros(2)
+        cells = np.floor((self.positions - origin) / self.cell_size).astype(int)
+        self.shape = tuple(cells.max(axis=0) + 1) if len(cells) else (1, 1)
+        code = cells[:, 0] * self.shape[1] + cells[:, 1]
+
+        # bugs sorted by cell, so that the bugs of a cell are a contiguous range
+        self.order = np.argsort(code, kind='stable')
+        n_cells = self.shape[0] * self.shape[1]
+        counts = np.bincount(code, minlength=n_cells)
+        starts = np.cumsum(counts) - counts
+        occupied = np.flatnonzero(counts)
+        self.counts = counts[occupied]
+        self.starts = starts[occupied]
+        self.centroids = np.stack([np.bincount(code, weights=self.positions[:, k], minlength=n_cells)[occupied]
+                                   for k in range(2)], axis=1) / self.counts[:, np.newaxis]
+
+    def attraction(self, weight=0.5, epsilon=1e-6, compiled=None):
+        # the approximated indexes have no compiled kernel
+        points = self.positions
+        if len(points) == 0:
+            return np.zeros((0, 2))
+        # opening criterion for every (bug, occupied cell) pair
+        d = self.centroids[np.newaxis, :, :] - points[:, np.newaxis, :]
+        distance = np.hypot(d[..., 0], d[..., 1])
+        diagonal = self.cell_size * math.sqrt(2)
+        far = diagonal < self.theta * distance
+        owner, cell = np.nonzero(far)
+        out = _cluster_contribution(points, owner, self.centroids[cell], self.counts[cell], weight, epsilon)
+
+        # exact scan of the near cells
+        owner, cell = np.nonzero(~far)
+        pair, member = expand_ranges(self.starts[cell], self.counts[cell])
+        out += _pair_contribution(points, points[self.order[member]], owner[pair], weight, epsilon)
+        return out
+
+
+class BarnesHut(AllPairs):
+    """
+    Barnes-Hut quadtree traversed level by level for all the bugs at once.
+    A node of side s whose centroid is at distance d from the attracted bug is approximated when s / d < theta,
+    otherwise its children are opened; leaves that are still too close are scanned exactly.
+    The cost is close to O(N log N); theta bounds the angular error of every approximated node.
+    """
+
+    def __init__(self, theta=0.5, leaf_size=8, max_depth=10):
+        super().__init__()
+        self.theta = theta
+        self.leaf_size = leaf_size
+        self.max_depth = max_depth
+
+    def build(self, positions):
+        super().build(positions)
+        n = len(self.positions)
+        self.depth = int(np.clip(math.ceil(math.log(max(n / self.leaf_size, 1), 4)), 1, self.max_depth))
+        self.origin = self.positions.min(axis=0) if n else np.zeros(2)
+        extent = (self.positions.max(axis=0) - self.origin).max() if n else 0
+        self.side = max(extent, 1e-9) * (1 + 1e-9)
+        side_cells = 2 ** self.depth
+        cells = np.minimum(((self.positions - self.origin) / self.side * side_cells).astype(int), side_cells - 1)
+
+        # counts and centroid sums of every node, from the leaves up to the root
+        self.counts = []
+        self.sums = []
+        for level in range(self.depth, -1, -1):
+            c = cells >> (self.depth - level)
+            code = c[:, 0] * 2 ** level + c[:, 1]
+            size = 4 ** level
+            self.counts.insert(0, np.bincount(code, minlength=size))
+            self.sums.insert(0, np.stack([np.bincount(code, weights=self.positions[:, k], minlength=size)
+                                          for k in range(2)], axis=1))
+            if level == self.depth:
+                self.order = np.argsort(code, kind='stable')
+                self.leaf_starts = np.cumsum(self.counts[0]) - self.counts[0]
+
+    def attraction(self, weight=0.5, epsilon=1e-6, compiled=None):
+        # the approximated indexes have no compiled kernel
+        points = self.positions
+        out = np.zeros_like(points)
+        if len(points) == 0:
+            return out
+        # frontier of (bug, node) pairs still to be evaluated, starting from the root
+        owner = np.arange(len(points))
+        ix = np.zeros(len(points), dtype=int)
+        iy = np.zeros(len(points), dtype=int)
+        for level in range(self.depth + 1):
+            code = ix * 2 ** level + iy
+            counts = self.counts[level][code]
+            keep = counts > 0
+            owner, ix, iy, code, counts = owner[keep], ix[keep], iy[keep], code[keep], counts[keep]
+            centroids = self.sums[level][code] / counts[:, np.newaxis]
+            d = centroids - points[owner]
+            distance = np.hypot(d[:, 0], d[:, 1])
+            far = self.side / 2 ** level < self.theta * distance
+            out += _cluster_contribution(points, owner[far], centroids[far], counts[far], weight, epsilon)
+            owner, ix, iy, code = owner[~far], ix[~far], iy[~far], code[~far]
+            if level == self.depth:
+                # leaves too close to be approximated
+                pair, member = expand_ranges(self.leaf_starts[code], self.counts[level][code])
+                out += _pair_contribution(points, points[self.order[member]], owner[pair], weight, epsilon)
+            else:
+                # open the four children of every remaining node
+                owner = np.repeat(owner, 4)
+                ix = np.repeat(2 * ix, 4) + np.tile([0, 0, 1, 1], len(ix))
+                iy = np.repeat(2 * iy, 4) + np.tile([0, 1, 0, 1], len(iy))
+        return out
+
+
+def make_neighbor_index(mode='exact', **params):
+    """Builds the bug-to-bug attraction index: 'exact' (all pairs), 'grid' or 'barnes_hut'."""
+    indexes = {'exact': AllPairs, 'grid': CellGrid, 'barnes_hut': BarnesHut}
+    if mode not in indexes:
+        raise ValueError(f"Unknown attraction mode '{mode}', expected one of {list(indexes)}.")
+    return indexes[mode](**params)
@@ -0,0 +1,103 @@
+import numpy as np
+
+from .pesticide import Pesticide
+
+
+class PesticideField:
+    """
+    Struct-of-arrays version of a list of Pesticide objects.
+    Positions, radii, quantities and decay parameters of all the sprayers are NumPy arrays updated in one
+    step (see Pesticide.spread for the model). The indexes of the sprayers that are not dissipated yet are
+    kept in `active`: dissipated sprayers are dropped from it and are no longer spread nor applied to the bugs.
+    The largest radius reached so far and whether any sprayer is still active are available in O(1).
+    """
+
+    def __init__(self, ids, positions, radii, quantities, decay_factor=0.0025, mortality_probability=0.8,
+                 repulsion_probability=0.6, name="Fenpropathrin"):
+        n = len(ids)
+        self.ids = np.asarray(ids)
+        self.name = name
+        self.position = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.radius = np.asarray(radii, dtype=float).reshape(n)
+        self.quantity = np.asarray(quantities, dtype=float).reshape(n)
+        self.decay_factor = np.broadcast_to(np.asarray(decay_factor, dtype=float), (n,)).copy()
+        self.mortality_probability = np.broadcast_to(np.asarray(mortality_probability, dtype=float), (n,)).copy()
+        self.repulsion_probability = np.broadcast_to(np.asarray(repulsion_probability, dtype=float), (n,)).copy()
+
+        self.active = np.flatnonzero(self.quantity != 0)
+        # largest radius reached by spreading
+        self.max_radius = 0.0
+
+    @classmethod
+    def from_pesticides(cls, pesticides):
+        return cls([p.id for p in pesticides],
+                   np.array([p.position for p in pesticides], dtype=float),
+                   [p.radius for p in pesticides],
+                   [p.quantity for p in pesticides],
+                   [p.decay_factor for p in pesticides],
+                   [p.mortality_probability for p in pesticides],
+                   [p.repulsion_probability for p in pesticides],
+                   pesticides[0].name if pesticides else "Fenpropathrin")
+
+    def to_pesticides(self):
+        """Back to Pesticide objects, e.g. to inspect the single sprayers."""
+        pesticides = []
+        for i in range(len(self)):
+            pesticide = Pesticide(int(self.ids[i]), self.name, self.position[i], self.radius[i], self.quantity[i])
+            pesticide.decay_factor = self.decay_factor[i]
+            pesticide.mortality_probability = self.mortality_probability[i]
+            pesticide.repulsion_probability = self.repulsion_probability[i]
+            pesticides.append(pesticide)
+        return pesticides
+
+    def take(self, idx):
+        """New field with the sprayers at idx, e.g. the sprayers owned by a domain (see models.domains)."""
+        idx = np.asarray(idx, dtype=int)
+        field = PesticideField(self.ids[idx], self.position[idx], self.radius[idx], self.quantity[idx],
+                               self.decay_factor[idx], self.mortality_probability[idx],
+                               self.repulsion_probability[idx], self.name)
+        field.max_radius = self.max_radius
+        return field
+
+    def __len__(self):
+        return len(self.ids)
+
+    def any_active(self):
+        return len(self.active) > 0
+
+    def spread(self, environment, time_step, reference_step=None):
+        """
+        Pesticide.spread of every active sprayer at once, with the temperature and humidity of the environment
+        gathered at the sprayer positions. Sprayers whose quantity drops below 0.01 g are dissipated.
+        """
+        idx = self.active
+        if len(idx) == 0:
+            return
+        temperature = environment.get_temperatures_at(self.position[idx, 0], self.position[idx, 1])
+        humidity = environment.get_humidities_at(self.position[idx, 0], self.position[idx, 1])
+
+        # Turbulent diffusion effect (m)
+        diffusion_factor = np.sqrt(time_step)
+        if reference_step is not None:
+            diffusion_factor = np.sqrt(reference_step) * time_step / reference_step
+        # Temperature and humidity influence on spread
+        temp_factor = 1 + 0.02 * (temperature - 25)
+        humidity_factor = 1 - 0.004 * humidity
+        spread_rate = environment.get_wind_speed() * time_step * 0.15 * temp_factor * humidity_factor + diffusion_factor
+
+        # arrays are replaced, not modified in place, so that earlier references keep the previous state
+        radius = self.radius.copy()
+        radius[idx] += spread_rate
+        quantity = self.quantity.copy()
+        quantity[idx] *= np.exp(-self.decay_factor[idx] * time_step * temp_factor * humidity_factor)
+
+        # End of effect condition
+        dissipated = quantity[idx] < 0.01
+        quantity[idx[dissipated]] = 0
+        self.radius, self.quantity = radius, quantity
+        self.max_radius = max(self.max_radius, float(np.max(radius[idx])))
+        self.active = idx[~dissipated]
+
+    def arrays(self, fields=('position', 'quantity')):
+        """The requested attributes of the active sprayers (see swarm.pesticide_arrays)."""
+        return tuple(getattr(self, field)[self.active] for field in fields)
@@ -0,0 +1,82 @@
+import cProfile
+import os
+import time
+
+
+class _Timer:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+
+class PhaseProfiler:
+    """
+    Wall time and number of calls of the phases of Twin.run, plus free counters (pairs evaluated, steps, ...).
+        with profiler.phase('exposure'):
+            ...
+        profiler.count('exposure_pairs', n)
+    Phases can be nested: the time of an inner phase is also part of the outer one.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.times = {}
+        self.calls = {}
+        self.counters = {}
+
+    def phase(self, name):
+        return _Timer(self, name)
+
+    def add(self, name, seconds):
+        self.times[name] = self.times.get(name, 0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        return {
+            'phases': {name: {'seconds': self.times[name], 'calls': self.calls[name]} for name in self.times},
+            'counters': dict(self.counters)
+        }
+
+
+class _NullTimer:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NullProfiler:
+    """Disabled PhaseProfiler: the phases cost one method call and nothing is recorded."""
+
+    enabled = False
+    _timer = _NullTimer()
+
+    def phase(self, name):
+        return self._timer
+
+    def count(self, name, n=1):
+        pass
+
+    def report(self):
+        return None
+
+
+def profile_call(path, function, *args, **kwargs):
+    """Runs function under cProfile and saves the statistics to path (readable with pstats or snakeviz)."""
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(function, *args, **kwargs)
+    finally:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        profile.dump_stats(path)
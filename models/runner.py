@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .experiment import run_replicate, summarize
+from .io.logger import logger
+
+
+def warm_up(backends=("numpy",)):
+    """
+    Loads the trained artifacts of the LSTM backends and the climate data once per worker process.
+    A failure only costs the warm-up: the replicates load what they need themselves (and fail there if it is
+    really missing), instead of the pool breaking in its initializer.
+    """
+    from .ai.registry import registry
+    from .io.climate import ClimateStore
+    for backend in backends:
+        try:
+            for name in ("lstm_temperature_model.keras", "lstm_humidity_model.keras"):
+                registry.load_model(name, backend)
+            for name in ("scaler_temperature.save", "scaler_humidity.save"):
+                registry.load_scaler(name, "numpy" if backend == "numpy" else "joblib")
+        except Exception as error:
+            logger.warning('warm_up_failed', backend=backend, error=repr(error))
+    try:
+        ClimateStore.open("temperature")
+        ClimateStore.open("humidity")
+    except Exception as error:
+        logger.warning('warm_up_failed', backend='climate', error=repr(error))
+
+
+def _run_task(task):
+    idx, seed, config = task
+    try:
+        return idx, run_replicate(seed, **config)
+    finally:
+        # pool workers leave through os._exit, without atexit: the events of the task are written before
+        logger.flush()
+
+
+class ReplicateRunner:
+    """
+    Runs the seeded replicates of many experiment configurations over a pool of worker processes.
+    A config is a dict with bugs_parameters, tree_parameters, pesticide_parameters and, optionally,
+    environment_parameters (see run_replicate). Every worker keeps its models and climate data warm for all
+    the replicates it runs. Replicates reseed the global RNGs, so results are the same as the serial run.
+    With workers=1 everything runs in the calling process.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+
+    @staticmethod
+    def backends(configs):
+        """LSTM backends used by the configs, to warm up the workers with."""
+        return tuple(sorted({(config.get('environment_parameters') or {}).get('lstm_backend', 'numpy')
+                             for config in configs}))
+
+    def tasks(self, configs, seeds, done=None):
+        done = done or {}
+        finished = {(idx, r['seed']) for idx, replicates in done.items() for r in replicates}
+        return [(idx, seed, config) for idx, config in enumerate(configs) for seed in seeds
+                if (idx, seed) not in finished]
+
+    def run(self, configs, seeds, on_replicate=None, done=None):
+        """
+        Yields (config index, replicates sorted by seed, mean/std summary) as soon as all the replicates of a
+        config are finished. on_replicate(config index, replicate) is called after every single replicate.
+        done maps a config index to replicates already computed (e.g. by an interrupted run): they are not
+        run again.
+        """
+        configs = list(configs)
+        seeds = list(seeds)
+        tasks = self.tasks(configs, seeds, done)
+        done = {idx: list((done or {}).get(idx, [])) for idx in range(len(configs))}
+        for idx in range(len(configs)):
+            if len(done[idx]) == len(seeds):
+                replicates = sorted(done.pop(idx), key=lambda r: seeds.index(r['seed']))
+                yield idx, replicates, summarize(replicates)
+
+        def collect(idx, replicate):
+            if on_replicate is not None:
+                on_replicate(idx, replicate)
+            done[idx].append(replicate)
+            if len(done[idx]) == len(seeds):
+                replicates = sorted(done.pop(idx), key=lambda r: seeds.index(r['seed']))
+                return idx, replicates, summarize(replicates)
+            return None
+
+        if self.workers == 1:
+            for task in tasks:
+                finished = collect(*_run_task(task))
+                if finished is not None:
+                    yield finished
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up,
+                                 initargs=(self.backends(configs),)) as pool:
+            futures = [pool.submit(_run_task, task) for task in tasks]
+            for future in as_completed(futures):
+                finished = collect(*future.result())
+                if finished is not None:
+                    yield finished
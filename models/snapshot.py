@@ -0,0 +1,118 @@
+import copy
+import pickle
+import random
+from collections import deque
+import numpy as np
+
+from .ai.forecast_cache import ForecastTrajectory
+from .io.climate import ClimateStore
+
+#######################################################################################################################
+# Snapshots of a Twin, to branch many scenarios from one shared warm-up:
+#     twin = Twin(...)
+#     twin.run(duration=24)                   # common prefix, paid once
+#     snapshot = TwinSnapshot.capture(twin)
+#     for params in layouts:
+#         branch = snapshot.restore()
+#         branch.set_pesticides(params)
+#         results = branch.run()
+# A snapshot holds a private copy of the Twin object graph (bugs, sprayers, trees and fruits, environment with its
+# climate windows and maps, static attraction, raster, progress of the run) and the state of both random
+# generators. Capturing copies the arrays once, so the captured Twin keeps running on its own, writable arrays.
+# From there on the arrays are not copied: the simulation never modifies an array in place (steps rebind new
+# arrays), so the snapshot and all its branches share its arrays, copy-on-write. These are made read-only to turn
+# an accidental in-place write into an error instead of a change leaking across branches.
+# The forecasting models, the climate stores and the forecast cache are shared by the process and are never
+# copied; a saved snapshot references them by name and reloads them (see Environment.__getstate__).
+#######################################################################################################################
+
+
+def _is_shared(obj):
+    # process-wide objects: never copied, never frozen
+    return isinstance(obj, (ClimateStore, ForecastTrajectory))
+
+
+def reachable(root, write=True):
+    """The arrays and the process-wide objects reachable from root, keyed by id; write=False freezes the arrays."""
+    shared = {}
+    seen = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            if not write:
+                obj.setflags(write=False)
+            shared[id(obj)] = obj
+        elif _is_shared(obj):
+            shared[id(obj)] = obj
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, deque)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+            # the pickled state, without what the objects do not copy (e.g. the models of Environment)
+            state = obj.__getstate__() if hasattr(obj, '__getstate__') else vars(obj)
+            stack.extend(state.values() if isinstance(state, dict) else [])
+    return shared
+
+
+def freeze(root):
+    """Makes the arrays reachable from root read-only; returns them and the process-wide objects, keyed by id."""
+    return reachable(root, write=False)
+
+
+def share_copy(root):
+    """Deep copy of root that shares (and freezes) its arrays and the process-wide objects."""
+    # deepcopy returns the objects already in the memo as they are
+    return copy.deepcopy(root, freeze(root))
+
+
+class TwinSnapshot:
+    """Frozen state of a Twin and of the random generators, see the header of the module."""
+
+    def __init__(self, twin, rng):
+        self.twin = twin
+        self.rng = rng
+
+    @classmethod
+    def capture(cls, twin):
+        """Snapshot of a Twin, which keeps running on its own arrays (left writable)."""
+        processes = {key: obj for key, obj in reachable(twin).items() if not isinstance(obj, np.ndarray)}
+        frozen = copy.deepcopy(twin, processes)
+        freeze(frozen)
+        return cls(frozen, (np.random.get_state(), random.getstate()))
+
+    def restore(self, seed=None):
+        """
+        A new Twin in the captured state, to be run before restoring the next one. The random generators are
+        reset to the captured state, so that all the branches see the same draws (common random numbers),
+        or reseeded with seed.
+        """
+        twin = share_copy(self.twin)
+        if seed is None:
+            np.random.set_state(self.rng[0])
+            random.setstate(self.rng[1])
+        else:
+            np.random.seed(seed)
+            random.seed(seed)
+        return twin
+
+    def branches(self, n, seeds=None):
+        """Yields n restored Twins, each one restored when the previous one has been run."""
+        for i in range(n):
+            yield self.restore(None if seeds is None else seeds[i])
+
+    def save(self, path):
+        """Writes the snapshot, e.g. to restore the branches in other processes (see load)."""
+        with open(path, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as file:
+            snapshot = pickle.load(file)
+        freeze(snapshot.twin)
+        return snapshot
@@ -0,0 +1,59 @@
+import math
+import numpy as np
+
+
+#######################################################################################################################
+# Adaptive time stepping of Twin.run.
+# After every step the stepper looks at how fast the pesticide clouds changed (relative growth of the radius,
+# relative decay of the quantity) and at the expected number of mortality events, and picks the next step so that
+# none of them changes by more than the requested tolerance within one step. Steps are whole minutes and never
+# cross the hourly update of the environment.
+#######################################################################################################################
+
+class AdaptiveStepper:
+    """
+    reference   time step (min) the bug behaviour is calibrated on (env_params['time_step'])
+    tolerance   largest relative change of a pesticide radius or quantity allowed in one step
+    max_deaths  largest expected number of mortality events allowed in one step
+    min_step, max_step  bounds of the step (min); growth limits how fast the step can grow
+    Lower tolerance and max_deaths give results closer to the fixed reference step, higher ones fewer steps.
+    """
+
+    def __init__(self, reference, tolerance=0.25, max_deaths=0.5, min_step=1, max_step=60, growth=2):
+        self.reference = reference
+        self.tolerance = tolerance
+        self.max_deaths = max_deaths
+        self.min_step = min_step
+        self.max_step = max_step
+        self.growth = growth
+        self.step = reference
+        self.steps = 0
+
+    @classmethod
+    def from_params(cls, reference, params):
+        """params is True for the defaults, or a dict of the keyword arguments."""
+        return cls(reference) if params is True else cls(reference, **params)
+
+    def next_step(self, remaining):
+        """Length (min) of the next step with `remaining` minutes left before the hourly update."""
+        self.steps += 1
+        return min(self.step, remaining)
+
+    def observe(self, step, radii_before, radii_after, quantities_before, quantities_after, expected_deaths):
+        """Error indicators of the step just taken; they set the length of the next one."""
+        rates = [0.0]
+        active = quantities_before > 0
+        # a sprayer of radius 0 (initial_radius 0) has no relative growth: it is only followed from the next step
+        spreading = active & (radii_before > 0)
+        if np.any(spreading):
+            rates.append(np.max((radii_after[spreading] - radii_before[spreading]) / radii_before[spreading]) / step)
+        if np.any(active):
+            rates.append(np.max((quantities_before[active] - quantities_after[active]) / quantities_before[active]) / step)
+        rate = max(rates)
+        allowed = [self.max_step, self.growth * step]
+        if rate > 0:
+            allowed.append(self.tolerance / rate)
+        if expected_deaths > 0:
+            # expected_deaths is given per reference step
+            allowed.append(self.max_deaths * self.reference / expected_deaths)
+        self.step = max(self.min_step, math.floor(min(allowed)))
@@ -0,0 +1,248 @@
+import numpy as np
+
+from .bug import Bug
+from .neighbors import AllPairs, attraction
+from .exposure import sample_deaths
+from .profiling import NullProfiler
+
+
+def pesticide_arrays(pesticides, fields=('position', 'quantity')):
+    """Returns the requested attributes of a list of pesticides (or of the active sprayers of a PesticideField) as arrays."""
+    if hasattr(pesticides, 'arrays'):
+        return pesticides.arrays(fields)
+    arrays = []
+    for field in fields:
+        values = np.array([getattr(p, field) for p in pesticides], dtype=float)
+        arrays.append(values.reshape(-1, 2) if field == 'position' else values)
+    return tuple(arrays)
+
+
+def fruit_arrays(trees):
+    """Aggregates the fruits of every tree: all the fruits of a tree share its position, so the fruit
+    attraction of a tree is its position weighted by the sum of the ripe lifetimes."""
+    if len(trees) == 0:
+        return np.zeros((0, 2)), np.zeros(0)
+    positions = np.array([tree.position for tree in trees], dtype=float)
+    weights = np.array([sum(fruit.ripe_lifetime for fruit in tree.fruits) for tree in trees], dtype=float)
+    return positions, weights
+
+
+class BugSwarm:
+    """
+    Struct-of-arrays version of a population of Bug objects.
+    Positions, ids, alive/escaped flags and movement parameters are stored as NumPy arrays and the whole
+    population is moved in one batched step. Bugs are never removed from the arrays: dead and escaped
+    bugs are simply masked out through the alive flags.
+    The bug-to-bug attraction is delegated to a neighbor index (see models.neighbors), rebuilt once per step.
+    """
+
+    def __init__(self, ids, positions, maximum_step, p_max=0.9, p_min=0.2, T_opt=22, sigma=3, neighbors=None,
+                 raster=None, static=None, kernels=None):
+        self.ids = np.asarray(ids, dtype=int).reshape(-1)
+        n = len(self.ids)
+        self.positions = np.asarray(positions, dtype=float).reshape(n, 2)
+        # Maximum movement length in meters
+        self.L_max = self._per_bug(maximum_step, n)
+        # Small constant to avoid division by zero
+        self.epsilon = 1e-6
+
+        # Parameters for temperature-based movement probability (see Bug)
+        self.p_max = self._per_bug(p_max, n)
+        self.p_min = self._per_bug(p_min, n)
+        self.T_opt = self._per_bug(T_opt, n)
+        self.sigma = self._per_bug(sigma, n)
+
+        # state of the population
+        self.alive = np.ones(n, dtype=bool)
+        self.escaped = np.zeros(n, dtype=bool)
+        self.n_alive = n
+        # expected mortality events of a reference step, updated by expose
+        self.expected_deaths = 0
+
+        # exact all-pairs attraction unless an approximated index is given
+        self.neighbors = neighbors if neighbors is not None else AllPairs()
+        # optional ConcentrationGrid (see models.raster): when given, exposure and pesticide repulsion are grid
+        # lookups instead of sums over the sprayers; its owner rebuilds it after every spread
+        self.raster = raster
+        # optional StaticAttraction (see models.attractors) caching the fruit and sensor attraction; its owner
+        # updates it when the fruits or the hour change
+        self.static = static
+        # optional Kernels (see models.kernels) replacing the NumPy loops of attraction, exposure and move
+        self.kernels = kernels
+        # phase timers and counters, see models.profiling
+        self.profiler = NullProfiler()
+
+    @staticmethod
+    def _per_bug(value, n):
+        return np.broadcast_to(np.asarray(value, dtype=float), (n,)).copy()
+
+    @classmethod
+    def from_bugs(cls, bugs, neighbors=None, raster=None, static=None, kernels=None):
+        """Builds a swarm from a list of Bug objects, keeping their ids and parameters."""
+        return cls([bug.id for bug in bugs],
+                   [bug.position for bug in bugs],
+                   [bug.L_max for bug in bugs],
+                   p_max=[bug.p_max for bug in bugs],
+                   p_min=[bug.p_min for bug in bugs],
+                   T_opt=[bug.T_opt for bug in bugs],
+                   sigma=[bug.sigma for bug in bugs],
+                   neighbors=neighbors,
+                   raster=raster,
+                   static=static,
+                   kernels=kernels)
+
+    def take(self, idx):
+        """
+        New swarm with the bugs at idx, all alive, e.g. the bugs migrating to another domain (see models.domains).
+        The neighbor index, raster, static attraction and kernels are not carried over.
+        """
+        idx = np.asarray(idx, dtype=int)
+        return BugSwarm(self.ids[idx], self.positions[idx], self.L_max[idx], p_max=self.p_max[idx],
+                        p_min=self.p_min[idx], T_opt=self.T_opt[idx], sigma=self.sigma[idx])
+
+    @classmethod
+    def concatenate(cls, swarms, neighbors=None, raster=None, static=None):
+        """One swarm with the alive bugs of all the swarms."""
+        parts = [swarm.take(swarm.active()) for swarm in swarms]
+        return cls(np.concatenate([part.ids for part in parts]),
+                   np.concatenate([part.positions for part in parts]),
+                   np.concatenate([part.L_max for part in parts]),
+                   p_max=np.concatenate([part.p_max for part in parts]),
+                   p_min=np.concatenate([part.p_min for part in parts]),
+                   T_opt=np.concatenate([part.T_opt for part in parts]),
+                   sigma=np.concatenate([part.sigma for part in parts]),
+                   neighbors=neighbors,
+                   raster=raster,
+                   static=static)
+
+    def to_bugs(self):
+        """Returns the alive bugs as Bug objects."""
+        bugs = []
+        for i in np.flatnonzero(self.alive):
+            bug = Bug(int(self.ids[i]), 100, 2, self.positions[i], self.L_max[i])
+            bug.p_max, bug.p_min, bug.T_opt, bug.sigma = self.p_max[i], self.p_min[i], self.T_opt[i], self.sigma[i]
+            bugs.append(bug)
+        return bugs
+
+    def __len__(self):
+        return self.n_alive
+
+    def count(self):
+        return self.n_alive
+
+    def active(self):
+        """Indexes of the alive bugs."""
+        return np.flatnonzero(self.alive)
+
+    def remove(self, idx, escaped=False):
+        """Marks the bugs at the given indexes as not alive (and as escaped if required)."""
+        idx = np.asarray(idx, dtype=int)
+        if len(idx) == 0:
+            return 0
+        with self.profiler.phase('removal'):
+            return self._remove(idx, escaped)
+
+    def _remove(self, idx, escaped):
+        alive = self.alive.copy()
+        alive[idx] = False
+        self.alive = alive
+        if escaped:
+            flags = self.escaped.copy()
+            flags[idx] = True
+            self.escaped = flags
+        self.n_alive = int(np.count_nonzero(self.alive))
+        return len(idx)
+
+    def temperature_movement_probability(self, environment, idx):
+        # Gaussian response around the optimal temperature, evaluated at every bug position
+        T = environment.get_temperatures_at(self.positions[idx, 0], self.positions[idx, 1])
+        return self.p_min[idx] + (self.p_max[idx] - self.p_min[idx]) * np.exp(-((T - self.T_opt[idx]) ** 2) / (2 * self.sigma[idx] ** 2))
+
+    def movement_vectors(self, environment, trees, pesticides, idx=None):
+        """Net movement vectors (Mx, My) of the bugs at idx (all the alive bugs by default)."""
+        if idx is None:
+            idx = self.active()
+        pos = self.positions[idx]
+
+        # --- Attractors ---
+        if self.static is not None:
+            # cached fruit and sensor attraction
+            M = self.static.attraction(pos)
+        else:
+            # Fruit attraction, aggregated per tree
+            tree_pos, tree_weights = fruit_arrays(trees)
+            M = attraction(pos, tree_pos, tree_weights, self.epsilon, compiled=self.kernels)
+
+            # Attraction to sensors with higher temperature (normalized with a max temp of 30°C)
+            sensor_weights = np.asarray(environment.current_temperature[0], dtype=float) / 30
+            M += attraction(pos, environment.positions, sensor_weights, self.epsilon, compiled=self.kernels)
+
+        # Attraction to other bugs; the bug itself contributes a null vector
+        self.neighbors.build(pos)
+        M += self.neighbors.attraction(0.5, self.epsilon, self.kernels)
+
+        # --- Repellents ---
+        # Pesticide repulsion
+        if self.raster is not None:
+            M -= self.raster.repulsion(pos)
+            return M
+        pest_pos, pest_quantities = pesticide_arrays(pesticides)
+        M -= attraction(pos, pest_pos, pest_quantities, self.epsilon, compiled=self.kernels)
+        return M
+
+    def move(self, environment, trees, pesticides, fraction=1):
+        """
+        Moves every alive bug at once and removes the ones that left the field.
+        Differently from calling Bug.move bug after bug, all the bugs see the positions at the beginning
+        of the step. fraction scales the step length for steps longer or shorter than the reference one.
+        Returns the number of bugs that escaped.
+        """
+        idx = self.active()
+        if len(idx) == 0:
+            return 0
+        self.profiler.count('bugs_moved', len(idx))
+        M = self.movement_vectors(environment, trees, pesticides, idx)
+
+        # temperature-gated move decision; bugs with no net vector stay in place
+        move_prob = self.temperature_movement_probability(environment, idx)
+        if self.kernels is not None:
+            step = np.empty_like(M)
+            moving = np.empty(len(idx), dtype=bool)
+            self.kernels.gated_steps(M, self.L_max[idx], move_prob, np.random.rand(len(idx)), fraction, step, moving)
+        else:
+            M_norm = np.hypot(M[:, 0], M[:, 1])
+            moving = (M_norm > 0) & (np.random.rand(len(idx)) < move_prob)
+            step = self.L_max[idx, np.newaxis] * M / np.where(M_norm > 0, M_norm, 1)[:, np.newaxis]
+            if fraction != 1:
+                step *= fraction
+        positions = self.positions.copy()
+        positions[idx[moving]] += step[moving]
+        self.positions = positions
+
+        # out-of-field test
+        width, height = environment.get_size()
+        x, y = self.positions[idx, 0], self.positions[idx, 1]
+        outside = (x > width) | (x < 0) | (y > height) | (y < 0)
+        return self.remove(idx[outside], escaped=True)
+
+    def expose(self, pesticides, mode='auto', fraction=1):
+        """
+        Applies all the pesticides to every alive bug with a single draw of the mortality outcomes
+        (see models.exposure for the dense and sparse paths). fraction is the length of the step in
+        reference steps. Returns the number of killed bugs; the expected number of mortality events of a
+        reference step is kept in expected_deaths.
+        """
+        idx = self.active()
+        self.expected_deaths = 0
+        if len(idx) == 0 or len(pesticides) == 0:
+            return 0
+        if self.raster is not None:
+            self.profiler.count('exposure_lookups', len(idx))
+            killed, self.expected_deaths = self.raster.sample_deaths(self.positions[idx], fraction)
+            return self.remove(idx[killed])
+        positions, radii, quantities, mortality = pesticide_arrays(
+            pesticides, ('position', 'radius', 'quantity', 'mortality_probability'))
+        self.profiler.count('exposure_pairs', len(radii) * len(idx))
+        killed, self.expected_deaths = sample_deaths(positions, radii, quantities, mortality, self.positions[idx],
+                                                     mode, fraction, return_expected=True, compiled=self.kernels)
+        return self.remove(idx[killed])
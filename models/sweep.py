@@ -0,0 +1,193 @@
+import csv
+import itertools
+import json
+import os
+
+from .experiment import METRICS, make_orchard_grid, make_pesticide_parameters
+from .io.cache import digest
+from .runner import ReplicateRunner
+
+#######################################################################################################################
+# Declarative experiment sweeps.
+# A spec is a JSON file with the parameter axes to explore, the fixed parameters and the seeds, e.g.
+# {
+#     "name": "pesticide_layout",
+#     "output": "output/layout_sweep.csv",
+#     "mode": "product",
+#     "seeds": 13,
+#     "fixed": {"orchard": {"rows": 12, "cols": 15}, "max_pears": 10, "quantity": 1800, "bugs": 400},
+#     "axes": {"layout": [0, 1, 2]}
+# }
+# Every point of the sweep (fixed parameters updated with one value per axis) supports:
+#   quantity     total grams of pesticide, split among the sprayers
+#   layout       0, 1, 2 (see make_pesticide_parameters) or "all" for one sprayer per tree
+#   orchard      {"rows": .., "cols": ..} grid of make_orchard_grid, or "trees": explicit tree positions
+#   bugs         number of bugs
+#   wind         null for a wind drawn from the seed, or {"direction": [x, y], "speed": s}
+#   environment  extra environment parameters (starting_date, time_step, adaptive_step, profile, size, tiles,
+#                domains, ...)
+# "profile": {"point": 0, "seed": 3} at the top level runs that replicate under cProfile and saves the statistics
+# next to the output CSV.
+# Finished replicates are appended to <output>.checkpoint.jsonl, so an interrupted sweep resumes where it
+# stopped; the aggregated row of a point is appended to the output CSV as soon as all its seeds are done (an output
+# written with other columns is first rewritten under the current header).
+#######################################################################################################################
+
+DEFAULTS = {
+    'quantity': 1800,
+    'layout': 'all',
+    'orchard': {'rows': 12, 'cols': 15},
+    'max_pears': 10,
+    'bugs': 400,
+    'wind': None,
+    'environment': {}
+}
+
+
+class Sweep:
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec.get('name', 'sweep')
+        self.output = spec.get('output', os.path.join('output', f'{self.name}.csv'))
+        self.checkpoint = f'{self.output}.checkpoint.jsonl'
+        self.mode = spec.get('mode', 'product')
+        seeds = spec.get('seeds', 13)
+        self.seeds = list(range(seeds)) if isinstance(seeds, int) else list(seeds)
+        self.axes = spec.get('axes', {})
+        self.points = self.expand()
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r') as file:
+            return cls(json.load(file))
+
+    def expand(self):
+        """Points of the sweep: cartesian product or zip of the axes over the fixed parameters."""
+        names = list(self.axes)
+        values = [self.axes[name] for name in names]
+        if self.mode == 'product':
+            combinations = itertools.product(*values)
+        elif self.mode == 'zip':
+            if len({len(v) for v in values}) > 1:
+                raise ValueError(f"Sweep '{self.name}': zipped axes must have the same length.")
+            combinations = zip(*values)
+        else:
+            raise ValueError(f"Sweep '{self.name}': unknown mode '{self.mode}', expected 'product' or 'zip'.")
+        points = []
+        for combination in combinations:
+            point = dict(DEFAULTS, **self.spec.get('fixed', {}))
+            point.update(zip(names, combination))
+            points.append(point)
+        return points
+
+    @staticmethod
+    def key(point):
+        return digest(json.dumps(point, sort_keys=True))
+
+    @staticmethod
+    def build_config(point):
+        """Parameters of run_replicate for a point of the sweep."""
+        if 'trees' in point:
+            grid = point['trees']
+            rows, cols = len(grid), 1
+        else:
+            rows, cols = point['orchard']['rows'], point['orchard']['cols']
+            grid = make_orchard_grid(rows, cols)
+        if point['layout'] == 'all':
+            pesticide_parameters = {
+                'quantity': point['quantity'] / len(grid),
+                'initial_radius': 1,
+                'number': len(grid),
+                'positions': grid
+            }
+        else:
+            pesticide_parameters = make_pesticide_parameters(point['layout'], point['quantity'], rows, cols, grid)
+        environment_parameters = dict(point['environment'])
+        if point['wind'] is not None:
+            environment_parameters['wind'] = point['wind']
+        return {
+            'bugs_parameters': {'number': point['bugs']},
+            'tree_parameters': {'number': 1, 'max_pears': point['max_pears'], 'positions': grid},
+            'pesticide_parameters': pesticide_parameters,
+            'environment_parameters': environment_parameters
+        }
+
+    def load_checkpoint(self):
+        """Replicates already finished, per point index."""
+        keys = {self.key(point): idx for idx, point in enumerate(self.points)}
+        done = {}
+        if os.path.exists(self.checkpoint):
+            with open(self.checkpoint, 'rb+') as file:
+                content = file.read()
+                # the last line of an interrupted write is dropped, or the next entry would be appended to it
+                file.truncate(content.rfind(b'\n') + 1)
+            for line in content.decode().splitlines():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # last line of an interrupted write
+                idx = keys.get(entry['key'])
+                if idx is not None and entry['replicate']['seed'] in self.seeds:
+                    replicates = done.setdefault(idx, [])
+                    if all(r['seed'] != entry['replicate']['seed'] for r in replicates):
+                        replicates.append(entry['replicate'])
+        return done
+
+    def written_keys(self):
+        if not os.path.exists(self.output):
+            return set()
+        with open(self.output, 'r', newline='') as file:
+            return {row['key'] for row in csv.DictReader(file)}
+
+    def columns(self):
+        return ['key'] + list(self.axes) + [f'{m}_{s}' for m in METRICS for s in ('mean', 'std')] + ['replicates']
+
+    def check_header(self):
+        """
+        Rewrites an output CSV written with other columns (e.g. before a metric was added) under the current
+        header, so that the rows appended on resume line up; the missing columns of the old rows are left empty.
+        """
+        if not os.path.exists(self.output):
+            return
+        with open(self.output, 'r', newline='') as file:
+            reader = csv.DictReader(file)
+            rows = list(reader)
+            if reader.fieldnames == self.columns():
+                return
+        with open(self.output, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=self.columns(), extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def run(self, workers=1, on_replicate=None):
+        """Runs (or resumes) the sweep; yields the aggregated row of every point as soon as it is complete."""
+        os.makedirs(os.path.dirname(self.output) or '.', exist_ok=True)
+        done = self.load_checkpoint()
+        self.check_header()
+        written = self.written_keys()
+        configs = [self.build_config(point) for point in self.points]
+        if 'profile' in self.spec:
+            idx, seed = self.spec['profile']['point'], self.spec['profile']['seed']
+            configs[idx]['cprofile'] = {'seed': seed,
+                                        'path': f"{os.path.splitext(self.output)[0]}.point{idx}_seed{seed}.prof"}
+
+        def checkpoint(idx, replicate):
+            with open(self.checkpoint, 'a') as file:
+                file.write(json.dumps({'key': self.key(self.points[idx]), 'replicate': replicate}) + '\n')
+            if on_replicate is not None:
+                on_replicate(idx, replicate)
+
+        for idx, replicates, stats in ReplicateRunner(workers).run(configs, self.seeds, checkpoint, done):
+            point = self.points[idx]
+            row = dict({'key': self.key(point), 'replicates': len(replicates)},
+                       **{name: json.dumps(point[name]) if isinstance(point[name], (dict, list)) else point[name]
+                          for name in self.axes}, **stats)
+            if row['key'] not in written:
+                new_file = not os.path.exists(self.output)
+                with open(self.output, 'a', newline='') as file:
+                    writer = csv.DictWriter(file, fieldnames=self.columns())
+                    if new_file:
+                        writer.writeheader()
+                    writer.writerow(row)
+                written.add(row['key'])
+            yield row
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+import numpy as np
+
+
+class TiledMap:
+    """
+    Sensor values interpolated by inverse distance weighting on the cells of a large field, evaluated lazily
+    one square tile at a time instead of as one dense (width, height) array.
+    The cells have a side of 1 / resolution meters and the value of a cell is the IDW at its lower-left corner,
+    as in the dense maps of Environment (resolution 1 gives the same cells). Tiles are stored as float32 and
+    the most recently used ones are kept in an LRU cache of cache_tiles tiles, so the memory is bounded by
+    cache_tiles * tile_size² * 4 bytes whatever the extent of the field (the cache should hold the tiles of the
+    area occupied by the bugs, or they are recomputed at every step).
+    size        (width, height) of the field (m)
+    positions   (sensors, 2) sensor positions (m)
+    values      sensor values
+    resolution  cells per meter
+    tile_size   cells per side of a tile
+    cache_tiles tiles kept in memory
+    """
+
+    def __init__(self, size, positions, values, resolution=1, tile_size=256, cache_tiles=64, power=2):
+        self.size = size
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.resolution = resolution
+        self.tile_size = tile_size
+        self.cache_tiles = cache_tiles
+        self.power = power
+        self.shape = (int(np.ceil(size[0] * resolution)), int(np.ceil(size[1] * resolution)))
+        self.tiles = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.set_values(values)
+
+    def set_values(self, values):
+        """New sensor values; the cached tiles are dropped."""
+        self.values = np.asarray(values, dtype=float).reshape(-1)
+        self.tiles.clear()
+
+    def nbytes(self):
+        return sum(tile.nbytes for tile in self.tiles.values())
+
+    def tile(self, ti, tj):
+        """float32 values of the cells of tile (ti, tj), computed on a miss."""
+        key = (ti, tj)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.hits += 1
+            self.tiles.move_to_end(key)
+            return tile
+        self.misses += 1
+        tile = self.compute(ti, tj)
+        self.tiles[key] = tile
+        if len(self.tiles) > self.cache_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def compute(self, ti, tj):
+        i0, j0 = ti * self.tile_size, tj * self.tile_size
+        xs = np.arange(i0, min(i0 + self.tile_size, self.shape[0])) / self.resolution
+        ys = np.arange(j0, min(j0 + self.tile_size, self.shape[1])) / self.resolution
+        # squared distances (cells, sensors) of the tile, w = 1 / distance^power
+        d2 = ((xs[:, np.newaxis, np.newaxis] - self.positions[:, 0]) ** 2 +
+              (ys[:, np.newaxis] - self.positions[:, 1]) ** 2)
+        d2 = d2.reshape(-1, len(self.positions))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weights = 1 / d2 if self.power == 2 else d2 ** (-self.power / 2)
+            tile = (weights @ self.values) / weights.sum(axis=1)
+        # a cell lying on a sensor takes the value of that sensor
+        on_sensor = np.flatnonzero(np.any(d2 == 0, axis=1))
+        tile[on_sensor] = self.values[np.argmin(d2[on_sensor], axis=1)]
+        tile = tile.reshape(len(xs), len(ys))
+        return tile.astype(np.float32)
+
+    def cells(self, values, axis):
+        # truncation as int() in the dense maps, kept inside the field for points lying on the border
+        cells = np.floor(np.asarray(values, dtype=float) * self.resolution).astype(int)
+        return np.clip(cells, 0, self.shape[axis] - 1)
+
+    def get(self, x, y):
+        i, j = self.cells(x, 0), self.cells(y, 1)
+        return self.tile(i // self.tile_size, j // self.tile_size)[i % self.tile_size, j % self.tile_size]
+
+    def get_many(self, xs, ys):
+        """Values at arrays of coordinates, every tile being looked up once."""
+        i, j = self.cells(xs, 0).reshape(-1), self.cells(ys, 1).reshape(-1)
+        result = np.empty(len(i), dtype=np.float32)
+        ti, tj = i // self.tile_size, j // self.tile_size
+        keys = ti * (self.shape[1] // self.tile_size + 1) + tj
+        order = np.argsort(keys, kind="stable")
+        _, starts = np.unique(keys[order], return_index=True)
+        for group in np.split(order, starts[1:]):
+            if len(group) == 0:
+                continue
+            k = group[0]
+            tile = self.tile(ti[k], tj[k])
+            result[group] = tile[i[group] % self.tile_size, j[group] % self.tile_size]
+        return result.reshape(np.shape(xs))
+
+    def __array__(self, dtype=None):
+        # dense copy of the whole field, e.g. for the figures; only sensible for small fields
+        dense = np.empty(self.shape, dtype=np.float32)
+        for ti in range(0, self.shape[0], self.tile_size):
+            for tj in range(0, self.shape[1], self.tile_size):
+                tile = self.tile(ti // self.tile_size, tj // self.tile_size)
+                dense[ti:ti + tile.shape[0], tj:tj + tile.shape[1]] = tile
+        return dense if dtype is None else dense.astype(dtype)
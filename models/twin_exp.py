@@ -1,11 +1,19 @@
-import os.path
-
 from .fruit import Fruit
 from .pesticide import Pesticide
+from .pesticide_field import PesticideField
 from .tree import Tree
 from .environment import Environment
 from .bug import Bug
-import pandas as pd
+from .swarm import BugSwarm
+from .neighbors import make_neighbor_index
+from .stepping import AdaptiveStepper
+from .raster import ConcentrationGrid
+from .attractors import StaticAttraction
+from .io.climate import ClimateStore
+from .ai.forecast_cache import ForecastTrajectory
+from .io.logger import logger, DEBUG
+from .profiling import PhaseProfiler, NullProfiler
+from . import kernels
 import numpy as np
 
 import warnings
@@ -13,26 +21,56 @@ warnings.filterwarnings('ignore')
 #######################################################################################################################
 # The measurements are in meters, and grams
 # everytime you invoke a map reader you will obtain the cell of the grid with indexes [int(x), int(y)]
+# (with env_params["tiles"], the cell [int(x * resolution), int(y * resolution)])
 #######################################################################################################################
 
+# sensor positions in the 100 x 100 field
+SENSORS = [[1, 3], [1, 30], [1, 60], [1, 90],
+           [30, 3], [30, 30], [30, 60], [30, 90],
+           [60, 3], [60, 30], [60, 60], [60, 90], [90, 3]]
+
+
 class Twin:
     def __init__(self, env_params, bug_params, tree_params, pesticide_params):
         # index of the date
         self.idx = env_params['starting_date']
         self.sequence_length = env_params['sequence_length']
         self.time_step = env_params['time_step']
+        # adaptive stepping: True or the parameters of AdaptiveStepper; None keeps the fixed time_step
+        self.adaptive_step = env_params.get('adaptive_step')
+        # env_params['profile'] = True adds the time spent in every phase of run() to the results
+        self.profiler = PhaseProfiler() if env_params.get('profile', False) else NullProfiler()
+        # interaction kernels of the bugs of this Twin (see models.kernels): 'numpy' (default), 'numba', 'python'
+        # or 'auto'
+        self.kernels = kernels.select(bug_params.get('kernels', 'numpy'))
         #input data for the environment
-        self.temp_csv = pd.read_csv(os.path.join("weather-forecasting", "data", "temperature_all.csv"))
-        self.hum_csv = pd.read_csv(os.path.join("weather-forecasting", "data", "humidity_all.csv"))
+        # memory-mapped binary copies of temperature_all.csv and humidity_all.csv
+        self.temp_store = ClimateStore.open("temperature")
+        self.hum_store = ClimateStore.open("humidity")
         temperatures, humidities = self.get_climate()
+        # LSTM inference backend: 'numpy' (exported weights, no TensorFlow) or 'keras'
+        backend = env_params.get('lstm_backend', 'numpy')
+        # forecasts from the same starting date are computed once and then replayed
+        forecast = None
+        if env_params.get('forecast_cache', True):
+            forecast = ForecastTrajectory.get(self.idx, self.sequence_length,
+                                              self.temp_store.key + self.hum_store.key, backend)
         # Current date and time is inside environment; for changes consider to port here such field
-        self.env = Environment((100, 100),
-                               [[1, 3], [1, 30], [1, 60], [1, 90],
-                                [30, 3], [30, 30], [30, 60], [30, 90],
-                                [60, 3], [60, 30], [60, 60], [60, 90], [90, 3]],
+        # env_params['size'] is the extent of the field (m); the 13 sensors (one per LSTM output) are spread over
+        # it as in the 100 x 100 field unless env_params['sensors'] places them
+        size = tuple(env_params.get('size', (100, 100)))
+        sensors = env_params.get('sensors', [[x * size[0] / 100, y * size[1] / 100] for x, y in SENSORS])
+        # env_params['tiles'], e.g. {'resolution': 4, 'tile_size': 256, 'cache_tiles': 64}, stores the climate
+        # maps as lazily evaluated float32 tiles for large fields and sub-metre cells (see models.tiles)
+        self.env = Environment(size,
+                               sensors,
                                temperatures,
                                humidities,
-                               env_params['wind']
+                               env_params['wind'],
+                               forecast,
+                               env_params.get('inference_broker'),
+                               backend,
+                               env_params.get('tiles')
                                )
         #env ==========================================================================
 
@@ -40,26 +78,27 @@ class Twin:
         # Pesticidi in posizione alberi
         # alternatani
         # 
-        self.n_pesticide = pesticide_params['number']
-        # quantity of 1 KG partitioned by n_pesticide
-        self.pesticides = []
-        for idx in range(len(pesticide_params['positions'])):
-            x = pesticide_params['positions'][idx][0]
-            y = pesticide_params['positions'][idx][0]
-            pest = Pesticide(idx, "Fenpropathrin", [x, y], pesticide_params['initial_radius'], pesticide_params['quantity'])
-            self.pesticides.append(pest)
+        self.set_pesticides(pesticide_params)
         #pesticide ========================================================================
 
         # bug =============================================================================
         #def __init__(self, id, lifetime, stage, position, maximum_step):
         #input bugs
         self.n_bugs = bug_params['number']
-        self.bugs = []
+        bugs = []
         for i in range(self.n_bugs):
             x = np.random.uniform(0, self.env.get_size()[0])
             y = np.random.uniform(0, self.env.get_size()[1])
             bug = Bug(i, 100, 2, [x,y], 1)
-            self.bugs.append(bug)
+            bugs.append(bug)
+        # the whole population is stored and moved as arrays
+        # bug_params['attraction'] selects the bug-to-bug index, e.g. {'mode': 'barnes_hut', 'theta': 0.5}
+        neighbors = make_neighbor_index(**bug_params.get('attraction', {'mode': 'exact'}))
+        # fruit and sensor attraction cached between changes of their inputs,
+        # bug_params['static_attraction'] = {'mode': 'grid', 'resolution': 1} for the O(1) vector field
+        self.static = StaticAttraction(**bug_params.get('static_attraction', {'mode': 'exact'}))
+        self.bugs = BugSwarm.from_bugs(bugs, neighbors, self.raster, self.static, self.kernels)
+        self.bugs.profiler = self.profiler
         # bug =============================================================================
 
         # tree ============================================================================
@@ -77,93 +116,146 @@ class Twin:
                 pears.append(pear)
             tree = Tree(i, [x, y], 1, pears)
             self.trees.append(tree)
+        self.static.update(self.trees, self.env)
         # tree ============================================================================
 
+        # progress of run(), kept on the Twin so that a run can be resumed, e.g. from a snapshot (models.snapshot)
+        self.progress = {'hours': 0, 'deads': 0, 'lefts': 0, 'steps': 0}
+        self.stepper = None
+        self.max_rad = 0
+
+    def set_pesticides(self, pesticide_params):
+        """Places the sprayers, e.g. a different layout in every branch forked from a snapshot (see models.snapshot)."""
+        self.n_pesticide = pesticide_params['number']
+        # quantity of 1 KG partitioned by n_pesticide
+        pesticides = []
+        for idx in range(len(pesticide_params['positions'])):
+            x = pesticide_params['positions'][idx][0]
+            y = pesticide_params['positions'][idx][0]
+            pest = Pesticide(idx, "Fenpropathrin", [x, y], pesticide_params['initial_radius'], pesticide_params['quantity'])
+            pesticides.append(pest)
+        # all the sprayers are stored and spread as arrays
+        self.pesticides = PesticideField.from_pesticides(pesticides)
+        # 'dense', 'sparse' (radius bounding boxes only) or 'auto', see models.exposure, or 'grid' for the
+        # concentration rasterized once per instant (pesticide_params['grid_resolution'] nodes per meter), an
+        # approximation that is only faster with thousands of bugs on small footprints (see models.raster)
+        self.exposure = pesticide_params.get('exposure', 'auto')
+        self.raster = None
+        if self.exposure == 'grid':
+            self.raster = ConcentrationGrid(self.env.get_size(), pesticide_params.get('grid_resolution', 1))
+        if hasattr(self, 'bugs'):
+            self.bugs.raster = self.raster
+
     def get_climate(self):
-        temp = []
-        hum = []
-        self.temp_csv["year"] = self.temp_csv["year"] - 2000
-        self.hum_csv["year"] = self.hum_csv["year"] - 2000
-        v_col = [f"value_{i}" for i in range(0, 13)]
-        if self.idx >= self.sequence_length:
-            # data series from temp
-            temp = self.temp_csv[v_col + ["year", "month", "day", "hour"]].values
-            temp = temp[self.idx - self.sequence_length:self.idx]
-            #data series hum
-            hum = self.hum_csv[v_col + ["year", "month", "day", "hour"]].values
-            hum = hum[self.idx - self.sequence_length:self.idx]
-        return np.array(temp), np.array(hum)
+        # zero-copy windows of the sequence_length hours before starting_date
+        temp = self.temp_store.window(self.idx, self.sequence_length)
+        hum = self.hum_store.window(self.idx, self.sequence_length)
+        return temp, hum
 
     def check_pesticide(self):
-        state = False
-        idx = 0
-        while not state and idx < self.n_pesticide:
-            state = state or (self.pesticides[idx].quantity != 0)
-            idx = idx + 1
-        return state
-
-    def run(self):
+        return self.pesticides.any_active()
+
+    def advance(self, step, reference_step=None):
+        """
+        Spreads the pesticides and applies them to the bugs, then moves the bugs, over `step` minutes.
+        reference_step is given by adaptive stepping, when step may differ from time_step.
+        Returns the number of killed and escaped bugs.
+        """
+        profiler = self.profiler
+        # every active sprayer at once, with temperature and humidity gathered at the sprayer positions
+        with profiler.phase('spread'):
+            self.pesticides.spread(self.env, step, reference_step)
+        # add here info on pesticide
+        # add here code for saving results
+        self.max_rad = self.pesticides.max_radius
+        if self.raster is not None:
+            with profiler.phase('raster'):
+                self.raster.build(self.pesticides)
+        fraction = step / self.time_step
+        # every (pesticide, bug) pair is evaluated at once
+        with profiler.phase('exposure'):
+            deads = self.bugs.expose(self.pesticides, self.exposure, fraction)
+        self.n_bugs = len(self.bugs)
+        # print(f"--- Bugs ---")
+        # all the bugs move at once, the ones outside the field are removed from the alive mask
+        with profiler.phase('movement'):
+            lefts = self.bugs.move(self.env, self.trees, self.pesticides, fraction)
+        self.n_bugs = len(self.bugs)
+        # print(f"Bugs alive: {self.n_bugs}")
+        return deads, lefts
+
+    def run(self, recorder=None, duration=None):
+        """
+        Runs until the pesticides are dissipated or no bug is left, continuing from where a previous call stopped.
+        recorder is an optional TrajectoryRecorder (models.io.recorder) receiving the state after every step.
+        duration runs that many hours at most, whether or not a sprayer is active (e.g. a warm-up before
+        the spraying); the results are those of the whole run so far.
+        """
         instants = 60 // self.time_step # tune it to have more steps
+        if self.adaptive_step and self.stepper is None:
+            self.stepper = AdaptiveStepper.from_params(self.time_step, self.adaptive_step)
+        stepper = self.stepper
 
-        hours = 0
-        deads = 0
-        lefts = 0
-        max_rad = 0
+        hours, deads, lefts, steps = (self.progress[k] for k in ('hours', 'deads', 'lefts', 'steps'))
+        first_hour, first_step = hours, steps
+        end = None if duration is None else hours + duration
+        if recorder is not None and steps == 0:
+            recorder.record(0, self.bugs, self.pesticides)
 
-        while (self.check_pesticide() and self.n_bugs > 0): #regular condition
+        while ((self.check_pesticide() if end is None else hours < end) and self.n_bugs > 0): #regular condition
         # while (self.check_pesticide()): #for pesticide evaluation
-            # timestep per bugs
-            for i in range(instants):
-                # print(f"instant: {i}")
-                print(f"Time [hh:mm]: {hours}:{i * self.time_step}")
-                # print(f"--- Pesticides ---")
-
-                for pesticide in self.pesticides:
-                    # print(pesticide.position)
-                    pesticide.spread(self.env.get_wind_direction(), self.env.get_wind_speed(),
-                                     self.env.get_temperature_at(pesticide.position[0], pesticide.position[1]),
-                                     self.env.get_humidity_at(pesticide.position[0], pesticide.position[1]),
-                                     self.time_step
-                                     )
-                    # add here info on pesticide
-                    # add here code for saving results
-                    max_rad = max(max_rad, pesticide.radius)
-                    # print(f"pesticide {pesticide.id} -> position: {pesticide.position}, quantity: {pesticide.quantity} g, rad: {pesticide.radius}")
-                    bug2delete = []
-                    for idx in range(len(self.bugs)):
-                        if pesticide.affects_bug(self.bugs[idx]):
-                            bug2delete.append(idx)
-                            deads = deads + 1
-                            # print(f"HH {idx} is dead. We are safer.")
-                    self.bugs = [i for j, i in enumerate(self.bugs) if j not in bug2delete]
-                    self.n_bugs = len(self.bugs)
-                bug2delete = []
-                # print(f"--- Bugs ---")
-                for idx in range(len(self.bugs)):
-                    self.bugs[idx].move(self.env, self.trees, self.bugs, self.pesticides)
-                    # add here info on bugs
-                    # add here code for saving results
-                    # print(f"bug {self.bugs[idx].id}-> position {self.bugs[idx].position}")
-                    if self.bugs[idx].position[0] > self.env.size[0] or self.bugs[idx].position[0] < 0 or self.bugs[idx].position[1] > self.env.size[1] or self.bugs[idx].position[1] < 0:
-                        bug2delete.append(idx)
-                        lefts = lefts + 1
-                        # print(f"HH {idx} outside the field. We are safer.")
-                self.bugs = [i for j, i in enumerate(self.bugs) if j not in bug2delete]
-                self.n_bugs = len(self.bugs)
-                # print(f"Bugs alive: {self.n_bugs}")
+            if stepper is None:
+                # timestep per bugs
+                for i in range(instants):
+                    # print(f"instant: {i}")
+                    if logger.level <= DEBUG:
+                        logger.debug('instant', hours=hours, minutes=i * self.time_step, bugs=self.n_bugs)
+                    # print(f"--- Pesticides ---")
+                    killed, escaped = self.advance(self.time_step)
+                    deads, lefts, steps = deads + killed, lefts + escaped, steps + 1
+                    if recorder is not None:
+                        with self.profiler.phase('recording'):
+                            recorder.record(hours * 60 + (i + 1) * self.time_step, self.bugs, self.pesticides)
+            else:
+                # steps of variable length, up to the hourly update of the environment
+                minutes = 0
+                while minutes < 60:
+                    if logger.level <= DEBUG:
+                        logger.debug('instant', hours=hours, minutes=minutes, bugs=self.n_bugs)
+                    step = stepper.next_step(60 - minutes)
+                    # spread() replaces the arrays, these keep the state before the step
+                    radii, quantities = self.pesticides.radius, self.pesticides.quantity
+                    killed, escaped = self.advance(step, self.time_step)
+                    deads, lefts, steps = deads + killed, lefts + escaped, steps + 1
+                    stepper.observe(step, radii, self.pesticides.radius, quantities, self.pesticides.quantity,
+                                    self.bugs.expected_deaths)
+                    minutes += step
+                    if recorder is not None:
+                        with self.profiler.phase('recording'):
+                            recorder.record(hours * 60 + minutes, self.bugs, self.pesticides)
             # one hour is passed-> update environment
             # print(f"hour done.")
-            self.env.update_conditions()
+            with self.profiler.phase('update_conditions'):
+                self.env.update_conditions()
+            # rebuilt only if the sensor temperatures or the fruits changed
+            with self.profiler.phase('static_attraction'):
+                self.static.update(self.trees, self.env)
             # print("--- Environment ---")
             # self.env.get_info()
             # self.env.save_all_heatmaps()
             hours += 1
 
+        self.progress = {'hours': hours, 'deads': deads, 'lefts': lefts, 'steps': steps}
         results = {
             'bugs_survived': self.n_bugs,
             'bugs_escaped': lefts,
             'bug_deads': deads,
             'pesticide_decay': hours,
-            'pesticide_radius': max_rad
+            'pesticide_radius': self.max_rad,
+            'steps': steps
         }
-        return results
\ No newline at end of file
+        if self.profiler.enabled:
+            self.profiler.count('steps', steps - first_step)
+            self.profiler.count('hours', hours - first_hour)
+            results['profile'] = self.profiler.report()
+        return results
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# the repository is not installed: models is imported from the working tree, which is also the folder its data
+# (weather-forecasting/data, models/ai, cache) is read from
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from models.environment import Environment
+from models.io.climate import ClimateStore
+from models.twin_exp import SENSORS
+
+
+@pytest.fixture(scope="session")
+def make_environment():
+    """Environment factory of Twin (NumPy LSTM, default starting date) over a field of the given size."""
+
+    def make(size=(100, 100), wind=None, tiles=None):
+        sensors = [[x * size[0] / 100, y * size[1] / 100] for x, y in SENSORS]
+        temperatures = ClimateStore.open("temperature").window(25, 24)
+        humidities = ClimateStore.open("humidity").window(25, 24)
+        return Environment(size, sensors, temperatures, humidities, wind or {'direction': [1, 0], 'speed': 5},
+                           None, None, "numpy", tiles)
+
+    return make
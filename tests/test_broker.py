@@ -0,0 +1,63 @@
+import os
+import threading
+
+import numpy as np
+
+from models.ai.broker import InferenceBroker
+
+
+class CountingModel:
+    """A model.predict stand-in recording its calls; the output of a sample only depends on that sample."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, x, verbose=0, batch_size=None):
+        self.calls.append(len(x))
+        return x.sum(axis=(1, 2))[:, np.newaxis] * 2
+
+
+def concurrent_predict(broker, inputs):
+    outputs = [None] * len(inputs)
+    barrier = threading.Barrier(len(inputs))
+
+    def call(idx):
+        barrier.wait()
+        outputs[idx] = broker.predict(inputs[idx], verbose=0)
+
+    threads = [threading.Thread(target=call, args=(idx,)) for idx in range(len(inputs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outputs
+
+
+def test_concurrent_predictions_go_through_one_forward_pass():
+    model = CountingModel()
+    # the batch is sent when full, the timeout is only a bound
+    broker = InferenceBroker(model, max_batch=8, timeout=5)
+    rng = np.random.RandomState(0)
+    inputs = [rng.uniform(size=(2, 24, 5)) for _ in range(4)]
+    outputs = concurrent_predict(broker, inputs)
+    broker.close()
+    assert model.calls == [8]
+    assert broker.stats()['histogram'] == {8: 1}
+    for x, y in zip(inputs, outputs):
+        np.testing.assert_array_equal(y, CountingModel().predict(x))
+
+
+def test_forked_child_gets_its_own_worker():
+    model = CountingModel()
+    broker = InferenceBroker.for_model(model, max_batch=1, timeout=0)
+    x = np.ones((1, 24, 5))
+    broker.predict(x)
+    pid = os.fork()
+    if pid == 0:
+        # the worker thread of the parent does not exist in the child: without the fork hook this waits forever
+        done = threading.Event()
+        threading.Thread(target=lambda: (broker.predict(x), done.set()), daemon=True).start()
+        os._exit(0 if done.wait(5) else 1)
+    _, status = os.waitpid(pid, 0)
+    broker.close()
+    assert os.waitstatus_to_exitcode(status) == 0
@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+import pytest
+
+from models.domains import Partition, Subdomain
+from models.experiment import make_orchard_grid, make_pesticide_parameters, run_replicate
+from models.twin_exp import Twin
+
+#######################################################################################################################
+# DomainTwin against the single-process Twin. The workers draw from their own random streams, so the replicates
+# are compared on their statistics over seeds (the wind of a seed is the same in both runs).
+#######################################################################################################################
+
+GRID = make_orchard_grid(4, 5)
+TREES = {'number': 1, 'max_pears': 10, 'positions': GRID}
+SPRAYERS = make_pesticide_parameters(0, 1800, 4, 5, GRID)
+ENVIRONMENT = {'forecast_cache': False}
+SEEDS = range(10)
+
+
+def test_domains_match_single_process_statistics():
+    single = [run_replicate(seed, {'number': 150}, TREES, SPRAYERS, dict(ENVIRONMENT)) for seed in SEEDS]
+    split = [run_replicate(seed, {'number': 150}, TREES, SPRAYERS, dict(ENVIRONMENT, domains={'shape': (2, 1)}))
+             for seed in SEEDS]
+    for a, b in zip(single, split):
+        assert a['dead'] + a['alive'] + a['left'] == b['dead'] + b['alive'] + b['left'] == 150
+    for metric in ('dead', 'left', 'alive'):
+        a = np.array([r[metric] for r in single], dtype=float)
+        b = np.array([r[metric] for r in split], dtype=float)
+        # paired by seed (same wind): the mean difference within 4 standard errors
+        difference = b - a
+        error = difference.std(ddof=1) / np.sqrt(len(difference))
+        assert abs(difference.mean()) <= 4 * error + 1, (metric, a.mean(), b.mean(), error)
+
+
+@pytest.mark.parametrize("shape", [(2, 1), (2, 2)])
+def test_bugs_are_conserved_across_migrations(shape):
+    np.random.seed(3)
+    random.seed(3)
+    environment = {'starting_date': 25, 'sequence_length': 24, 'time_step': 10, 'forecast_cache': False,
+                   'wind': {'direction': [1, 0], 'speed': 4}}
+    twin = Twin(environment, {'number': 200}, TREES, SPRAYERS)
+    partition = Partition(twin.env.get_size(), shape)
+    domains = [Subdomain(twin, partition, k, halo=10, cell_size=5) for k in range(len(partition))]
+    initial = set(twin.bugs.ids[twin.bugs.active()].tolist())
+    assert sorted(i for domain in domains for i in domain.bugs.ids.tolist()) == sorted(initial)
+
+    migrants = [[] for _ in domains]
+    deads, lefts, migrations = 0, 0, 0
+    alive = initial
+    for _ in range(12):
+        spread = [domain.spread(twin.time_step, migrants[k]) for k, domain in enumerate(domains)]
+        sprayers = tuple(np.concatenate([arrays[i] for arrays, _, _ in spread]) for i in range(5))
+        exposed = [domain.expose(sprayers, 1) for domain in domains]
+        moved = [domain.move([summary for _, summary in exposed], 1) for domain in domains]
+        migrants = [[] for _ in domains]
+        for _, outgoing, _ in moved:
+            for k, bugs in outgoing.items():
+                migrants[k].append(bugs)
+                migrations += len(bugs)
+        deads += sum(d for d, _ in exposed)
+        lefts += sum(left for left, _, _ in moved)
+
+        # every bug is in exactly one domain or in flight to exactly one, and none comes back
+        ids = [i for domain in domains for i in domain.bugs.ids.tolist()]
+        ids += [i for incoming in migrants for bugs in incoming for i in bugs.ids.tolist()]
+        assert len(ids) == len(set(ids))
+        assert set(ids) <= alive
+        alive = set(ids)
+        assert len(alive) + deads + lefts == len(initial)
+    assert migrations > 0 and deads > 0
@@ -0,0 +1,54 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from models.ai import forecast_cache
+from models.ai.forecast_cache import ForecastTrajectory, loaded_artifacts
+from models.ai.registry import AI_FOLDER, ArtifactRegistry
+
+FILES = ("lstm_temperature_model", "lstm_humidity_model", "scaler_temperature", "scaler_humidity")
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """A registry over a copy of the trained artifacts and of their NumPy exports."""
+    for name in FILES:
+        for extension in ((".keras", ".npz") if name.startswith("lstm") else (".save", ".npz")):
+            shutil.copy2(os.path.join(AI_FOLDER, name + extension), tmp_path)
+    registry = ArtifactRegistry(str(tmp_path))
+    monkeypatch.setattr(forecast_cache, 'registry', registry)
+    return registry
+
+
+def key(backend="numpy"):
+    return ForecastTrajectory.get(25, 24, "data", backend).key
+
+
+def test_numpy_key_covers_the_files_loaded(registry):
+    assert loaded_artifacts("numpy") == ("lstm_temperature_model.npz", "lstm_humidity_model.npz",
+                                         "scaler_temperature.npz", "scaler_humidity.npz")
+    assert {os.path.basename(path) for path in registry.entries} == set(loaded_artifacts("numpy"))
+
+
+@pytest.mark.parametrize("name", ["scaler_temperature.npz", "lstm_humidity_model.npz"])
+def test_replaced_numpy_artifacts_change_the_key(registry, name):
+    before = key()
+    path = os.path.join(registry.folder, name)
+    stat = os.stat(path)
+    # the same content rewritten: same key
+    shutil.copyfile(path, path + ".copy")
+    os.replace(path + ".copy", path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert key() == before
+
+    # other weights exported under the same name (a copy of the other model or scaler)
+    other = name.replace("temperature", "TMP").replace("humidity", "temperature").replace("TMP", "humidity")
+    with np.load(os.path.join(registry.folder, other)) as data:
+        arrays = dict(data)
+    with np.load(path) as data:
+        arrays["source_sha256"] = data["source_sha256"]  # still an export of its own source file
+    np.savez(path, **arrays)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+    assert key() != before
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from models import kernels
+from models.exposure import sample_deaths
+from models.fruit import Fruit
+from models.neighbors import AllPairs, attraction
+from models.pesticide_field import PesticideField
+from models.swarm import BugSwarm
+from models.tree import Tree
+
+#######################################################################################################################
+# The kernels of models.kernels against the NumPy paths they replace, on the same random stream: the outcomes are
+# the same and the sums only differ by their rounding.
+#######################################################################################################################
+
+
+def backends():
+    yield 'python'
+    yield pytest.param('numba', marks=pytest.mark.skipif(not kernels.available(), reason="Numba is not installed"))
+
+
+def scene(n_bugs=300, n_sprayers=12):
+    rng = np.random.RandomState(4)
+    points = rng.uniform(0, 100, (n_bugs, 2))
+    positions = rng.uniform(0, 100, (n_sprayers, 2))
+    radii = rng.uniform(5, 30, n_sprayers)
+    quantities = rng.uniform(50, 200, n_sprayers)
+    quantities[0] = 0
+    return points, positions, radii, quantities
+
+
+@pytest.mark.parametrize("backend", backends())
+def test_attraction_matches_numpy(backend):
+    points, positions, _, quantities = scene()
+    # a source on a point adds a null vector in both paths
+    sources = np.vstack([positions, points[:3]])
+    weights = np.concatenate([quantities, np.ones(3)])
+    expected = attraction(points, sources, weights)
+    result = attraction(points, sources, weights, compiled=kernels.select(backend))
+    np.testing.assert_allclose(result, expected, rtol=1e-10, atol=1e-12)
+
+
+@pytest.mark.parametrize("backend", backends())
+@pytest.mark.parametrize("fraction", [1, 0.5])
+def test_dense_deaths_match_numpy(backend, fraction):
+    points, positions, radii, quantities = scene()
+    mortality = np.full(len(radii), 0.8)
+    np.random.seed(1)
+    killed, expected = sample_deaths(positions, radii, quantities, mortality, points, 'dense', fraction, True)
+    np.random.seed(1)
+    result = sample_deaths(positions, radii, quantities, mortality, points, 'dense', fraction, True,
+                           compiled=kernels.select(backend))
+    assert killed.any() and not killed.all()
+    np.testing.assert_array_equal(result[0], killed)
+    assert result[1] == pytest.approx(expected, rel=1e-10)
+
+
+@pytest.mark.parametrize("backend", backends())
+def test_move_matches_numpy(backend, make_environment):
+    environment = make_environment()
+    points, positions, radii, quantities = scene()
+    trees = [Tree(i, position, 1, [Fruit(0, 1, 0.5, 5), Fruit(1, 1, 0.8, 5)])
+             for i, position in enumerate([[30, 30], [70, 60]])]
+    pesticides = PesticideField(np.arange(len(radii)), positions, radii, quantities)
+
+    def moved(compiled):
+        swarm = BugSwarm(np.arange(len(points)), points, 2, neighbors=AllPairs(), kernels=compiled)
+        np.random.seed(2)
+        swarm.move(environment, trees, pesticides)
+        return swarm.positions
+
+    expected = moved(None)
+    assert 0 < np.sum(np.any(expected != points, axis=1)) < len(points)
+    np.testing.assert_allclose(moved(kernels.select(backend)), expected, rtol=1e-10, atol=1e-9)
+
+
+def test_python_kernels_keep_range():
+    assert kernels.prange is range
+    assert kernels.select('numpy') is None
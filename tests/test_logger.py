@@ -0,0 +1,55 @@
+import glob
+import json
+import os
+
+import pytest
+
+from models import runner
+from models.io.logger import DEBUG, DISABLED, EventLogger, logger
+from models.runner import ReplicateRunner
+
+
+@pytest.fixture
+def shared_logger():
+    yield logger
+    logger.close()
+    logger.level = DISABLED
+    logger.path = None
+    logger.logs.clear()
+
+
+def test_ring_buffer_drops_the_oldest_events():
+    events = EventLogger(capacity=3)
+    events.info('ignored')  # disabled until configured
+    assert len(events.logs) == 0
+    events.level = DEBUG
+    for i in range(5):
+        events.debug('step', i=i)
+    assert [fields['i'] for _, _, _, fields in events.logs] == [2, 3, 4]
+    assert events.dropped == 2
+
+
+def fake_replicate(seed, bugs_parameters, tree_parameters, pesticide_parameters, environment_parameters=None):
+    logger.info('replicate', seed=seed, pid=os.getpid())
+    return {'seed': seed, 'radius': 0, 'hours': 0, 'time': 0, 'dead': 0, 'alive': 0, 'left': 0, 'steps': 0}
+
+
+def test_pool_workers_write_their_events(tmp_path, monkeypatch, shared_logger):
+    # the workers are forked with the configured logger and the fake replicate
+    monkeypatch.setattr(runner, 'run_replicate', fake_replicate)
+    shared_logger.configure('INFO', path=str(tmp_path / 'events_{pid}.jsonl'))
+    shared_logger.info('parent', pid=os.getpid())
+    config = {'bugs_parameters': {}, 'tree_parameters': {}, 'pesticide_parameters': {}}
+    list(ReplicateRunner(2).run([config], seeds=range(6)))
+    shared_logger.close()
+
+    events = []
+    for path in glob.glob(str(tmp_path / 'events_*.jsonl')):
+        with open(path) as file:
+            events += [dict(json.loads(line), file=path) for line in file]
+    # the workers leave through os._exit: their events are there because every task flushes them
+    replicates = [e for e in events if e['event'] == 'replicate']
+    assert sorted(e['seed'] for e in replicates) == list(range(6))
+    assert all(e['pid'] != os.getpid() and e['file'].endswith(f"events_{e['pid']}.jsonl") for e in replicates)
+    # the children dropped the buffered events of the parent instead of writing them again
+    assert [e['pid'] for e in events if e['event'] == 'parent'] == [os.getpid()]
@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+import pytest
+
+from models import runner
+from models.experiment import generate_wind_conditions
+from models.montecarlo import SequentialRunner, interval, samples
+
+#######################################################################################################################
+# SequentialRunner with a deterministic replicate in place of run_replicate: the dead count of a seed is the mean
+# of its config plus a noise of the seed, and the antithetic replicate of the seed draws the opposite noise.
+#######################################################################################################################
+
+NOISE = {seed: 10 * np.sin(seed + 1) for seed in range(40)}
+
+
+def fake_replicate(seed, bugs_parameters, tree_parameters, pesticide_parameters, environment_parameters=None):
+    antithetic = (environment_parameters or {}).get('antithetic', False)
+    noise = NOISE[seed] * bugs_parameters['scale'] * (-1 if antithetic else 1)
+    replicate = {'seed': seed, 'radius': 0, 'hours': 0, 'time': 0, 'dead': 50 + noise, 'alive': 0,
+                 'left': 50 - noise, 'steps': 0}
+    if antithetic:
+        replicate['antithetic'] = True
+    return replicate
+
+
+@pytest.fixture(autouse=True)
+def deterministic(monkeypatch):
+    monkeypatch.setattr(runner, 'run_replicate', fake_replicate)
+
+
+def config(scale):
+    return {'bugs_parameters': {'scale': scale}, 'tree_parameters': {}, 'pesticide_parameters': {}}
+
+
+def test_stops_at_the_first_round_within_tolerance():
+    seeds = list(range(40))
+    sequential = SequentialRunner(tolerance={'dead': 8}, min_seeds=4, batch=2)
+    results = {idx: (replicates, stats) for idx, replicates, stats in
+               sequential.run([config(1), config(0.1)], seeds)}
+
+    for idx, scale in ((0, 1), (1, 0.1)):
+        replicates, stats = results[idx]
+        used = stats['seeds']
+        assert [r['seed'] for r in replicates] == seeds[:used]
+        # converged at this round, not at the previous one (4 seeds, then 2 more at a time)
+        assert interval([50 + NOISE[s] * scale for s in seeds[:used]])[1] <= 8
+        if used > 4:
+            assert interval([50 + NOISE[s] * scale for s in seeds[:used - 2]])[1] > 8
+        assert stats['dead_ci'] == pytest.approx(interval([r['dead'] for r in replicates])[1])
+    assert results[1][1]['seeds'] == 4 < results[0][1]['seeds']
+
+
+def test_runs_all_the_seeds_without_convergence():
+    _, replicates, stats = next(SequentialRunner(tolerance={'dead': 0}).run([config(1)], range(7)))
+    assert stats['seeds'] == 7 and len(replicates) == 7
+
+
+def test_antithetic_pairs_are_one_sample():
+    calls = []
+    sequential = SequentialRunner(tolerance={'dead': 1e-9}, min_seeds=4, antithetic=True)
+    _, replicates, stats = next(sequential.run([config(1)], range(20), lambda idx, r: calls.append(r)))
+    # every seed runs twice, with and without the antithetic wind; the pair averages the noise away
+    assert stats['seeds'] == 4 and len(replicates) == len(calls) == 8
+    assert [(r['seed'], 'antithetic' in r) for r in replicates] == [(s, a) for s in range(4) for a in (False, True)]
+    assert samples(replicates, 'dead') == {seed: pytest.approx(50) for seed in range(4)}
+    assert stats['dead_ci'] == pytest.approx(0, abs=1e-9)
+
+
+def test_antithetic_wind_at_the_edge_of_the_draws(monkeypatch):
+    monkeypatch.setattr(random, 'random', lambda: 0.0)
+    direction, speed = generate_wind_conditions(antithetic=True)
+    assert np.isfinite(speed) and speed > 0
+    assert direction == pytest.approx([-1, 0], abs=1e-12)
+    assert generate_wind_conditions()[1] == 0
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+
+from models.ai.numpy_lstm import NumpyLSTMModel, export_weights
+from models.ai.numpy_scaler import NumpyMinMaxScaler, export_scaler
+from models.ai.registry import AI_FOLDER
+from models.io.climate import ClimateStore
+
+# the forecasting models and their scalers, as loaded by Environment
+MODELS = [("temperature", "lstm_temperature_model", "scaler_temperature"),
+          ("humidity", "lstm_humidity_model", "scaler_humidity")]
+
+
+def climate_windows(name, scaler, batch=8, length=24, first=25):
+    """Normalized climate windows as Environment feeds them to the models."""
+    store = ClimateStore.open(name)
+    windows = []
+    for end in range(first, first + batch):
+        window = np.array(store.window(end, length))
+        window[:, :-4] = scaler.transform(window[:, :-4])
+        windows.append(window)
+    return np.stack(windows)
+
+
+def keras_model(keras, keras_path, layers):
+    """
+    The saved model, or the same network rebuilt in Keras with the exported weights when this version of Keras
+    cannot read the archive (saved by another major version).
+    """
+    try:
+        return keras.saving.load_model(keras_path)
+    except Exception:
+        pass
+    model = keras.Sequential()
+    for layer in layers:
+        if layer["type"] == "lstm":
+            model.add(keras.layers.LSTM(layer["recurrent_kernel"].shape[0],
+                                        return_sequences=layer["return_sequences"]))
+        else:
+            model.add(keras.layers.Dense(layer["kernel"].shape[1], activation=layer["activation"]))
+    model.build((None, None, layers[0]["kernel"].shape[0]))
+    model.set_weights([layer[name] for layer in layers for name in ("kernel", "recurrent_kernel", "bias")
+                       if name in layer])
+    return model
+
+
+@pytest.mark.parametrize("name, model, scaler", MODELS)
+def test_numpy_lstm_matches_keras(tmp_path, name, model, scaler):
+    keras = pytest.importorskip("keras")
+    keras_path = os.path.join(AI_FOLDER, model + ".keras")
+    reference = keras_model(keras, keras_path, NumpyLSTMModel.load(os.path.join(AI_FOLDER, model + ".npz")).layers)
+    x = climate_windows(name, NumpyMinMaxScaler.load(os.path.join(AI_FOLDER, scaler + ".npz")))
+    expected = reference.predict(x, verbose=0)
+
+    # weights exported now and the .npz shipped next to the .keras model
+    for npz_path in (export_weights(keras_path, str(tmp_path / (model + ".npz"))),
+                     os.path.join(AI_FOLDER, model + ".npz")):
+        y = NumpyLSTMModel.load(npz_path).predict(x)
+        assert y.shape == expected.shape
+        assert np.max(np.abs(y - expected)) < 1e-5
+
+
+@pytest.mark.parametrize("name, model, scaler", MODELS)
+def test_numpy_scaler_matches_joblib(tmp_path, name, model, scaler):
+    joblib = pytest.importorskip("joblib")
+    joblib_path = os.path.join(AI_FOLDER, scaler + ".save")
+    reference = joblib.load(joblib_path)
+    exported = NumpyMinMaxScaler.load(export_scaler(joblib_path, str(tmp_path / (scaler + ".npz"))))
+    values = np.array(ClimateStore.open(name).window(48, 48))[:, :-4]
+    np.testing.assert_allclose(exported.transform(values), reference.transform(values), rtol=1e-12, atol=1e-12)
+    y = reference.transform(values)
+    np.testing.assert_allclose(exported.inverse_transform(y), reference.inverse_transform(y), rtol=1e-12, atol=1e-9)
+
+
+@pytest.mark.parametrize("lstm, dense", [({"activation": "relu"}, {}), ({"recurrent_activation": "hard_sigmoid"}, {}),
+                                         ({}, {"activation": "softmax"})])
+def test_export_rejects_unsupported_activations(tmp_path, lstm, dense):
+    keras = pytest.importorskip("keras")
+    model = keras.Sequential([keras.layers.LSTM(4, **lstm), keras.layers.Dense(2, **dense)])
+    model.build((None, 3, 5))
+    keras_path = str(tmp_path / "model.keras")
+    model.save(keras_path)
+    with pytest.raises(ValueError, match="Unsupported"):
+        export_weights(keras_path, str(tmp_path / "model.npz"))
+    assert not os.path.exists(tmp_path / "model.npz")
+
+    # the same network with the activations the NumPy backend implements is exported
+    model = keras.Sequential([keras.layers.LSTM(4), keras.layers.Dense(2)])
+    model.build((None, 3, 5))
+    model.save(keras_path)
+    assert os.path.exists(export_weights(keras_path, str(tmp_path / "model.npz")))
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from models.exposure import concentration_matrix
+from models.neighbors import attraction
+from models.pesticide_field import PesticideField
+from models.raster import ConcentrationGrid
+
+#######################################################################################################################
+# ConcentrationGrid against the exact dense exposure: exact on the nodes, bounded errors between them.
+#######################################################################################################################
+
+SIZE = (60, 40)
+
+
+def make_field(radius):
+    rng = np.random.RandomState(0)
+    n = 15
+    positions = rng.uniform(0, 60, (n, 2)) * [1, 40 / 60]
+    positions[0] = [-2, 41]  # a sprayer outside the field still reaches it
+    quantities = rng.uniform(20, 120, n)
+    quantities[1] = 0
+    return PesticideField(np.arange(n), positions, np.full(n, radius), quantities, mortality_probability=0.8)
+
+
+def exact_rates(field, points):
+    positions, radii, quantities, mortality = field.arrays(('position', 'radius', 'quantity', 'mortality_probability'))
+    return np.minimum(concentration_matrix(positions, radii, quantities, points) * mortality[:, np.newaxis], 1)
+
+
+@pytest.mark.parametrize("radius", [3, 12, 200])
+@pytest.mark.parametrize("resolution", [1, 2])
+def test_nodes_match_the_dense_exposure(radius, resolution):
+    field = make_field(radius)
+    grid = ConcentrationGrid(SIZE, resolution)
+    grid.build(field)
+    rates = exact_rates(field, grid.nodes())
+    shape = (len(grid.xs), len(grid.ys))
+    np.testing.assert_allclose(grid.rate, rates.sum(axis=0).reshape(shape), rtol=1e-12, atol=1e-15)
+    probability = 1 - np.prod(1 - rates, axis=0).reshape(shape)
+    np.testing.assert_allclose(1 - grid.survival, probability, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("radius", [3, 12, 200])
+def test_errors_between_the_nodes_are_bounded(radius):
+    field = make_field(radius)
+    grid = ConcentrationGrid(SIZE)
+    grid.build(field)
+    points = np.random.RandomState(1).uniform(0, 1, (4000, 2)) * SIZE
+    rates = exact_rates(field, points)
+    # bilinear lookups: the expected deaths within 3% over the field, the kill probabilities unbiased; a single
+    # bug is within 0.05 of its probability unless it is at the edge of a footprint a few cells wide
+    expected = rates.sum()
+    assert abs(grid.rates(points).sum() - expected) <= 0.03 * expected
+    probability = 1 - np.prod(1 - rates, axis=0)
+    lookup = 1 - grid.lookup(grid.survival, points)
+    assert abs(lookup.mean() - probability.mean()) < 0.002
+    assert np.mean(np.abs(lookup - probability)) < 0.025
+    if radius > 3:
+        assert np.max(np.abs(lookup - probability)) < 0.05
+
+    # repulsion: within 5% (median) of the exact sum away from the sprayers
+    positions, quantities = field.arrays(('position', 'quantity'))
+    far = np.min(np.linalg.norm(points[:, np.newaxis] - positions[np.newaxis], axis=2), axis=1) > 2
+    exact = attraction(points[far], positions, quantities)
+    error = np.linalg.norm(grid.repulsion(points[far]) - exact, axis=1) / np.linalg.norm(exact, axis=1)
+    assert np.median(error) < 0.05
+
+
+def test_kills_match_the_dense_exposure():
+    field = make_field(12)
+    grid = ConcentrationGrid(SIZE)
+    grid.build(field)
+    points = np.random.RandomState(2).uniform(0, 1, (3000, 2)) * SIZE
+    probability = 1 - np.prod(1 - exact_rates(field, points), axis=0)
+    np.random.seed(3)
+    kills = np.mean([np.count_nonzero(grid.sample_deaths(points)[0]) for _ in range(20)])
+    # 20 draws of 3000 bugs: the mean count within 4 standard errors plus the interpolation error
+    error = np.sqrt(np.sum(probability * (1 - probability)) / 20)
+    assert abs(kills - probability.sum()) <= 4 * error + 0.01 * probability.sum()
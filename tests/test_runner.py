@@ -0,0 +1,44 @@
+from models.experiment import make_orchard_grid, make_pesticide_parameters
+from models.runner import ReplicateRunner, warm_up
+
+GRID = make_orchard_grid(4, 5)
+
+
+def make_configs():
+    trees = {'number': 1, 'max_pears': 10, 'positions': GRID}
+    environment = {'forecast_cache': False}
+    return [{'bugs_parameters': {'number': n}, 'tree_parameters': trees,
+             'pesticide_parameters': make_pesticide_parameters(layout, 1800, 4, 5, GRID),
+             'environment_parameters': environment}
+            for n, layout in ((20, 0), (40, 2))]
+
+
+def results(workers):
+    out = {}
+    for idx, replicates, stats in ReplicateRunner(workers).run(make_configs(), seeds=(0, 1, 2)):
+        out[idx] = [{k: v for k, v in r.items() if k != 'time'} for r in replicates]
+    return out
+
+
+def test_pool_gives_the_serial_results():
+    serial = results(1)
+    assert sorted(serial) == [0, 1] and all(len(replicates) == 3 for replicates in serial.values())
+    assert results(2) == serial
+
+
+def test_backends_of_the_configs():
+    configs = make_configs()
+    assert ReplicateRunner.backends(configs) == ('numpy',)
+    configs[1]['environment_parameters'] = {'lstm_backend': 'keras'}
+    assert ReplicateRunner.backends(configs) == ('keras', 'numpy')
+
+
+def test_warm_up_failures_are_not_fatal(monkeypatch):
+    from models.ai.registry import registry
+
+    def missing(name, backend):
+        raise FileNotFoundError(name)
+
+    # e.g. the exported weights are missing: the warm-up gives up, the replicates load lazily
+    monkeypatch.setattr(registry, 'load_model', missing)
+    warm_up(('numpy',))
@@ -0,0 +1,63 @@
+import pickle
+import random
+
+import numpy as np
+import pytest
+
+from models.experiment import make_orchard_grid, make_pesticide_parameters
+from models.snapshot import TwinSnapshot, reachable
+from models.twin_exp import Twin
+
+GRID = make_orchard_grid(4, 5)
+
+
+def make_twin(seed=0, bugs=60):
+    np.random.seed(seed)
+    random.seed(seed)
+    environment = {'starting_date': 25, 'sequence_length': 24, 'time_step': 10, 'forecast_cache': False,
+                   'wind': {'direction': [1, 0], 'speed': 4}}
+    return Twin(environment, {'number': bugs}, {'number': 1, 'max_pears': 10, 'positions': GRID},
+                make_pesticide_parameters(0, 1800, 4, 5, GRID))
+
+
+@pytest.fixture(scope="module")
+def uninterrupted():
+    return make_twin().run()
+
+
+def test_duration_then_resume_matches_one_run(uninterrupted):
+    twin = make_twin()
+    twin.run(duration=2)
+    assert twin.run() == uninterrupted
+
+
+def test_live_restored_and_loaded_runs_match(tmp_path, uninterrupted):
+    twin = make_twin()
+    twin.run(duration=2)
+    snapshot = TwinSnapshot.capture(twin)
+    # the captured Twin keeps its arrays writable, the snapshot has its own frozen copies
+    arrays = [obj for obj in reachable(twin).values() if isinstance(obj, np.ndarray)]
+    assert arrays and all(array.flags.writeable for array in arrays)
+    assert not any(obj.flags.writeable for obj in reachable(snapshot.twin).values() if isinstance(obj, np.ndarray))
+
+    live = twin.run()
+    assert live == uninterrupted
+    assert snapshot.restore().run() == live
+    assert snapshot.restore().run() == live
+
+    path = str(tmp_path / 'snapshot.pkl')
+    snapshot.save(path)
+    assert TwinSnapshot.load(path).restore().run() == live
+    assert pickle.loads(pickle.dumps(snapshot)).restore().run() == live
+
+
+def test_branches_share_the_random_draws():
+    twin = make_twin()
+    twin.set_pesticides({'number': 0, 'positions': [], 'initial_radius': 1, 'quantity': 0})
+    twin.run(duration=1)
+    snapshot = TwinSnapshot.capture(twin)
+    results = []
+    for branch in snapshot.branches(2):
+        branch.set_pesticides(make_pesticide_parameters(1, 1800, 4, 5, GRID))
+        results.append(branch.run())
+    assert results[0] == results[1] and results[0]['bug_deads'] > 0
@@ -0,0 +1,67 @@
+import random
+
+import numpy as np
+import pytest
+
+from models.experiment import make_orchard_grid, make_pesticide_parameters
+from models.stepping import AdaptiveStepper
+from models.twin_exp import Twin
+
+GRID = make_orchard_grid(4, 5)
+
+
+def observe(stepper, step, growth=0.0, decay=0.0, deaths=0.0, radii=(1.0, 5.0)):
+    radii = np.array(radii)
+    quantities = np.full(len(radii), 100.0)
+    stepper.observe(step, radii, radii * (1 + growth), quantities, quantities * (1 - decay), deaths)
+    return stepper.step
+
+
+def test_steps_stay_within_bounds():
+    stepper = AdaptiveStepper(10, min_step=2, max_step=30)
+    rng = np.random.RandomState(0)
+    step = 10
+    for _ in range(200):
+        previous = step
+        step = observe(stepper, step, growth=rng.exponential(0.2), decay=rng.uniform(0, 0.5),
+                       deaths=rng.exponential(2) * rng.randint(2))
+        assert 2 <= step <= 30 and step <= 2 * previous and step == int(step)
+    # fast changes hold the step at its lower bound
+    assert observe(stepper, step, growth=50, deaths=1e6) == 2
+
+
+def test_flat_rates_grow_the_step_to_its_bound():
+    stepper = AdaptiveStepper(10, max_step=60)
+    assert [observe(stepper, step) for step in (10, 20, 40, 60)] == [20, 40, 60, 60]
+
+
+def test_sprayer_of_radius_zero():
+    stepper = AdaptiveStepper(10)
+    with np.errstate(all='raise'):
+        step = observe(stepper, 10, growth=0.01, radii=(0.0, 5.0))
+    assert step == 20
+    # the growth of the sprayers of positive radius still limits the step
+    assert observe(AdaptiveStepper(10), 10, growth=0.2, radii=(0.0, 5.0)) == 12  # floor(0.25 / 0.02)
+
+
+def run(adaptive):
+    np.random.seed(0)
+    random.seed(0)
+    environment = {'starting_date': 25, 'sequence_length': 24, 'time_step': 10, 'forecast_cache': False,
+                   'wind': {'direction': [1, 0], 'speed': 4}, 'adaptive_step': adaptive}
+    return Twin(environment, {'number': 80}, {'number': 1, 'max_pears': 10, 'positions': GRID},
+                make_pesticide_parameters(0, 1800, 4, 5, GRID)).run()
+
+
+def test_reference_step_reproduces_fixed_stepping():
+    # an adaptive stepper held at the reference step takes the steps of the fixed one, with the same draws
+    fixed = run(None)
+    assert run({'min_step': 10, 'max_step': 10}) == fixed
+    assert fixed['bug_deads'] > 0
+
+
+def test_adaptive_stepping_is_close_to_fixed_stepping():
+    fixed = run(None)
+    adaptive = run(True)
+    assert adaptive['bug_deads'] + adaptive['bugs_escaped'] + adaptive['bugs_survived'] == 80
+    assert adaptive['pesticide_radius'] == pytest.approx(fixed['pesticide_radius'], rel=0.25)
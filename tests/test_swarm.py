@@ -0,0 +1,155 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+from models.bug import Bug
+from models.exposure import concentration_matrix, sparse_concentrations
+from models.fruit import Fruit
+from models.neighbors import AllPairs, make_neighbor_index
+from models.pesticide import Pesticide
+from models.pesticide_field import PesticideField
+from models.raster import ConcentrationGrid
+from models.swarm import BugSwarm, pesticide_arrays
+from models.tree import Tree
+
+#######################################################################################################################
+# BugSwarm and models.exposure against the per-bug loop of the original Twin.run (Pesticide.affects_bug sprayer by
+# sprayer, then Bug.move bug by bug). The batched engine draws its random numbers in another order and moves all
+# the bugs from the positions at the beginning of the step, so the runs are compared on their statistics over
+# many seeds; the deterministic parts (concentrations, movement vectors) are compared exactly.
+#######################################################################################################################
+
+SIZE = (40, 40)
+SEEDS = range(40)
+STEPS = 4
+
+
+def make_scene(seed, n_bugs=60, radius=6):
+    rng = np.random.RandomState(seed)
+    trees = []
+    for i, position in enumerate([[x, y] for x in (12, 20, 28) for y in (14, 26)]):
+        fruits = [Fruit(j, 1, rng.uniform(0, 1), 5) for j in range(rng.randint(1, 6))]
+        trees.append(Tree(i, position, 1, fruits))
+    bugs = [Bug(i, 100, 2, rng.uniform(2, SIZE[0] - 2, 2), 1) for i in range(n_bugs)]
+    pesticides = []
+    for i, position in enumerate([[x, y] for x in (10, 20, 30) for y in (10, 20, 30)]):
+        pesticide = Pesticide(i, "Fenpropathrin", position, 1, 30)
+        pesticide.radius = radius
+        pesticides.append(pesticide)
+    return trees, bugs, pesticides
+
+
+def legacy_step(environment, trees, bugs, pesticides):
+    """One instant of the original Twin.run, without the spread of the sprayers."""
+    deads = 0
+    for pesticide in pesticides:
+        survivors = [bug for bug in bugs if not pesticide.affects_bug(bug)]
+        deads += len(bugs) - len(survivors)
+        bugs = survivors
+    for bug in bugs:
+        bug.move(environment, trees, bugs, pesticides)
+    width, height = environment.size
+    inside = [bug for bug in bugs if 0 <= bug.position[0] <= width and 0 <= bug.position[1] <= height]
+    return inside, deads, len(bugs) - len(inside)
+
+
+def outcome(deads, lefts, positions):
+    centroid = np.mean(positions, axis=0) if len(positions) else np.full(2, np.nan)
+    return {'dead': deads, 'left': lefts, 'x': centroid[0], 'y': centroid[1]}
+
+
+def run_legacy(environment, seed):
+    trees, bugs, pesticides = make_scene(seed)
+    np.random.seed(seed)
+    random.seed(seed)
+    deads, lefts = 0, 0
+    for _ in range(STEPS):
+        bugs, d, left = legacy_step(environment, trees, bugs, pesticides)
+        deads, lefts = deads + d, lefts + left
+    return outcome(deads, lefts, [bug.position for bug in bugs])
+
+
+def run_swarm(environment, seed, exposure, neighbors):
+    trees, bugs, pesticides = make_scene(seed)
+    np.random.seed(seed)
+    random.seed(seed)
+    field = PesticideField.from_pesticides(pesticides)
+    raster = None
+    if exposure == 'grid':
+        raster = ConcentrationGrid(SIZE)
+        raster.build(field)
+    swarm = BugSwarm.from_bugs(bugs, make_neighbor_index(neighbors), raster)
+    deads, lefts = 0, 0
+    for _ in range(STEPS):
+        deads += swarm.expose(field, exposure)
+        lefts += swarm.move(environment, trees, field)
+    return outcome(deads, lefts, swarm.positions[swarm.active()])
+
+
+@pytest.fixture(scope="module")
+def environment(make_environment):
+    return make_environment(SIZE)
+
+
+@pytest.fixture(scope="module")
+def legacy(environment):
+    return [run_legacy(environment, seed) for seed in SEEDS]
+
+
+@pytest.mark.parametrize("exposure, neighbors", [
+    ('dense', 'exact'), ('sparse', 'exact'), ('grid', 'exact'), ('auto', 'grid'), ('auto', 'barnes_hut')])
+def test_statistics_match_the_per_bug_loop(environment, legacy, exposure, neighbors):
+    batched = [run_swarm(environment, seed, exposure, neighbors) for seed in SEEDS]
+    assert np.mean([r['dead'] for r in legacy]) > 5 and np.mean([r['left'] for r in legacy]) > 1
+    for metric in ('dead', 'left', 'x', 'y'):
+        a = np.array([r[metric] for r in legacy])
+        b = np.array([r[metric] for r in batched])
+        # two-sample test on the means, 4 standard errors
+        error = np.sqrt(a.var(ddof=1) / len(a) + b.var(ddof=1) / len(b))
+        assert abs(a.mean() - b.mean()) <= 4 * error + 1e-9, (metric, a.mean(), b.mean(), error)
+
+
+def test_concentrations_match_pesticide():
+    _, bugs, pesticides = make_scene(0, n_bugs=200, radius=9)
+    pesticides[3].quantity = 0
+    points = np.array([bug.position for bug in bugs])
+    positions, radii, quantities = pesticide_arrays(pesticides, ('position', 'radius', 'quantity'))
+    expected = np.array([[p.get_concentration(point) for point in points] for p in pesticides])
+
+    dense = concentration_matrix(positions, radii, quantities, points)
+    np.testing.assert_allclose(dense, expected, rtol=1e-12, atol=0)
+
+    pest_idx, bug_idx, concentration = sparse_concentrations(positions, radii, quantities, points)
+    sparse = np.zeros_like(dense)
+    sparse[pest_idx, bug_idx] = concentration
+    np.testing.assert_allclose(sparse, expected, rtol=1e-12, atol=0)
+
+
+def test_positions_match_bug_move(environment, monkeypatch):
+    # every bug with a net vector moves: each one is moved by Bug.move against the unmoved population
+    trees, bugs, pesticides = make_scene(1)
+    monkeypatch.setattr(random, 'random', lambda: 0.0)
+    monkeypatch.setattr(np.random, 'rand', lambda *shape: np.zeros(shape))
+    expected = []
+    for bug in bugs:
+        moved = copy.deepcopy(bug)
+        moved.move(environment, trees, bugs, pesticides)
+        expected.append(moved.position)
+
+    swarm = BugSwarm.from_bugs(bugs, AllPairs())
+    swarm.move(environment, trees, PesticideField.from_pesticides(pesticides))
+    np.testing.assert_allclose(swarm.positions, expected, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("neighbors", ['grid', 'barnes_hut'])
+def test_neighbor_indexes_approximate_all_pairs(neighbors):
+    points = np.random.RandomState(2).uniform(0, 100, (500, 2))
+    exact = AllPairs()
+    exact.build(points)
+    index = make_neighbor_index(neighbors)
+    index.build(points)
+    reference = exact.attraction()
+    error = np.linalg.norm(index.attraction() - reference, axis=1) / np.linalg.norm(reference, axis=1)
+    assert np.median(error) < 0.02 and np.max(error) < 0.2
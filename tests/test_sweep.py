@@ -0,0 +1,99 @@
+import csv
+import json
+
+import pytest
+
+from models.sweep import Sweep
+
+
+class Interrupted(Exception):
+    pass
+
+
+def make_spec(tmp_path, name='sweep'):
+    # two small points of three seeds: one sprayer on one tree, a few bugs
+    return {
+        'name': name,
+        'output': str(tmp_path / f'{name}.csv'),
+        'seeds': 3,
+        'fixed': {'trees': [[50, 50]], 'quantity': 300, 'max_pears': 3, 'environment': {'time_step': 20}},
+        'axes': {'bugs': [2, 5]}
+    }
+
+
+def read_rows(path):
+    with open(path, 'r', newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def checkpoint_entries(sweep):
+    with open(sweep.checkpoint, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def test_interrupted_sweep_resumes_without_duplicates(tmp_path):
+    reference = list(Sweep(make_spec(tmp_path, 'reference')).run())
+
+    sweep = Sweep(make_spec(tmp_path))
+    calls = []
+
+    def interrupt(idx, replicate):
+        calls.append((idx, replicate['seed']))
+        if len(calls) == 4:
+            raise Interrupted()
+
+    # the first point is complete, the second one has one replicate checkpointed
+    with pytest.raises(Interrupted):
+        for _ in sweep.run(on_replicate=interrupt):
+            pass
+    assert len(read_rows(sweep.output)) == 1
+    with open(sweep.checkpoint, 'a') as file:
+        file.write('{"key": "trunc')  # last line of an interrupted write
+
+    resumed = []
+    rows = list(Sweep(make_spec(tmp_path)).run(on_replicate=lambda idx, replicate: resumed.append(idx)))
+    # only the two missing replicates run again
+    assert resumed == [1, 1]
+
+    written = read_rows(sweep.output)
+    assert [row['key'] for row in written] == [row['key'] for row in reference]
+    assert [int(row['replicates']) for row in written] == [3, 3]
+    entries = [(e['key'], e['replicate']['seed']) for e in checkpoint_entries(sweep) if 'replicate' in e]
+    assert len(entries) == len(set(entries)) == 6
+
+    # replicates are seeded: the resumed sweep gives the rows of the uninterrupted one
+    by_key = {row['key']: row for row in rows}
+    for row in reference:
+        assert by_key[row['key']]['dead_mean'] == row['dead_mean']
+        assert by_key[row['key']]['hours_mean'] == row['hours_mean']
+
+
+def test_finished_sweep_writes_nothing_new(tmp_path):
+    sweep = Sweep(make_spec(tmp_path))
+    list(sweep.run())
+    ran = []
+    list(Sweep(make_spec(tmp_path)).run(on_replicate=lambda idx, replicate: ran.append(idx)))
+    assert ran == []
+    assert len(read_rows(sweep.output)) == 2
+
+
+def test_resume_rewrites_an_outdated_header(tmp_path):
+    sweep = Sweep(make_spec(tmp_path))
+    list(sweep.run())
+    # the output of a version without the steps metric, and the second point to run again
+    old = [c for c in sweep.columns() if not c.startswith('steps_')]
+    rows = read_rows(sweep.output)
+    with open(sweep.output, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=old, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerow(rows[0])
+    entries = checkpoint_entries(sweep)
+    with open(sweep.checkpoint, 'w') as file:
+        file.writelines(json.dumps(e) + '\n' for e in entries if e['key'] == rows[0]['key'])
+
+    list(Sweep(make_spec(tmp_path)).run())
+    with open(sweep.output, 'r', newline='') as file:
+        assert next(csv.reader(file)) == sweep.columns()
+    written = read_rows(sweep.output)
+    assert [row['key'] for row in written] == [row['key'] for row in rows]
+    assert written[0]['steps_mean'] == '' and written[1]['steps_mean'] == rows[1]['steps_mean']
@@ -0,0 +1,55 @@
+import numpy as np
+
+from models.tiles import TiledMap
+
+SIZE = (70, 50)
+# the tiles store float32: values of a few tens of degrees or percents within float32 rounding
+TOLERANCE = {'rtol': 1e-6, 'atol': 1e-5}
+
+
+def test_tiles_give_the_dense_maps(make_environment):
+    dense = make_environment(SIZE)
+    tiled = make_environment(SIZE, tiles={'resolution': 1, 'tile_size': 16, 'cache_tiles': 4})
+    points = np.random.RandomState(0).uniform(0, 1, (500, 2)) * SIZE
+    points[:2] = [[0, 0], SIZE]  # corners, the far one clamped into the field
+    for _ in range(3):
+        np.testing.assert_allclose(np.asarray(tiled.temperature_map), dense.temperature_map, **TOLERANCE)
+        np.testing.assert_allclose(np.asarray(tiled.humidity_map), dense.humidity_map, **TOLERANCE)
+        np.testing.assert_allclose(tiled.get_temperatures_at(points[:, 0], points[:, 1]),
+                                   dense.get_temperatures_at(points[:, 0], points[:, 1]), **TOLERANCE)
+        np.testing.assert_allclose(tiled.get_humidities_at(points[:, 0], points[:, 1]),
+                                   dense.get_humidities_at(points[:, 0], points[:, 1]), **TOLERANCE)
+        assert tiled.get_temperature_at(12.5, 33.2) == np.float32(tiled.temperature_map.get(12, 33))
+        dense.update_conditions()
+        tiled.update_conditions()
+
+
+def test_evicted_tiles_are_recomputed_identically():
+    rng = np.random.RandomState(1)
+    positions = rng.uniform(0, 1, (9, 2)) * SIZE
+    positions[0] = [16, 16]  # on a cell corner: the cell takes the sensor value
+    values = rng.uniform(10, 30, 9)
+    reference = np.asarray(TiledMap(SIZE, positions, values, tile_size=8, cache_tiles=1000))
+    assert reference.shape == SIZE and reference[16, 16] == np.float32(values[0])
+
+    cached = TiledMap(SIZE, positions, values, tile_size=8, cache_tiles=3)
+    for _ in range(5):
+        xs, ys = rng.uniform(0, SIZE[0], 300), rng.uniform(0, SIZE[1], 300)
+        expected = reference[xs.astype(int), ys.astype(int)]
+        np.testing.assert_array_equal(cached.get_many(xs, ys), expected)
+        np.testing.assert_array_equal([cached.get(x, y) for x, y in zip(xs[:20], ys[:20])], expected[:20])
+        assert len(cached.tiles) <= 3
+    assert cached.misses > 3 * 9 and cached.hits > 0
+    assert cached.nbytes() <= 3 * 8 * 8 * 4
+
+
+def test_sub_metre_cells():
+    positions = [[10, 10], [40, 25], [60, 45]]
+    values = [10.0, 20.0, 30.0]
+    fine = TiledMap(SIZE, positions, values, resolution=4, tile_size=32)
+    coarse = TiledMap(SIZE, positions, values, resolution=1, tile_size=32)
+    assert np.asarray(fine).shape == (SIZE[0] * 4, SIZE[1] * 4)
+    # the cells of both maps at whole metres are the same points
+    np.testing.assert_array_equal(np.asarray(fine)[::4, ::4], np.asarray(coarse))
+    # the cell with its corner on a sensor takes its value
+    assert fine.get(40.1, 25.2) == np.float32(20.0) and fine.get(40.3, 25.2) != np.float32(20.0)